@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Concurrent crawling of addon file trees through WaterButler's metadata API.
+
+Folders are listed by a pool of ``ARCHIVE_CRAWL_CONCURRENCY`` threads sharing one connection
+pool. Requests to each provider are throttled by a per-process token bucket allowing
+``ARCHIVE_CRAWL_RATE_LIMITS[provider]`` (or ``['default']``) requests per second, and failed
+requests (connection errors, 429s and 5xxs) are retried with exponential backoff.
+"""
+import logging
+import sys
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+
+import requests
+
+from framework.exceptions import HTTPError
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=settings.ARCHIVE_CRAWL_CONCURRENCY))
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=settings.ARCHIVE_CRAWL_CONCURRENCY))
+
+
+class TokenBucket(object):
+    """Allows ``rate`` calls per second on average, in bursts of up to ``capacity``."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = time.time()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    with _buckets_lock:
+        if provider not in _buckets:
+            limits = settings.ARCHIVE_CRAWL_RATE_LIMITS
+            _buckets[provider] = TokenBucket(limits.get(provider, limits['default']), capacity=settings.ARCHIVE_CRAWL_CONCURRENCY)
+        return _buckets[provider]
+
+
+def fetch_metadata(provider, url):
+    """Return the ``data`` of WaterButler's metadata response for ``url``.
+
+    :raises: HTTPError if WaterButler doesn't respond with a 200 after retrying
+    """
+    rate_limiter = get_rate_limiter(provider)
+    for attempt in range(settings.ARCHIVE_CRAWL_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(settings.ARCHIVE_CRAWL_RETRY_BACKOFF * 2 ** (attempt - 1))
+        rate_limiter.acquire()
+        try:
+            res = session.get(url)
+        except requests.RequestException as e:
+            if attempt == settings.ARCHIVE_CRAWL_MAX_RETRIES:
+                raise HTTPError(503, data={'error': str(e)})
+            logger.warning('Retrying {} metadata request after {!r}'.format(provider, e))
+            continue
+        if res.status_code == 200:
+            return res.json().get('data', [])
+        if res.status_code not in RETRY_STATUS_CODES or attempt == settings.ARCHIVE_CRAWL_MAX_RETRIES:
+            raise HTTPError(res.status_code, data={'error': res.json()})
+        logger.warning('Retrying {} metadata request after a {}'.format(provider, res.status_code))
+
+
+class FileTreeCrawler(object):
+    """Lists every folder below a root folder, filling in their ``children`` in place.
+
+    :param str provider: Provider short name, used for rate limiting
+    :param callable get_url: Returns the metadata URL of a folder. Only called from the thread
+        running ``crawl``, so it may use the database.
+    :param int max_size: Stop once the files found add up to more than this many bytes
+    """
+
+    def __init__(self, provider, get_url, max_size=None, concurrency=None):
+        self.provider = provider
+        self.get_url = get_url
+        self.max_size = max_size
+        self.concurrency = concurrency or settings.ARCHIVE_CRAWL_CONCURRENCY
+        self.size = 0
+
+    @staticmethod
+    def is_leaf(filenode):
+        return filenode.get('kind') == 'file' or 'size' in filenode
+
+    def _fetch(self, folder, url):
+        try:
+            return folder, fetch_metadata(self.provider, url), None
+        except Exception:
+            return folder, None, sys.exc_info()
+
+    def crawl(self, root):
+        """Return ``root`` with the children of every folder below it filled in. If ``max_size``
+        was exceeded, the folders that hadn't been listed yet are left without children.
+        """
+        if self.is_leaf(root):
+            return root
+        pool = ThreadPool(self.concurrency)
+        done = Queue()
+        pending = 0
+        try:
+            folders = [root]
+            while True:
+                for folder in folders:
+                    pool.apply_async(self._fetch, (folder, self.get_url(folder)), callback=done.put)
+                    pending += 1
+                if not pending:
+                    return root
+                folder, children, exc_info = done.get()
+                pending -= 1
+                if exc_info:
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                folder['children'] = children
+                folders = []
+                for child in children:
+                    if not self.is_leaf(child):
+                        folders.append(child)
+                    elif child.get('kind') == 'file':
+                        self.size += int(child.get('size') or 0)
+                if self.max_size is not None and self.size > self.max_size:
+                    logger.info('Stopped crawling {} after finding {} bytes'.format(self.provider, self.size))
+                    return root
+        finally:
+            pool.terminate()
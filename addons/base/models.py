@@ -1,13 +1,11 @@
 import abc
 import os
-import time
 
 import markupsafe
-import requests
 from django.db import models
 from framework.auth import Auth
 from framework.auth.decorators import must_be_logged_in
-from framework.exceptions import HTTPError, PermissionsError
+from framework.exceptions import PermissionsError
 from mako.lookup import TemplateLookup
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.models.external import ExternalAccount
@@ -16,7 +14,7 @@ from osf.models.user import OSFUser
 from osf.modm_compat import Q
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from website import settings
-from addons.base import logger, serializer
+from addons.base import crawler, logger, serializer
 from website.oauth.signals import oauth_complete
 from website.util import waterbutler_url_for
 
@@ -574,7 +572,7 @@ class BaseStorageAddon(BaseModel):
             name = name + ': {folder}'.format(folder=folder_name)
         return name
 
-    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None):
+    def _get_fileobj_metadata_url(self, filenode, user, cookie=None, version=None):
         kwargs = dict(
             provider=self.config.short_name,
             path=filenode.get('path', ''),
@@ -586,37 +584,29 @@ class BaseStorageAddon(BaseModel):
             kwargs['cookie'] = cookie
         if version:
             kwargs['version'] = version
-        metadata_url = waterbutler_url_for('metadata', _internal=True, **kwargs)
-
-        res = requests.get(metadata_url)
-        if res.status_code != 200:
-            raise HTTPError(res.status_code, data={'error': res.json()})
+        return waterbutler_url_for('metadata', _internal=True, **kwargs)
 
-        # TODO: better throttling?
-        time.sleep(1.0 / 5.0)
-        return res.json().get('data', [])
+    def _get_fileobj_child_metadata(self, filenode, user, cookie=None, version=None):
+        return crawler.fetch_metadata(
+            self.config.short_name,
+            self._get_fileobj_metadata_url(filenode, user, cookie=cookie, version=version),
+        )
 
-    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None):
+    def _get_file_tree(self, filenode=None, user=None, cookie=None, version=None, max_size=None):
         """
-        Recursively get file metadata
+        Get file metadata for the whole tree below ``filenode``, listing folders concurrently.
+        If ``max_size`` is given, stop once the files found add up to more than that many bytes.
         """
         filenode = filenode or {
             'path': '/',
             'kind': 'folder',
             'name': self.root_node.name,
         }
-        if filenode.get('kind') == 'file' or 'size' in filenode:
-            return filenode
-
-        kwargs = {
-            'version': version,
-            'cookie': cookie,
-        }
-        filenode['children'] = [
-            self._get_file_tree(child, user, cookie=cookie)
-            for child in self._get_fileobj_child_metadata(filenode, user, **kwargs)
-        ]
-        return filenode
+        return crawler.FileTreeCrawler(
+            self.config.short_name,
+            lambda folder: self._get_fileobj_metadata_url(folder, user, cookie=cookie, version=version),
+            max_size=max_size,
+        ).crawl(filenode)
 
 
 class BaseOAuthNodeSettings(BaseNodeSettings):
@@ -10,7 +10,8 @@ from psycopg2._psycopg import AsIs
 from addons.base.models import BaseNodeSettings, BaseStorageAddon
 from osf.exceptions import InvalidTagError, NodeStateError, TagNotFoundError
 from osf.models import (File, FileVersion, Folder, Guid,
-                        TrashedFileNode, BaseFileNode)
+                        TrashedFileNode, TrashedFolder, BaseFileNode)
+from osf.utils import guid_cache
 from osf.utils.auth import Auth
 from website.files import exceptions
 from website.files import utils as files_utils
@@ -24,8 +25,34 @@ logger = logging.getLogger(__name__)
 class OsfStorageFileNode(BaseFileNode):
     _provider = 'osfstorage'
 
+    # Computes the materialized path of every active file and folder beneath the seed rows
+    # selected by {seed_where}, whose parents have the path {seed_path}.
+    MATERIALIZED_PATH_CTE = """
+        WITH RECURSIVE tree(id, path) AS (
+            SELECT
+              F.id,
+              {seed_path} || COALESCE(F.name, '') || CASE WHEN F.type IN %(folder_types)s THEN '/' ELSE '' END
+            FROM osf_basefilenode AS F
+            WHERE {seed_where} AND F.type IN %(types)s
+          UNION ALL
+            SELECT
+              F.id,
+              T.path || COALESCE(F.name, '') || CASE WHEN F.type IN %(folder_types)s THEN '/' ELSE '' END
+            FROM osf_basefilenode AS F
+              JOIN tree AS T ON F.parent_id = T.id
+            WHERE F.type IN %(types)s
+        )
+    """
+
     @property
     def materialized_path(self):
+        """The path of this file or folder from the root folder, e.g. ``/folder/file``. It is
+        stored when the file node is saved; rows that were never saved with it fall back to
+        walking the parent chain.
+        """
+        if self._materialized_path:
+            return self._materialized_path
+
         sql = """
             WITH RECURSIVE materialized_path_cte(parent_id, GEN_PATH) AS (
               SELECT
@@ -62,6 +89,71 @@ class OsfStorageFileNode(BaseFileNode):
         # raise Exception('Cannot set materialized path on OSFStorage as it is computed.')
         logger.warn('Cannot set materialized path on OSFStorage because it\'s computed.')
 
+    @classmethod
+    def _materialized_path_params(cls):
+        return {
+            'folder_types': (OsfStorageFolder._typedmodels_type, TrashedFolder._typedmodels_type),
+            'types': (OsfStorageFile._typedmodels_type, OsfStorageFolder._typedmodels_type),
+        }
+
+    @classmethod
+    def repair_materialized_paths(cls, dry=False):
+        """Recompute the stored materialized path of every active OSF Storage file node.
+        Returns the number of rows whose path was wrong; they are only updated unless ``dry``.
+        """
+        cte = cls.MATERIALIZED_PATH_CTE.format(
+            seed_path="''",
+            seed_where="F.parent_id IS NULL AND F.provider = 'osfstorage'",
+        )
+        if dry:
+            sql = cte + """
+                SELECT COUNT(*)
+                FROM osf_basefilenode AS F
+                  JOIN tree AS T ON F.id = T.id
+                WHERE F._materialized_path IS DISTINCT FROM T.path;
+            """
+        else:
+            sql = cte + """
+                UPDATE osf_basefilenode AS F
+                SET _materialized_path = T.path
+                FROM tree AS T
+                WHERE F.id = T.id AND F._materialized_path IS DISTINCT FROM T.path;
+            """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, cls._materialized_path_params())
+            return cursor.fetchone()[0] if dry else cursor.rowcount
+
+    def _update_descendants(self):
+        """Set the materialized path and node of everything beneath this folder from its own,
+        in a single statement. Returns the ids of the updated file nodes.
+        """
+        cte = self.MATERIALIZED_PATH_CTE.format(
+            seed_path='%(path)s',
+            seed_where='F.parent_id = %(parent_id)s',
+        )
+        sql = cte + """
+            UPDATE osf_basefilenode AS F
+            SET _materialized_path = T.path, node_id = %(node_id)s
+            FROM tree AS T
+            WHERE F.id = T.id
+            RETURNING F.id;
+        """
+        params = dict(
+            self._materialized_path_params(),
+            path=self._materialized_path,
+            parent_id=self.pk,
+            node_id=self.node_id,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_materialized_path(self):
+        """Build this file node's materialized path from its parent's."""
+        name = self.name or ''
+        path = self.parent.materialized_path + name if self.parent_id else name
+        return path if self.is_file else path + '/'
+
     @classmethod
     def get(cls, _id, node):
         return cls.find_one(Q('_id', 'eq', _id) & Q('node', 'eq', node))
@@ -196,10 +288,30 @@ class OsfStorageFileNode(BaseFileNode):
             if save:
                 self.save()
 
+    def _update_node(self, recursive=True, save=True):
+        if self.parent is not None and self.parent.node_id != self.node_id:
+            self.node = self.parent.node
+            # deep_url includes the node
+            guid_cache.invalidate_referent(self)
+        if save:
+            # Saving a folder updates the path and node of everything beneath it
+            self.save()
+            if recursive and not self.is_file:
+                from website.search import search
+                search.update_files(self.get_descendants().filter(type=OsfStorageFile._typedmodels_type))
+
     def save(self):
         self._path = ''
-        self._materialized_path = ''
-        return super(OsfStorageFileNode, self).save()
+        previous = None
+        if self.pk and not self.is_file:
+            previous = OsfStorageFileNode.objects.filter(pk=self.pk).values('_materialized_path', 'node_id').first()
+        self._materialized_path = self.get_materialized_path()
+        ret = super(OsfStorageFileNode, self).save()
+        if previous and (previous['_materialized_path'], previous['node_id']) != (self._materialized_path, self.node_id):
+            descendant_ids = self._update_descendants()
+            if previous['node_id'] != self.node_id:
+                guid_cache.invalidate_referents(BaseFileNode, descendant_ids)
+        return ret
 
 
 class OsfStorageFile(OsfStorageFileNode, File):
@@ -359,6 +471,12 @@ class OsfStorageFolder(OsfStorageFileNode, Folder):
                     return True
         return False
 
+    def get_descendants(self):
+        """Every file and folder beneath this folder, found by materialized path."""
+        return OsfStorageFileNode.objects.filter(
+            node_id=self.node_id, _materialized_path__startswith=self.materialized_path
+        ).exclude(id=self.id)
+
     def serialize(self, include_full=False, version=None):
         # Versions just for compatibility
         ret = super(OsfStorageFolder, self).serialize()
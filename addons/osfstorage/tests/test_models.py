@@ -309,17 +309,32 @@ class TestOsfstorageFileNode(StorageTestCase):
         assert_equal(to_move.name, 'Tuna')
         assert_equal(moved.parent, move_to)
 
-    @unittest.skip
     def test_move_folder(self):
-        pass
+        to_move = self.node_settings.get_root().append_folder('Carp')
+        child = to_move.append_folder('Koi').append_file('Nishiki')
+        move_to = self.node_settings.get_root().append_folder('Cloud')
+
+        to_move.move_under(move_to)
+        child.reload()
+
+        assert_equal(to_move.materialized_path, '/Cloud/Carp/')
+        assert_equal(child.materialized_path, '/Cloud/Carp/Koi/Nishiki')
+        assert_equal(list(move_to.get_descendants().order_by('_materialized_path').values_list('name', flat=True)), ['Carp', 'Koi', 'Nishiki'])
 
     @unittest.skip
     def test_move_folder_and_rename(self):
         pass
 
-    @unittest.skip
     def test_rename_folder(self):
-        pass
+        folder = self.node_settings.get_root().append_folder('Carp')
+        child = folder.append_file('Koi')
+
+        folder.name = 'Tuna'
+        folder.save()
+        child.reload()
+
+        assert_equal(child.materialized_path, '/Tuna/Koi')
+        assert_equal(child._materialized_path, '/Tuna/Koi')
 
     @unittest.skip
     def test_rename_file(self):
@@ -329,9 +344,29 @@ class TestOsfstorageFileNode(StorageTestCase):
     def test_move_across_nodes(self):
         pass
 
-    @unittest.skip
-    def test_move_folder_across_nodes(self):
-        pass
+    @mock.patch('website.search.search.update_files')
+    def test_move_folder_across_nodes(self, mock_update_files):
+        other_node_settings = ProjectFactory().get_addon('osfstorage')
+        to_move = self.node_settings.get_root().append_folder('Carp')
+        child = to_move.append_folder('Koi').append_file('Nishiki')
+
+        to_move.move_under(other_node_settings.get_root())
+        child.reload()
+
+        assert_equal(child.node, other_node_settings.owner)
+        assert_equal(child.materialized_path, '/Carp/Koi/Nishiki')
+        assert_equal(list(mock_update_files.call_args[0][0]), [child])
+
+    def test_repair_materialized_paths(self):
+        folder = self.node_settings.get_root().append_folder('Cloud')
+        child = folder.append_file('Carp')
+        OsfStorageFileNode.objects.filter(id__in=[folder.id, child.id]).update(_materialized_path='')
+
+        assert_equal(OsfStorageFileNode.repair_materialized_paths(dry=True), 2)
+        assert_equal(OsfStorageFileNode.repair_materialized_paths(), 2)
+        child.reload()
+        assert_equal(child._materialized_path, '/Cloud/Carp')
+        assert_equal(OsfStorageFileNode.repair_materialized_paths(dry=True), 0)
 
     @unittest.skip
     def test_copy_across_nodes(self):
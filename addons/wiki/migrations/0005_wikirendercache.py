@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0041_fileversion_metadata_sha256_index'),
+        ('addons_wiki', '0004_remove_nodewikipage_guid_string'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WikiRenderCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('renderer_version', models.PositiveSmallIntegerField()),
+                ('html', models.TextField()),
+                ('text', models.TextField()),
+                ('node', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='osf.AbstractNode')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='wikirendercache',
+            unique_together=set([('content_hash', 'node', 'renderer_version')]),
+        ),
+    ]
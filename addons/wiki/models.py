@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import datetime
 import functools
+import hashlib
 import logging
 
 import markdown
@@ -12,6 +13,7 @@ from framework.forms.utils import sanitize
 from markdown.extensions import codehilite, fenced_code, wikilinks
 from osf.models import AbstractNode, NodeLog
 from osf.models.base import BaseModel, GuidMixin
+from osf.utils import guid_cache
 from osf.utils.fields import NonNaiveDateTimeField
 from website import settings
 from addons.wiki import utils as wiki_utils
@@ -96,6 +98,72 @@ def build_wiki_url(node, label, base, end):
     return '/{pid}/wiki/{wname}/'.format(pid=node._id, wname=label)
 
 
+def render_html(content, node):
+    """Render ``content`` to sanitized, linkified HTML"""
+    sanitized_content = render_content(content, node=node)
+    try:
+        from bleach import linkify
+
+        return linkify(
+            sanitized_content,
+            [nofollow, ],
+        )
+    except TypeError:
+        logger.warning('Returning unlinkified content.')
+        return sanitized_content
+
+
+# Bump whenever render_html's output changes (e.g. new markdown extensions or a changed
+# WIKI_WHITELIST) so that pages rendered by the old pipeline are rendered again
+RENDERER_VERSION = 1
+
+
+class WikiRenderCache(BaseModel):
+    """The rendered HTML and plain text of some wiki content on a node. Wiki links point into
+    the node, so the same content renders differently on different nodes.
+    """
+    content_hash = models.CharField(max_length=64)
+    node = models.ForeignKey('osf.AbstractNode', on_delete=models.CASCADE)
+    renderer_version = models.PositiveSmallIntegerField()
+    html = models.TextField()
+    text = models.TextField()
+
+    class Meta:
+        unique_together = ('content_hash', 'node', 'renderer_version')
+
+    @staticmethod
+    def hash_content(content):
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get_rendered(cls, content, node):
+        """Return (html, text) for ``content`` on ``node``, rendering and storing them if they
+        haven't been rendered by this RENDERER_VERSION yet. Storing a render prunes the node's
+        stale ones.
+        """
+        key = dict(content_hash=cls.hash_content(content), node=node, renderer_version=RENDERER_VERSION)
+        rendered = cls.objects.filter(**key).values_list('html', 'text').first()
+        if rendered is None:
+            html = render_html(content, node)
+            text = sanitize(html, tags=[], strip=True)
+            cls.objects.get_or_create(defaults={'html': html, 'text': text}, **key)
+            cls.prune(node, keep=[key['content_hash']])
+            rendered = (html, text)
+        return rendered
+
+    @classmethod
+    def prune(cls, node, keep=()):
+        """Delete the renders of ``node`` by older RENDERER_VERSIONs, and those of content that is
+        on none of its current wiki pages, other than the content hashes in ``keep``. Old versions
+        of pages are rendered again when they're viewed.
+        """
+        contents = NodeWikiPage.objects.filter(
+            guids___id__in=list(node.wiki_pages_current.values())
+        ).values_list('content', flat=True)
+        keep = set(keep) | {cls.hash_content(content) for content in contents}
+        cls.objects.filter(node=node).exclude(renderer_version=RENDERER_VERSION, content_hash__in=keep).delete()
+
+
 class NodeWikiPage(GuidMixin, BaseModel):
     page_name = models.CharField(max_length=200, validators=[validate_page_name, ])
     version = models.IntegerField(default=1)
@@ -156,24 +224,19 @@ class NodeWikiPage(GuidMixin, BaseModel):
     def get_absolute_url(self):
         return self.absolute_api_v2_url
 
+    def _rendered(self, node):
+        key = (node.pk, self.content)
+        if getattr(self, '_rendered_cache', (None, None))[0] != key:
+            self._rendered_cache = (key, WikiRenderCache.get_rendered(self.content, node))
+        return self._rendered_cache[1]
+
     def html(self, node):
         """The cleaned HTML of the page"""
-        sanitized_content = render_content(self.content, node=node)
-        try:
-            from bleach import linkify
-
-            return linkify(
-                sanitized_content,
-                [nofollow, ],
-            )
-        except TypeError:
-            logger.warning('Returning unlinkified content.')
-            return sanitized_content
+        return self._rendered(node)[0]
 
     def raw_text(self, node):
         """ The raw text of the page, suitable for using in a test search"""
-
-        return sanitize(self.html(node), tags=[], strip=True)
+        return self._rendered(node)[1]
 
     def get_draft(self, node):
         """
@@ -221,6 +284,8 @@ class NodeWikiPage(GuidMixin, BaseModel):
 
     def rename(self, new_name, save=True):
         self.page_name = new_name
+        # deep_url includes the page name
+        guid_cache.invalidate_referent(self)
         if save:
             self.save()
 
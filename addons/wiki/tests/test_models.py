@@ -1,9 +1,12 @@
+import mock
 import pytest
 
 from modularodm.exceptions import ValidationValueError
 
-from addons.wiki.models import NodeWikiPage
+from addons.wiki import models as wiki_models
+from addons.wiki.models import NodeWikiPage, WikiRenderCache
 from addons.wiki.tests.factories import NodeWikiFactory
+from framework.auth import Auth
 from osf_tests.factories import NodeFactory, UserFactory, ProjectFactory
 from tests.base import OsfTestCase
 
@@ -78,3 +81,59 @@ class TestNodeWikiPage(OsfTestCase):
         wiki.save()
         url = '{}wiki/{}/'.format(self.project.url, wiki.page_name)
         assert wiki.url == url
+
+
+class TestWikiRenderCache:
+
+    def test_html_is_rendered_once_per_content(self):
+        node = NodeFactory()
+        page = NodeWikiPage(page_name='foo', node=node, content='**bold** [[bar]]')
+        page.save()
+        with mock.patch.object(wiki_models, 'render_html', wraps=wiki_models.render_html) as render:
+            html = page.html(node)
+            assert NodeWikiPage.load(page._id).html(node) == html
+            assert NodeWikiPage.load(page._id).raw_text(node) == 'bold bar'
+        assert render.call_count == 1
+        assert '<strong>bold</strong>' in html
+        assert '/{}/wiki/bar/'.format(node._id) in html
+        assert WikiRenderCache.objects.filter(node=node).count() == 1
+
+    def test_changed_content_is_rendered_again(self):
+        node = NodeFactory()
+        page = NodeWikiPage(page_name='foo', node=node, content='one')
+        page.save()
+        assert page.raw_text(node) == 'one'
+        page.content = 'two'
+        assert page.raw_text(node) == 'two'
+        # 'one' is on no current page of the node
+        assert list(WikiRenderCache.objects.filter(node=node).values_list('content_hash', flat=True)) == [WikiRenderCache.hash_content('two')]
+
+    def test_cache_is_per_node(self):
+        node, other = NodeFactory(), NodeFactory()
+        page = NodeWikiPage(page_name='foo', node=node, content='[[bar]]')
+        page.save()
+        assert node._id in page.html(node)
+        assert other._id in page.html(other)
+
+    def test_renderer_version_bump_renders_again(self):
+        node = NodeFactory()
+        WikiRenderCache.get_rendered('content', node)
+        with mock.patch.object(wiki_models, 'RENDERER_VERSION', wiki_models.RENDERER_VERSION + 1):
+            with mock.patch.object(wiki_models, 'render_html', return_value='<p>new</p>') as render:
+                assert WikiRenderCache.get_rendered('content', node) == ('<p>new</p>', 'new')
+            assert render.call_count == 1
+            assert list(WikiRenderCache.objects.filter(node=node).values_list('renderer_version', flat=True)) == [wiki_models.RENDERER_VERSION]
+
+    def test_storing_a_render_keeps_current_pages(self):
+        node = NodeFactory()
+        auth = Auth(node.creator)
+        node.update_node_wiki('home', 'home content', auth)
+        node.update_node_wiki('other', 'first', auth)
+        node.get_wiki_page('home').html(node)
+        node.get_wiki_page('other').html(node)
+        node.update_node_wiki('other', 'second', auth)
+        node.get_wiki_page('other').html(node)
+
+        WikiRenderCache.get_rendered('preview', node)
+        hashes = set(WikiRenderCache.objects.filter(node=node).values_list('content_hash', flat=True))
+        assert hashes == {WikiRenderCache.hash_content(content) for content in ('home content', 'second', 'preview')}
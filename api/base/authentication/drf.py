@@ -9,9 +9,10 @@ from rest_framework import exceptions
 from addons.twofactor.models import UserSettings as TwoFactorUserSettings
 from api.base.exceptions import (UnconfirmedAccountError, UnclaimedAccountError, DeactivatedAccountError,
                                  MergedAccountError, InvalidAccountError, TwoFactorRequiredError)
-from framework.auth import cas
+from framework.auth import cas, token_cache
 from framework.auth.core import get_user
-from osf.models import OSFUser, Session
+from framework.sessions.store import load_session
+from osf.models import OSFUser
 from website import settings
 
 
@@ -24,11 +25,7 @@ def get_session_from_cookie(cookie_val):
     """
 
     session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val)
-    try:
-        session = Session.objects.get(_id=session_id)
-        return session
-    except Session.DoesNotExist:
-        return None
+    return load_session(session_id)
 
 
 def check_user(user):
@@ -184,7 +181,6 @@ class OSFCASAuthentication(authentication.BaseAuthentication):
         :return: the user who owns the bear token and the cas repsonse
         """
 
-        client = cas.get_client()
         try:
             auth_header_field = request.META['HTTP_AUTHORIZATION']
             auth_token = cas.parse_auth_header(auth_header_field)
@@ -192,7 +188,7 @@ class OSFCASAuthentication(authentication.BaseAuthentication):
             return None
 
         try:
-            cas_auth_response = client.profile(auth_token)
+            cas_auth_response = token_cache.get_profile(auth_token)
         except cas.CasHTTPError:
             raise exceptions.NotAuthenticated(_('User provided an invalid OAuth2 access token'))
 
@@ -17,6 +17,11 @@ from framework.celery_tasks.handlers import (
     celery_after_request,
     celery_teardown_request
 )
+from osf.utils.permission_cache import (
+    permission_cache_after_request,
+    permission_cache_before_request,
+    permission_cache_teardown_request,
+)
 from .api_globals import api_globals
 from api.base import settings as api_settings
 
@@ -108,6 +113,21 @@ class PostcommitTaskMiddleware(object):
         return response
 
 
+class PermissionCacheMiddleware(object):
+    """
+    Scope the contributor permission cache to a request.
+    """
+    def process_request(self, request):
+        permission_cache_before_request()
+
+    def process_exception(self, request, exception):
+        permission_cache_teardown_request(error=exception)
+        return None
+
+    def process_response(self, request, response):
+        return permission_cache_after_request(response)
+
+
 # Adapted from http://www.djangosnippets.org/snippets/186/
 # Original author: udfalkso
 # Modified by: Shwagroo Team and Gun.io
@@ -979,6 +979,12 @@ class JSONAPIListSerializer(ser.ListSerializer):
         if isinstance(data, collections.Mapping):
             errors = data.get('errors', None)
             data = data.get('data', None)
+        if not enable_esi:
+            # Load embedded resources for the whole page up front where the embedded view supports it
+            for embed in self.context.get('embed', {}).values():
+                if getattr(embed, 'prefetch', None):
+                    data = list(data)
+                    embed.prefetch(data)
         if enable_esi:
             ret = [
                 self.child.to_esi_representation(item, envelope=None) for item in data
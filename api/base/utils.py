@@ -201,3 +201,16 @@ def is_deprecated(request_version, min_version, max_version):
     if request_version < min_version or request_version > max_version:
         return True
     return False
+
+
+class PrefetchedPage(list):
+    """The first page of an embedded list loaded by `get_embed_prefetch`. It reports the length of
+    the whole list as its `count()`, so that the paginator's total is that of the full list.
+    """
+
+    def __init__(self, items, total):
+        super(PrefetchedPage, self).__init__(items)
+        self.total = total
+
+    def count(self):
+        return self.total
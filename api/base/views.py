@@ -26,11 +26,28 @@ from api.nodes.permissions import ReadOnlyIfRegistration
 from api.users.serializers import UserSerializer
 from framework.auth.oauth_scopes import CoreScopes
 from osf.models.contributor import Contributor
+from osf.utils.permission_cache import prime_permissions
 from website import maintenance
 
 
+EMBED_PREFETCH = 'embed_prefetch'
+
+
+def get_embed_cache(request):
+    """Return the embed cache shared by every embedded request made while serving `request`."""
+    django_request = request
+    while hasattr(django_request, '_request'):
+        django_request = django_request._request
+    if not hasattr(django_request, '_embed_cache'):
+        django_request._embed_cache = {}
+    return django_request._embed_cache
+
+
 class JSONAPIBaseView(generics.GenericAPIView):
 
+    # URL kwarg identifying the embedding parent for views that implement `get_embed_prefetch`
+    embed_prefetch_kwarg = None
+
     def __init__(self, **kwargs):
         assert getattr(self, 'view_name', None), 'Must specify view_name on view.'
         assert getattr(self, 'view_category', None), 'Must specify view_category on view.'
@@ -48,23 +65,75 @@ class JSONAPIBaseView(generics.GenericAPIView):
         if getattr(field, 'field', None):
             field = field.field
 
+        def get_embedded_request():
+            if isinstance(self.request, EmbeddedRequest):
+                return EmbeddedRequest(self.request._request)
+            return EmbeddedRequest(self.request)
+
+        def prefetch(items):
+            """Load the embedded resource for every item of a page at once, for views that
+            support it (see `get_embed_prefetch`). Items the view cannot prefetch are left to
+            `partial`, which resolves them one at a time.
+            """
+            lookups = {}
+            for item in items:
+                try:
+                    v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
+                except Exception:
+                    # Errors are reported per item by `partial`
+                    continue
+                lookup_kwarg = getattr(v.cls, 'embed_prefetch_kwarg', None) if v else None
+                if lookup_kwarg and lookup_kwarg in view_kwargs:
+                    lookups.setdefault(v.cls, set()).add(view_kwargs[lookup_kwarg])
+
+            if not lookups:
+                return
+
+            request = get_embedded_request()
+            cache = get_embed_cache(request)
+            for view_class, values in lookups.items():
+                values = [value for value in values if (EMBED_PREFETCH, view_class, value) not in cache]
+                if not values:
+                    continue
+                view = view_class()
+                view.args = ()
+                view.kwargs = {
+                    'version': self.request.parser_context['kwargs'].get('version'),
+                    'is_embedded': True,
+                }
+                view.request = request
+                try:
+                    with transaction.atomic():
+                        prefetched = view.get_embed_prefetch(values)
+                except Exception:
+                    # Fall back to `partial`, which reports errors per item
+                    continue
+                if prefetched is None:
+                    continue
+                for value in values:
+                    if value in prefetched:
+                        cache[(EMBED_PREFETCH, view_class, value)] = prefetched[value]
+                    elif isinstance(view, ListModelMixin):
+                        cache[(EMBED_PREFETCH, view_class, value)] = []
+
         def partial(item):
             # resolve must be implemented on the field
             v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
             if not v:
                 return None
 
-            if isinstance(self.request, EmbeddedRequest):
-                request = EmbeddedRequest(self.request._request)
-            else:
-                request = EmbeddedRequest(self.request)
-
-            if not hasattr(request._request._request, '_embed_cache'):
-                request._request._request._embed_cache = {}
-            cache = request._request._request._embed_cache
+            request = get_embedded_request()
+            cache = get_embed_cache(request)
 
             request.parents.setdefault(type(item), {})[item._id] = item
 
+            lookup_kwarg = getattr(v.cls, 'embed_prefetch_kwarg', None)
+            if lookup_kwarg and not issubclass(v.cls, ListModelMixin):
+                # Detail views look their object up from the request's parents
+                prefetched = cache.get((EMBED_PREFETCH, v.cls, view_kwargs.get(lookup_kwarg)))
+                if prefetched is not None:
+                    request.parents.setdefault(type(prefetched), {})[view_kwargs[lookup_kwarg]] = prefetched
+
             view_kwargs.update({
                 'request': request,
                 'is_embedded': True,
@@ -126,8 +195,36 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             return ret
 
+        partial.prefetch = prefetch
         return partial
 
+    def paginate_queryset(self, queryset):
+        page = super(JSONAPIBaseView, self).paginate_queryset(queryset)
+        # Load the requesting user's permissions on every node of the page at once
+        prime_permissions(self.request.user, page)
+        return page
+
+    def get_embed_prefetch(self, lookups):
+        """Load this view's resource for many embedding parents at once.
+
+        Views that set `embed_prefetch_kwarg` (the URL kwarg identifying the parent, e.g. `node_id`)
+        override this to return a dict mapping each of `lookups` to the object (detail views) or list
+        of objects (list views) the view would otherwise load for it. List views read their value back
+        with `get_prefetched_embed`; detail views find it in `request.parents`.
+
+        :param list lookups: Values of `embed_prefetch_kwarg`, one per embedding parent
+        :return dict or None:
+        """
+        return None
+
+    def get_prefetched_embed(self):
+        """Return what `get_embed_prefetch` loaded for this embedded view, or None."""
+        lookup_kwarg = getattr(self, 'embed_prefetch_kwarg', None)
+        if not lookup_kwarg or not self.kwargs.get('is_embedded'):
+            return None
+        cache = get_embed_cache(self.request)
+        return cache.get((EMBED_PREFETCH, type(self), self.kwargs.get(lookup_kwarg)))
+
     def get_serializer_context(self):
         """Inject request into the serializer context. Additionally, inject partial functions
         (request, object -> embed items) if the query string contains embeds.  Allows
@@ -798,11 +895,28 @@ class BaseContributorDetail(JSONAPIBaseView, generics.RetrieveAPIView):
 
 class BaseContributorList(JSONAPIBaseView, generics.ListAPIView, ListFilterMixin):
 
+    embed_prefetch_kwarg = 'node_id'
+
     def get_default_queryset(self):
         node = self.get_node()
 
+        prefetched = self.get_prefetched_embed()
+        if prefetched is not None:
+            return prefetched
         return node.contributor_set.all()
 
+    def get_embed_prefetch(self, lookups):
+        contributors = (
+            Contributor.objects.filter(node__guids___id__in=lookups)
+            .select_related('user', 'node')
+            .prefetch_related('user__guids', 'node__guids')
+            .order_by('node_id', '_order')
+        )
+        ret = {}
+        for contributor in contributors:
+            ret.setdefault(contributor.node._id, []).append(contributor)
+        return ret
+
     def get_queryset(self):
         queryset = self.get_queryset_from_request()
         # If bulk request, queryset only contains contributors in request
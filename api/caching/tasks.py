@@ -1,12 +1,28 @@
+import logging
+import os
+import threading
 import urlparse
+from collections import Counter, OrderedDict
 
 import requests
-import logging
+from flask import _app_ctx_stack as context_stack
+from gevent.pool import Pool
 
+from api.base.api_globals import api_globals
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task, postcommit_request_state
 from website import settings
 
 logger = logging.getLogger(__name__)
 
+BAN_TIMEOUT = 0.3  # 300ms timeout for bans
+BAN_CONCURRENCY = 10
+
+# Shared so that BANs reuse connections to the varnish servers
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=BAN_CONCURRENCY))
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=BAN_CONCURRENCY))
+ban_counts = Counter()
+
 
 def get_varnish_servers():
     #  TODO: this should get the varnish servers from HAProxy or a setting
@@ -57,29 +73,138 @@ def get_bannable_urls(instance):
     return bannable_urls, parsed_absolute_url.hostname
 
 
-def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
-    if settings.ENABLE_VARNISH:
+class BanDispatcher(object):
+    """Collects bannable URL patterns and sends them to varnish as few BAN requests as
+    possible. Patterns for the same varnish server and API host are merged into one regex
+    alternation per ``VARNISH_BAN_BATCH_SIZE`` paths, and the resulting bans are sent
+    concurrently over pooled connections.
+    """
+
+    def __init__(self):
+        # (varnish server, API hostname) -> set of paths
+        self.pending = OrderedDict()
+        self.sent = False
+        # dispatch() may run on the postcommit executor while the request thread still adds
+        self.lock = threading.Lock()
+
+    def add(self, instance):
+        """Queue the bans of ``instance``. Returns False, queueing nothing, if this dispatcher
+        has already been dispatched.
+        """
         bannable_urls, hostname = get_bannable_urls(instance)
+        with self.lock:
+            if self.sent:
+                return False
+            for url in bannable_urls:
+                parsed = urlparse.urlparse(url)
+                server = '{}://{}'.format(parsed.scheme, parsed.netloc)
+                # Patterns are '<path>.*'; the wildcard is added back when the ban is built
+                path = parsed.path[:-2] if parsed.path.endswith('.*') else parsed.path
+                self.pending.setdefault((server, hostname), set()).add(path)
+        return True
 
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request('BAN', url_to_ban, timeout=timeout, headers=dict(
-                    Host=hostname
-                ))
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban
-                    ))
+    def get_bans(self, pending=None):
+        """Return a list of (url, hostname, number of paths) for every BAN request to send."""
+        bans = []
+        batch_size = settings.VARNISH_BAN_BATCH_SIZE
+        pending = self.pending if pending is None else pending
+        for (server, hostname), paths in pending.items():
+            paths = sorted(paths)
+            for i in range(0, len(paths), batch_size):
+                batch = paths[i:i + batch_size]
+                bans.append(('{}{}'.format(server, get_ban_pattern(batch)), hostname, len(batch)))
+        return bans
+
+    def dispatch(self):
+        with self.lock:
+            self.sent = True
+            pending, self.pending = self.pending, OrderedDict()
+        bans = self.get_bans(pending)
+        if not bans:
+            return
+
+        counts = Counter()
+        counts['coalesced'] = sum(num_paths for _, _, num_paths in bans) - len(bans)
+        pool = Pool(min(len(bans), BAN_CONCURRENCY))
+        for ok in pool.imap_unordered(lambda ban: send_ban(*ban[:2]), bans):
+            counts['sent' if ok else 'failed'] += 1
+        ban_counts.update(counts)
+        logger.info('Sent {sent} bans ({coalesced} coalesced, {failed} failed)'.format(
+            sent=counts['sent'], coalesced=counts['coalesced'], failed=counts['failed']
+        ))
+
+
+def get_ban_pattern(paths):
+    """Regex matching any of ``paths`` and everything beneath them. The common prefix is
+    kept outside of the alternation so the pattern is still a URL path.
+    """
+    if len(paths) == 1:
+        return '{}.*'.format(paths[0])
+    prefix = os.path.commonprefix(paths)
+    prefix = prefix[:prefix.rfind('/') + 1]
+    return '{}({}).*'.format(prefix, '|'.join(path[len(prefix):] for path in paths))
+
+
+def send_ban(url, hostname):
+    """Send one BAN, retrying up to ``VARNISH_BAN_RETRIES`` times on connection errors and
+    server errors. Returns whether varnish accepted it.
+    """
+    for attempt in range(settings.VARNISH_BAN_RETRIES + 1):
+        request = session.prepare_request(requests.Request('BAN', url, headers={'Host': hostname}))
+        # Send the pattern as written; requests would percent-encode the '|' alternation
+        request.url = url
+        try:
+            response = session.send(request, timeout=BAN_TIMEOUT)
+        except Exception as ex:
+            logger.error('Banning {} failed: {}'.format(url, ex.message))
+            continue
+        if response.ok:
+            logger.info('Banning {} succeeded'.format(url))
+            return True
+        logger.error('Banning {} failed: {}'.format(url, response.text))
+        if response.status_code < 500:
+            break
+    return False
+
+
+def get_ban_counts():
+    """Totals of bans sent, coalesced into another ban, and failed by this process."""
+    return dict(ban_counts)
+
+
+def get_dispatcher():
+    """Return the current request's dispatcher. It is dropped along with the request's
+    postcommit queues, and a new one is made once the previous has been dispatched. Each
+    is scheduled to dispatch after the request's transaction commits.
+    """
+    state = postcommit_request_state()
+    dispatcher = state.get('ban_dispatcher')
+    if dispatcher is None or dispatcher.sent:
+        dispatcher = state['ban_dispatcher'] = BanDispatcher()
+    enqueue_postcommit_task(dispatch_bans, (dispatcher, ), {}, celery=False, once_per_request=True)
+    return dispatcher
+
+
+def dispatch_bans(dispatcher):
+    dispatcher.dispatch()
+
+
+def enqueue_ban(instance):
+    """Ban ``instance`` from the cache once the current request has committed, together with
+    every other ban made during the request. Outside of a request the ban is sent immediately.
+    """
+    if not settings.ENABLE_VARNISH:
+        return
+    if context_stack.top is None and getattr(api_globals, 'request', None) is None:
+        return ban_url(instance)
+    while not get_dispatcher().add(instance):
+        # Dispatched after the commit in the meantime; the next dispatcher will send it
+        pass
+
+
+def ban_url(instance):
+    """Ban ``instance`` from the cache now."""
+    if settings.ENABLE_VARNISH:
+        dispatcher = BanDispatcher()
+        dispatcher.add(instance)
+        dispatcher.dispatch()
@@ -1,5 +1,7 @@
 import os
 import re
+import threading
+from collections import namedtuple
 
 from citeproc import CitationStylesStyle, CitationStylesBibliography
 from citeproc import Citation, CitationItem
@@ -7,8 +9,19 @@ from citeproc import formatter
 from citeproc.source.json import CiteProcJSON
 
 from osf.models import PreprintService
+from osf.utils.caching import LRUCache
+from website import settings
 from website.settings import CITATION_STYLES_PATH, BASE_PATH, CUSTOM_CITATIONS
 
+# Parsed styles are keyed by file mtime, so they only expire to make room for others
+STYLE_CACHE_TTL = 24 * 60 * 60
+
+# citeproc keeps rendering state on the parsed style, so renders with one style are serialized
+ParsedStyle = namedtuple('ParsedStyle', ['style', 'lock'])
+
+style_cache = LRUCache(settings.CITATION_STYLE_CACHE_SIZE, STYLE_CACHE_TTL)
+citation_cache = LRUCache(settings.CITATION_CACHE_SIZE, settings.CITATION_CACHE_TTL)
+
 
 def clean_up_common_errors(cit):
     cit = re.sub(r"\.+", '.', cit)
@@ -37,31 +50,39 @@ def preprint_csl(preprint, node):
 
     return csl
 
-def render_citation(node, style='apa'):
-    """Given a node, return a citation"""
-    csl = None
-    if isinstance(node, PreprintService):
-        csl = preprint_csl(node, node.node)
-        data = [csl, ]
-    else:
-        data = [node.csl, ]
-
-    bib_source = CiteProcJSON(data)
-
+def get_style_path(style):
     custom = CUSTOM_CITATIONS.get(style, False)
     path = os.path.join(BASE_PATH, 'static', custom) if custom else os.path.join(CITATION_STYLES_PATH, style)
-    bib_style = CitationStylesStyle(path, validate=False)
-
-    bibliography = CitationStylesBibliography(bib_style, bib_source, formatter.plain)
-
-    citation = Citation([CitationItem(node._id)])
-
-    bibliography.register(citation)
+    if not os.path.exists(path):
+        path = '{}.csl'.format(path)
+    return path
+
+
+def get_style(style):
+    """Return the parsed CSL style ``style``, from the cache unless its file changed since it was parsed.
+
+    :rtype: ParsedStyle
+    :raises: ValueError if there's no such style
+    """
+    path = get_style_path(style)
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        raise ValueError("'{}' is not a known style".format(path))
+    parsed = style_cache.get(key)
+    if parsed is None:
+        parsed = ParsedStyle(CitationStylesStyle(path, validate=False), threading.Lock())
+        style_cache.set(key, parsed)
+    return parsed
+
+
+def get_csl(node):
+    if isinstance(node, PreprintService):
+        return preprint_csl(node, node.node)
+    return node.csl
 
-    bib = bibliography.bibliography()
-    cit = unicode(bib[0] if len(bib) else '')
 
-    title = csl['title'] if csl else node.csl['title']
+def clean_up_citation(cit, title):
     if cit.count(title) == 1:
         i = cit.index(title)
         prefix = clean_up_common_errors(cit[0:i])
@@ -69,5 +90,46 @@ def render_citation(node, style='apa'):
         cit = prefix + title + suffix
     elif cit.count(title) == 0:
         cit = clean_up_common_errors(cit)
-
     return cit
+
+
+def render_citations(nodes, style='apa'):
+    """Given nodes or preprints, return their citations in the same order, rendered in a single
+    bibliography. Numbered styles number the citations in that order.
+    """
+    csls = [get_csl(node) for node in nodes]
+    bib_source = CiteProcJSON(csls)
+    parsed = get_style(style)
+
+    with parsed.lock:
+        bibliography = CitationStylesBibliography(parsed.style, bib_source, formatter.plain)
+        bibliography.register(Citation([CitationItem(csl['id']) for csl in csls]))
+        rendered = {}
+        for item in bibliography.items:
+            bib = parsed.style.render_bibliography([item])
+            rendered[item.key] = unicode(bib[0] if len(bib) else '')
+
+    return [
+        clean_up_citation(rendered.get(str(csl['id']).lower(), u''), csl['title'])
+        for csl in csls
+    ]
+
+
+def render_citation(node, style='apa'):
+    """Given a node, return a citation"""
+    return render_citations([node], style=style)[0]
+
+
+def get_citation(node, style='apa'):
+    """Same as ``render_citation``, cached until the node (or preprint) is modified."""
+    if settings.CITATION_CACHE_TTL <= 0:
+        return render_citation(node, style=style)
+    if isinstance(node, PreprintService):
+        key = (node._id, style, node.date_modified, node.node.date_modified)
+    else:
+        key = (node._id, style, node.date_modified)
+    citation = citation_cache.get(key)
+    if citation is None:
+        citation = render_citation(node, style=style)
+        citation_cache.set(key, citation)
+    return citation
@@ -6,7 +6,7 @@ from django.db.models import Q
 from rest_framework import generics, permissions as drf_permissions
 from rest_framework.exceptions import PermissionDenied, ValidationError, NotFound, MethodNotAllowed, NotAuthenticated
 from rest_framework.response import Response
-from rest_framework.status import HTTP_204_NO_CONTENT
+from rest_framework.status import HTTP_202_ACCEPTED, HTTP_204_NO_CONTENT
 
 from api.addons.serializers import NodeAddonFolderSerializer
 from api.addons.views import AddonSettingsMixin
@@ -47,8 +47,8 @@ from api.base.views import (
     LinkedNodesRelationship,
     LinkedRegistrationsRelationship
 )
-from api.caching.tasks import ban_url
-from api.citations.utils import render_citation
+from api.caching.tasks import enqueue_ban
+from api.citations.utils import get_citation
 from api.comments.permissions import CanCommentOrPublic
 from api.comments.serializers import (CommentCreateSerializer,
                                       NodeCommentSerializer)
@@ -97,7 +97,6 @@ from api.registrations.serializers import RegistrationSerializer
 from api.users.views import UserMixin
 from api.wikis.serializers import NodeWikiSerializer
 from framework.auth.oauth_scopes import CoreScopes
-from framework.postcommit_tasks.handlers import enqueue_postcommit_task
 from osf.models import AbstractNode
 from osf.models import (Node, PrivateLink, NodeLog, Institution, Comment, DraftRegistration, PreprintService)
 from osf.models import OSFUser as User
@@ -561,11 +560,15 @@ class NodeDetail(JSONAPIBaseView, generics.RetrieveUpdateDestroyAPIView, NodeMix
     serializer_class = NodeDetailSerializer
     view_category = 'nodes'
     view_name = 'node-detail'
+    embed_prefetch_kwarg = 'node_id'
 
     # overrides RetrieveUpdateDestroyAPIView
     def get_object(self):
         return self.get_node()
 
+    def get_embed_prefetch(self, lookups):
+        return {node._id: node for node in Node.objects.filter(guids___id__in=lookups).include('guids')}
+
     # overrides RetrieveUpdateDestroyAPIView
     def perform_destroy(self, instance):
         auth = get_user_auth(self.request)
@@ -1370,7 +1373,7 @@ class NodeCitationStyleDetail(JSONAPIBaseView, generics.RetrieveAPIView, NodeMix
 
         style = self.kwargs.get('style_id')
         try:
-            citation = render_citation(node=node, style=style)
+            citation = get_citation(node=node, style=style)
         except ValueError as err:  # style requested could not be found
             csl_name = re.findall('[a-zA-Z]+\.csl', err.message)[0]
             raise NotFound('{} is not a known style.'.format(csl_name))
@@ -1613,10 +1616,15 @@ class NodeForksList(JSONAPIBaseView, generics.ListCreateAPIView, NodeMixin, Node
     201 response with the representation of the forked node in the body. For the new fork's canonical URL, see the `/links/self`
     field of the response.
 
+    Large projects can be forked in the background by adding the `async=true` query param. The API will then return a 202
+    response with the id of the background task as `meta.task_id`, and the fork will be listed here once it is created.
+
     ##Query Params
 
     + `page=<Int>` -- page number of results to view, default 1
 
+    + `async=<Bool>` -- when creating a fork, fork the node in the background, default false
+
     + `filter[<fieldname>]=<Str>` -- fields and values to filter the search results on.
 
     <!--- Copied Query Params from NodeList -->
@@ -1650,6 +1658,18 @@ class NodeForksList(JSONAPIBaseView, generics.ListCreateAPIView, NodeMixin, Node
         node_pks = [node.pk for node in all_forks if node.can_view(auth)]
         return AbstractNode.objects.filter(pk__in=node_pks)
 
+    # overrides ListCreateAPIView
+    def create(self, request, *args, **kwargs):
+        if not is_truthy(request.query_params.get('async', False)):
+            return super(NodeForksList, self).create(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = self.get_node().fork_node_async(get_user_auth(request), title=serializer.validated_data.get('title'))
+        except NodeStateError as err:
+            raise ValidationError(err.message)
+        return Response({'meta': {'task_id': result.id}}, status=HTTP_202_ACCEPTED)
+
     # overrides ListCreateAPIView
     def perform_create(self, serializer):
         serializer.save(node=self.get_node())
@@ -1964,8 +1984,16 @@ class NodeFilesList(JSONAPIBaseView, generics.ListAPIView, WaterButlerMixin, Lis
             # Resolve to a provider-specific subclass, so that
             # trashed file nodes are filtered out automatically
             ConcreteFileNode = BaseFileNode.resolve_class(provider, BaseFileNode.ANY)
+            file_nodes = BaseFileNode.bulk_update_metadata(
+                self.get_node(check_object_permissions=False),
+                [item['attributes'] for item in files_list],
+                user=self.request.user,
+            )
+            # Permissions only depend on the node, so checking one file checks them all
+            if file_nodes:
+                self.check_object_permissions(self.request, file_nodes[0])
             return ConcreteFileNode.objects.filter(
-                id__in=[self.get_file_item(file).id for file in files_list],
+                id__in=[file_node.id for file_node in file_nodes],
             )
 
         if isinstance(files_list, list) or not isinstance(files_list, Folder):
@@ -3438,7 +3466,7 @@ class NodeViewOnlyLinkDetail(JSONAPIBaseView, generics.RetrieveUpdateDestroyAPIV
         assert isinstance(link, PrivateLink), 'link must be a PrivateLink'
         link.is_deleted = True
         link.save()
-        enqueue_postcommit_task(ban_url, (self.get_node(),), {}, celery=True, once_per_request=True)
+        enqueue_ban(self.get_node())
 
 
 class NodeIdentifierList(NodeMixin, IdentifierList):
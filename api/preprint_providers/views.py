@@ -238,13 +238,7 @@ class PreprintProviderSubjectList(JSONAPIBaseView, generics.ListAPIView):
         # TODO: Delet this when all PreprintProviders have a mapping
         if sub._id in allowed_parents:
             return True
-        if sub.parent:
-            if sub.parent._id in allows_children:
-                return True
-            if sub.parent.parent:
-                if sub.parent.parent._id in allows_children:
-                    return True
-        return False
+        return any(ancestor_id in allows_children for ancestor_id in sub.hierarchy[:-1])
 
     def get_queryset(self):
         parent = self.request.query_params.get('filter[parents]', None) or self.request.query_params.get('filter[parent]', None)
@@ -18,7 +18,7 @@ from api.base.parsers import (
 )
 from api.base.utils import get_object_or_error, get_user_auth
 from api.base import permissions as base_permissions
-from api.citations.utils import render_citation, preprint_csl
+from api.citations.utils import get_citation, preprint_csl
 from api.preprints.serializers import (
     PreprintSerializer,
     PreprintCreateSerializer,
@@ -338,7 +338,7 @@ class PreprintCitationStyleDetail(JSONAPIBaseView, generics.RetrieveAPIView, Pre
 
         if preprint.node.is_public or preprint.node.can_view(auth) or preprint.is_published:
             try:
-                citation = render_citation(node=preprint, style=style)
+                citation = get_citation(node=preprint, style=style)
             except ValueError as err:  # style requested could not be found
                 csl_name = re.findall('[a-zA-Z]+\.csl', err.message)[0]
                 raise NotFound('{} is not a known style.'.format(csl_name))
@@ -3,7 +3,7 @@ from rest_framework.exceptions import ValidationError, NotFound
 from framework.auth.oauth_scopes import CoreScopes
 from modularodm import Q
 
-from osf.models import AbstractNode as Node
+from osf.models import AbstractNode as Node, Registration
 from api.base import permissions as base_permissions
 from api.base.views import JSONAPIBaseView, BaseContributorDetail, BaseContributorList, BaseNodeLinksDetail, BaseNodeLinksList
 
@@ -59,12 +59,18 @@ class RegistrationMixin(NodeMixin):
     node_lookup_url_kwarg = 'node_id'
 
     def get_node(self, check_object_permissions=True):
-        node = get_object_or_error(
-            Node,
-            self.kwargs[self.node_lookup_url_kwarg],
-            display_name='node'
-
-        )
+        node = None
+
+        if self.kwargs.get('is_embedded') is True:
+            # If this is an embedded request, the registration might be cached somewhere
+            node = self.request.parents.get(Registration, {}).get(self.kwargs[self.node_lookup_url_kwarg])
+
+        if node is None:
+            node = get_object_or_error(
+                Node,
+                self.kwargs[self.node_lookup_url_kwarg],
+                display_name='node'
+            )
         # Nodes that are folders/collections are treated as a separate resource, so if the client
         # requests a collection through a node endpoint, we return a 404
         if node.is_collection or not node.is_registration:
@@ -284,6 +290,7 @@ class RegistrationDetail(JSONAPIBaseView, generics.RetrieveUpdateAPIView, Regist
     serializer_class = RegistrationDetailSerializer
     view_category = 'registrations'
     view_name = 'registration-detail'
+    embed_prefetch_kwarg = 'node_id'
 
     # overrides RetrieveAPIView
     def get_object(self):
@@ -292,6 +299,9 @@ class RegistrationDetail(JSONAPIBaseView, generics.RetrieveUpdateAPIView, Regist
             raise ValidationError('This is not a registration.')
         return registration
 
+    def get_embed_prefetch(self, lookups):
+        return {registration._id: registration for registration in Registration.objects.filter(guids___id__in=lookups).include('guids')}
+
 
 class RegistrationContributorsList(BaseContributorList, RegistrationMixin, UserMixin):
     """Contributors (users) for a registration.
@@ -53,7 +53,7 @@ class TaxonomyList(JSONAPIBaseView, generics.ListAPIView, ODMFilterMixin):
         return
 
     def get_queryset(self):
-        return Subject.find(self.get_query_from_request())
+        return Subject.find(self.get_query_from_request()).select_related('parent')
 
     # overrides FilterMixin
     def postprocess_query_param(self, key, field_name, operation):
@@ -1,3 +1,4 @@
+import heapq
 
 from api.addons.views import AddonSettingsMixin
 from api.base import permissions as base_permissions
@@ -6,7 +7,8 @@ from api.base.filters import ListFilterMixin, ODMFilterMixin, PreprintFilterMixi
 from api.base.parsers import (JSONAPIRelationshipParser,
                               JSONAPIRelationshipParserForRegularJSON)
 from api.base.serializers import AddonAccountSerializer
-from api.base.utils import (default_node_list_query,
+from api.base.utils import (PrefetchedPage,
+                            default_node_list_query,
                             default_node_permission_query,
                             get_object_or_error,
                             get_user_auth)
@@ -60,7 +62,7 @@ class UserMixin(object):
 
         if self.kwargs.get('is_embedded') is True:
             if key in self.request.parents[User]:
-                return self.request.parents[key]
+                return self.request.parents[User][key]
 
         current_user = self.request.user
 
@@ -513,6 +515,7 @@ class UserNodes(JSONAPIBaseView, generics.ListAPIView, UserMixin, NodesFilterMix
     serializer_class = NodeSerializer
     view_category = 'users'
     view_name = 'user-nodes'
+    embed_prefetch_kwarg = 'user_id'
 
     # overrides NodesFilterMixin
     def get_default_queryset(self):
@@ -524,6 +527,10 @@ class UserNodes(JSONAPIBaseView, generics.ListAPIView, UserMixin, NodesFilterMix
 
     # overrides ListAPIView
     def get_queryset(self):
+        prefetched = self.get_prefetched_embed()
+        if prefetched is not None:
+            self.get_user()
+            return prefetched
         return (
             Node.objects.filter(id__in=set(self.get_queryset_from_request().values_list('id', flat=True)))
             .select_related('node_license')
@@ -531,6 +538,44 @@ class UserNodes(JSONAPIBaseView, generics.ListAPIView, UserMixin, NodesFilterMix
             .include('guids', 'contributor__user__guids', 'root__guids', limit_includes=10)
         )
 
+    def get_embed_prefetch(self, lookups):
+        # Embedded lists only show their first page, so only that page of each user's nodes is loaded
+        page_size = self.pagination_class.page_size
+        contributions = (
+            Contributor.objects.filter(user__guids___id__in=lookups, node__is_deleted=False, node__type='osf.node')
+            .values_list('user__guids___id', 'node_id', 'node__is_public', 'node__date_modified')
+        )
+        current_user = self.request.user
+        visible_ids = set()
+        if not current_user.is_anonymous:
+            visible_ids = set(Contributor.objects.filter(user=current_user).values_list('node_id', flat=True))
+
+        visible_by_user = {}
+        for user_id, node_id, is_public, date_modified in contributions:
+            # Mirrors get_default_queryset: other users' nodes are limited to those the requester can see
+            if user_id == getattr(current_user, '_id', None) or is_public or node_id in visible_ids:
+                visible_by_user.setdefault(user_id, []).append((date_modified, node_id))
+
+        user_ids_by_node = {}
+        for user_id, visible in visible_by_user.items():
+            for date_modified, node_id in heapq.nlargest(page_size, visible):
+                user_ids_by_node.setdefault(node_id, []).append(user_id)
+
+        nodes = (
+            Node.objects.filter(id__in=user_ids_by_node.keys())
+            .select_related('node_license')
+            .order_by('-date_modified', )
+            .include('guids', 'contributor__user__guids', 'root__guids', limit_includes=10)
+        )
+        pages = {}
+        for node in nodes:
+            for user_id in user_ids_by_node[node.id]:
+                pages.setdefault(user_id, []).append(node)
+        return {
+            user_id: PrefetchedPage(pages.get(user_id, []), len(visible))
+            for user_id, visible in visible_by_user.items()
+        }
+
 
 class UserPreprints(JSONAPIBaseView, generics.ListAPIView, UserMixin, PreprintFilterMixin):
     permission_classes = (
@@ -0,0 +1,133 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.base.settings.defaults import API_BASE
+from framework.auth.core import Auth
+from osf.models import Node
+from osf_tests.factories import (
+    AuthUserFactory,
+    ProjectFactory,
+    RegistrationFactory,
+)
+
+
+def count_queries(app, url, auth):
+    with CaptureQueriesContext(connection) as ctx:
+        res = app.get(url, auth=auth)
+    assert res.status_code == 200
+    return len(ctx.captured_queries), res
+
+
+def embed_overhead(app, url, embed, auth):
+    """Number of queries `?embed=<embed>` adds on top of the plain list request."""
+    base_count, _ = count_queries(app, url, auth)
+    separator = '&' if '?' in url else '?'
+    embed_count, res = count_queries(app, '{}{}embed={}'.format(url, separator, embed), auth)
+    return embed_count - base_count, res
+
+
+@pytest.fixture()
+def user():
+    return AuthUserFactory()
+
+
+@pytest.mark.django_db
+class TestEmbedPrefetchQueryCount:
+
+    def make_nodes(self, user, count):
+        contributor = AuthUserFactory()
+        nodes = []
+        for _ in range(count):
+            node = ProjectFactory(creator=user, is_public=True)
+            node.add_contributor(contributor, auth=Auth(user), save=True)
+            nodes.append(node)
+        return nodes
+
+    def test_node_list_embed_contributors_is_constant(self, app, user):
+        url = '/{}users/{}/nodes/'.format(API_BASE, user._id)
+
+        self.make_nodes(user, 2)
+        small_overhead, _ = embed_overhead(app, url, 'contributors', user.auth)
+
+        self.make_nodes(user, 4)
+        large_overhead, res = embed_overhead(app, url, 'contributors', user.auth)
+
+        assert large_overhead == small_overhead
+        for node in res.json['data']:
+            contributor_ids = [contrib['id'] for contrib in node['embeds']['contributors']['data']]
+            assert contributor_ids[0] == '{}-{}'.format(node['id'], user._id)
+            assert len(contributor_ids) == 2
+
+    def test_node_list_embed_parent_is_constant(self, app, user):
+        url = '/{}users/{}/nodes/'.format(API_BASE, user._id)
+        parent = ProjectFactory(creator=user, is_public=True)
+
+        for _ in range(2):
+            ProjectFactory(creator=user, is_public=True, parent=parent)
+        small_overhead, _ = embed_overhead(app, url, 'parent', user.auth)
+
+        for _ in range(4):
+            ProjectFactory(creator=user, is_public=True, parent=parent)
+        large_overhead, res = embed_overhead(app, url, 'parent', user.auth)
+
+        assert large_overhead == small_overhead
+        embedded_parents = [node['embeds']['parent'] for node in res.json['data'] if node['id'] != parent._id]
+        assert all(embed['data']['id'] == parent._id for embed in embedded_parents)
+
+    def test_registration_list_embed_contributors_is_constant(self, app, user):
+        url = '/{}registrations/'.format(API_BASE)
+
+        for node in self.make_nodes(user, 2):
+            RegistrationFactory(project=node, creator=user, is_public=True)
+        small_overhead, _ = embed_overhead(app, url, 'contributors', user.auth)
+
+        for node in self.make_nodes(user, 4):
+            RegistrationFactory(project=node, creator=user, is_public=True)
+        large_overhead, res = embed_overhead(app, url, 'contributors', user.auth)
+
+        assert large_overhead == small_overhead
+        for registration in res.json['data']:
+            assert 'errors' not in registration['embeds']['contributors']
+
+    def test_user_list_embed_nodes_is_constant(self, app, user):
+        url = '/{}users/'.format(API_BASE)
+
+        for _ in range(2):
+            ProjectFactory(creator=AuthUserFactory(), is_public=True)
+        small_overhead, _ = embed_overhead(app, url, 'nodes', user.auth)
+
+        for _ in range(4):
+            ProjectFactory(creator=AuthUserFactory(), is_public=True)
+        large_overhead, res = embed_overhead(app, url, 'nodes', user.auth)
+
+        assert large_overhead == small_overhead
+        for embedded_user in res.json['data']:
+            assert 'errors' not in embedded_user['embeds']['nodes']
+
+    def test_user_list_embed_nodes_loads_first_page(self, app, user):
+        creator = AuthUserFactory()
+        nodes = [ProjectFactory(creator=creator, is_public=True) for _ in range(12)]
+        url = '/{}users/?filter[id]={}&embed=nodes'.format(API_BASE, creator._id)
+
+        res = app.get(url, auth=user.auth)
+        assert res.status_code == 200
+        embedded_nodes = res.json['data'][0]['embeds']['nodes']
+        assert embedded_nodes['links']['meta']['total'] == 12
+        newest = Node.objects.filter(id__in=[node.id for node in nodes]).order_by('-date_modified')[:10]
+        assert [node['id'] for node in embedded_nodes['data']] == [node._id for node in newest]
+
+    def test_embed_errors_are_reported_per_item(self, app, user):
+        url = '/{}users/{}/nodes/?embed=parent'.format(API_BASE, user._id)
+        private_parent = ProjectFactory(is_public=False)
+        ProjectFactory(creator=user, is_public=True, parent=private_parent)
+        visible_parent = ProjectFactory(creator=user, is_public=True)
+        ProjectFactory(creator=user, is_public=True, parent=visible_parent)
+
+        res = app.get(url, auth=user.auth)
+        assert res.status_code == 200
+        embeds = {node['id']: node.get('embeds', {}).get('parent') for node in res.json['data']}
+        errored = [embed for embed in embeds.values() if embed and 'errors' in embed]
+        succeeded = [embed for embed in embeds.values() if embed and 'data' in embed]
+        assert len(errored) == 1
+        assert succeeded[0]['data']['id'] == visible_parent._id
@@ -0,0 +1,109 @@
+import mock
+import pytest
+import requests
+
+from api.caching import tasks
+from api.caching.tasks import BanDispatcher, enqueue_ban, get_ban_pattern, get_dispatcher, send_ban
+from framework.postcommit_tasks.handlers import postcommit_after_request, postcommit_before_request
+from osf_tests.factories import ProjectFactory
+from website import settings
+
+VARNISH_SERVER = 'http://localhost:8193'
+
+
+@pytest.yield_fixture(autouse=True)
+def varnish_settings():
+    with mock.patch.object(settings, 'ENABLE_VARNISH', True), \
+            mock.patch.object(settings, 'VARNISH_SERVERS', [VARNISH_SERVER]), \
+            mock.patch.object(settings, 'VARNISH_BAN_RETRIES', 2):
+        yield
+
+
+@pytest.yield_fixture()
+def mock_send_ban():
+    with mock.patch('api.caching.tasks.send_ban', return_value=True) as mock_send:
+        yield mock_send
+
+
+def test_ban_pattern():
+    assert get_ban_pattern(['/v2/nodes/abc12/']) == '/v2/nodes/abc12/.*'
+    assert get_ban_pattern(['/v2/nodes/abc12/', '/v2/nodes/def34/']) == '/v2/nodes/(abc12/|def34/).*'
+    assert get_ban_pattern(['/v2/nodes/abc12/', '/v2/users/def34/']) == '/v2/(nodes/abc12/|users/def34/).*'
+
+
+@pytest.mark.django_db
+class TestBanDispatcher:
+
+    def test_bans_are_deduplicated_and_coalesced(self, mock_send_ban):
+        nodes = [ProjectFactory() for _ in range(3)]
+        dispatcher = BanDispatcher()
+        for node in nodes + nodes:
+            dispatcher.add(node)
+
+        counts_before = tasks.get_ban_counts()
+        dispatcher.dispatch()
+
+        assert mock_send_ban.call_count == 1
+        url, hostname = mock_send_ban.call_args[0]
+        assert url.startswith('{}/v2/nodes/('.format(VARNISH_SERVER))
+        assert all('{}/'.format(node._id) in url for node in nodes)
+        counts = tasks.get_ban_counts()
+        assert counts['sent'] - counts_before.get('sent', 0) == 1
+        assert counts['coalesced'] - counts_before.get('coalesced', 0) == 2
+        assert dispatcher.sent
+
+    def test_bans_are_split_into_batches(self, mock_send_ban):
+        dispatcher = BanDispatcher()
+        for node in [ProjectFactory() for _ in range(5)]:
+            dispatcher.add(node)
+        with mock.patch.object(settings, 'VARNISH_BAN_BATCH_SIZE', 2):
+            dispatcher.dispatch()
+        assert mock_send_ban.call_count == 3
+
+    def test_dispatched_dispatcher_refuses_bans(self, mock_send_ban):
+        dispatcher = BanDispatcher()
+        dispatcher.dispatch()
+        assert dispatcher.add(ProjectFactory()) is False
+        assert not dispatcher.pending
+
+    def test_dispatcher_is_scoped_to_the_request(self, mock_send_ban):
+        postcommit_before_request()
+        dispatcher = get_dispatcher()
+        dispatcher.add(ProjectFactory())
+        # The errored request's bans are dropped along with its postcommit tasks
+        postcommit_after_request(mock.Mock(status_code=500))
+        postcommit_before_request()
+        assert get_dispatcher() is not dispatcher
+        assert not get_dispatcher().pending
+
+    def test_enqueue_ban_outside_of_request_sends_immediately(self, mock_send_ban):
+        node = ProjectFactory()
+        enqueue_ban(node)
+        mock_send_ban.assert_called_once_with('{}/v2/nodes/{}/.*'.format(VARNISH_SERVER, node._id), 'localhost')
+
+    def test_nothing_is_sent_when_varnish_is_disabled(self, mock_send_ban):
+        with mock.patch.object(settings, 'ENABLE_VARNISH', False):
+            enqueue_ban(ProjectFactory())
+        assert not mock_send_ban.called
+
+
+class TestSendBan:
+
+    def test_connection_errors_are_retried(self):
+        with mock.patch.object(tasks.session, 'send', side_effect=requests.ConnectionError) as mock_send:
+            assert send_ban('{}/v2/nodes/(a/|b/).*'.format(VARNISH_SERVER), 'localhost') is False
+        assert mock_send.call_count == 3
+        # The alternation is sent unescaped
+        assert mock_send.call_args[0][0].url == '{}/v2/nodes/(a/|b/).*'.format(VARNISH_SERVER)
+
+    def test_client_errors_are_not_retried(self):
+        response = mock.Mock(ok=False, status_code=405, text='Not allowed')
+        with mock.patch.object(tasks.session, 'send', return_value=response) as mock_send:
+            assert send_ban('{}/v2/nodes/a/.*'.format(VARNISH_SERVER), 'localhost') is False
+        assert mock_send.call_count == 1
+
+    def test_success(self):
+        response = mock.Mock(ok=True, status_code=200)
+        with mock.patch.object(tasks.session, 'send', return_value=response) as mock_send:
+            assert send_ban('{}/v2/nodes/a/.*'.format(VARNISH_SERVER), 'localhost') is True
+        assert mock_send.call_count == 1
@@ -8,6 +8,7 @@ from nose.tools import *  # flake8: noqa
 
 from framework.auth.core import Auth
 
+from addons.github.models import GithubFile, GithubFolder
 from addons.github.tests.factories import GitHubAccountFactory
 from osf.models import AbstractNode as Node
 from website.util import waterbutler_api_url_for
@@ -229,6 +230,36 @@ class TestNodeFilesList(ApiTestCase):
         assert_equal(res.json['data'][0]['attributes']['name'], 'NewFile')
         assert_equal(res.json['data'][0]['attributes']['provider'], 'github')
 
+    def test_node_files_list_updates_stored_metadata(self):
+        self.add_github()
+        url = '/{}nodes/{}/files/github/'.format(API_BASE, self.project._id)
+        self._prepare_mock_wb_response(provider='github', files=[
+            {'name': 'NewFile', 'path': '/NewFile', 'materialized': '/NewFile'},
+            {'name': 'NewFolder', 'path': '/NewFolder/', 'materialized': '/NewFolder/', 'kind': 'folder'},
+        ])
+        res = self.app.get(url, auth=self.user.auth)
+        assert_equal(len(res.json['data']), 2)
+        file_node = GithubFile.objects.get(node=self.project, _path='/NewFile')
+        assert_equal(file_node.materialized_path, '/NewFile')
+        assert_equal(len(file_node.history), 1)
+        assert_is_not_none(file_node.last_touched)
+        folder = GithubFolder.objects.get(node=self.project, _path='/NewFolder/')
+        assert_equal(folder.name, 'NewFolder')
+
+        httpretty.reset()
+        self._prepare_mock_wb_response(provider='github', files=[
+            {'name': 'Renamed', 'path': '/NewFile', 'materialized': '/Renamed', 'etag': 'abc'},
+            {'name': 'NewFolder', 'path': '/NewFolder/', 'materialized': '/NewFolder/', 'kind': 'folder'},
+        ])
+        res = self.app.get(url, auth=self.user.auth)
+        assert_equal(len(res.json['data']), 2)
+        assert_equal(GithubFile.objects.filter(node=self.project).count(), 1)
+        file_node.refresh_from_db()
+        assert_equal(file_node.name, 'Renamed')
+        assert_equal(file_node.materialized_path, '/Renamed')
+        assert_equal(len(file_node.history), 2)
+        assert_greater(GithubFolder.objects.get(id=folder.id).last_touched, folder.last_touched)
+
     def test_returns_node_file(self):
         self._prepare_mock_wb_response(provider='github', files=[{'name': 'NewFile'}], folder=False, path='/file')
         self.add_github()
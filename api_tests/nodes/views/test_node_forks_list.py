@@ -1,3 +1,4 @@
+import mock
 from nose.tools import *  # flake8: noqa
 
 from framework.auth.core import Auth
@@ -176,6 +177,21 @@ class TestNodeForkCreate(ApiTestCase):
         assert_equal(res.json['data']['id'], self.public_project.forks.first()._id)
         assert_equal(res.json['data']['attributes']['title'], 'Fork of ' + self.public_project.title)
 
+    @mock.patch('website.project.tasks.fork_node.delay')
+    def test_create_fork_async(self, mock_delay):
+        mock_delay.return_value.id = 'task-id'
+        res = self.app.post_json_api(self.public_project_url + '?async=true', self.fork_data_with_title, auth=self.user_two.auth)
+        assert_equal(res.status_code, 202)
+        assert_equal(res.json['meta']['task_id'], 'task-id')
+        mock_delay.assert_called_once_with(self.public_project._id, self.user_two._id, title='My Forked Project')
+        assert_equal(self.public_project.forks.count(), 0)
+
+    @mock.patch('website.project.tasks.fork_node.delay')
+    def test_cannot_fork_private_node_async_logged_in_non_contributor(self, mock_delay):
+        res = self.app.post_json_api(self.private_project_url + '?async=true', self.fork_data, auth=self.user_two.auth, expect_errors=True)
+        assert_equal(res.status_code, 403)
+        assert_false(mock_delay.called)
+
     def test_cannot_fork_public_node_logged_out(self):
         res = self.app.post_json_api(self.public_project_url, self.fork_data, expect_errors=True)
         assert_equal(res.status_code, 401)
@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import atexit
+import collections
 import functools
 import logging
+import os
+import threading
+import time
 
-from flask import request
+from flask import has_request_context, request
 
-from framework.celery_tasks import app
 from framework.postcommit_tasks.handlers import run_postcommit
+from osf.utils.hyperloglog import HyperLogLog
+from website import settings
 
 logger = logging.getLogger(__name__)
 
@@ -20,9 +26,120 @@ collection = None
 # else:
 #     raise RuntimeError('Cannot connect to database')
 
-@run_postcommit(once_per_request=False, celery=True)
-@app.task(max_retries=5, default_retry_delay=60)
+class FlushTimer(object):
+    """Calls ``flush`` every ``interval_setting`` seconds from a daemon thread, so that buffered
+    counts are written even if nothing else is counted for a while. The thread is started by the
+    first ``start`` in each process, since threads don't survive a fork.
+    """
+
+    def __init__(self, flush, interval_setting):
+        self.flush = flush
+        self.interval_setting = interval_setting
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def interval(self):
+        return getattr(settings, self.interval_setting)
+
+    def start(self):
+        if self._pid == os.getpid() or self.interval() <= 0:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        thread = threading.Thread(target=self.run, name='{}-timer'.format(self.flush.__name__))
+        thread.daemon = True
+        thread.start()
+
+    def run(self):
+        from django.db import connection
+        while self.interval() > 0:
+            time.sleep(self.interval())
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Periodic {} failed'.format(self.flush.__name__))
+            finally:
+                connection.close()
+
+
+class UserActivityBuffer(object):
+    """User actions counted by this process but not yet written to the database.
+
+    Increments are kept per (user, action, day) and written by ``flush_user_activity_counters``
+    once ``USER_ACTIVITY_FLUSH_INTERVAL`` seconds have passed or ``USER_ACTIVITY_BUFFER_SIZE``
+    entries have built up, every interval by ``timer``, after each celery task and when the
+    process exits.
+    """
+
+    def __init__(self, timer=None):
+        self._lock = threading.Lock()
+        self.last_flush = time.time()
+        self.timer = timer
+        self.counts = collections.defaultdict(int)
+
+    def add(self, user_id, action, day):
+        with self._lock:
+            self.counts[(user_id, action, day)] += 1
+        if self.timer:
+            self.timer.start()
+
+    def pending(self, user_id):
+        """Return the number of actions of ``user_id`` counted but not yet flushed."""
+        with self._lock:
+            return sum(total for (user, _, _), total in self.counts.items() if user == user_id)
+
+    def flush_due(self):
+        return (
+            len(self.counts) >= settings.USER_ACTIVITY_BUFFER_SIZE or
+            time.time() - self.last_flush >= settings.USER_ACTIVITY_FLUSH_INTERVAL
+        )
+
+    def drain(self):
+        """Empty the buffer, returning its counts."""
+        with self._lock:
+            counts = dict(self.counts)
+            self.counts = collections.defaultdict(int)
+            self.last_flush = time.time()
+        return counts
+
+    def restore(self, counts):
+        """Put drained counts that could not be written back into the buffer."""
+        with self._lock:
+            for key, total in counts.items():
+                self.counts[key] += total
+
+
+def flush_user_activity_counters():
+    """Write the buffered user activity counters, keeping them in the buffer if that fails."""
+    from osf.models import UserActivityCounter
+    counts = user_activity_buffer.drain()
+    if not counts:
+        return
+    try:
+        UserActivityCounter.flush_counts(counts)
+    except Exception:
+        logger.exception('Could not write {} user activity counters, keeping them for the next flush'.format(len(counts)))
+        user_activity_buffer.restore(counts)
+
+
+user_activity_buffer = UserActivityBuffer(timer=FlushTimer(flush_user_activity_counters, 'USER_ACTIVITY_FLUSH_INTERVAL'))
+atexit.register(flush_user_activity_counters)
+
+
+@run_postcommit(once_per_request=False, celery=False)
+def increment_user_activity_counters_after_commit(user_id, action, date_string):
+    from osf.models import UserActivityCounter
+    return UserActivityCounter.increment(user_id, action, date_string)
+
+
 def increment_user_activity_counters(user_id, action, date_string, db=None):
+    """Count an action of ``user_id`` once the request's transaction has been committed. Outside of
+    a request (celery tasks, scripts) nothing runs the postcommit queue, so it is counted at once.
+    """
+    if has_request_context():
+        return increment_user_activity_counters_after_commit(user_id, action, date_string)
     from osf.models import UserActivityCounter
     return UserActivityCounter.increment(user_id, action, date_string)
 
@@ -50,6 +167,99 @@ def build_page(rex, kwargs):
     except KeyError:
         return None
 
+class PageCounterBuffer(object):
+    """Page views and downloads counted by this process but not yet written to the database.
+
+    Increments are kept per page (total and a sketch of the visitors) and per (page, day), and
+    are written by ``flush_page_counters`` once ``PAGE_COUNTER_FLUSH_INTERVAL`` seconds have
+    passed or ``PAGE_COUNTER_BUFFER_SIZE`` entries have built up, every interval by ``timer``
+    and when the process exits.
+    """
+
+    def __init__(self, timer=None):
+        self._lock = threading.Lock()
+        self.last_flush = time.time()
+        self.timer = timer
+        self._reset()
+
+    def _reset(self):
+        # page -> [total, HyperLogLog of visitors]
+        self.pages = {}
+        # (page, day) -> total
+        self.days = collections.defaultdict(int)
+
+    def add(self, page, day, visitor=None, count_page=True):
+        """Count a visit to ``page`` on ``day``. Visits that should only show up in the daily
+        totals (e.g. contributors downloading their own files) pass ``count_page=False``.
+        """
+        with self._lock:
+            self.days[(page, day)] += 1
+            if count_page:
+                entry = self.pages.get(page)
+                if entry is None:
+                    entry = self.pages[page] = [0, HyperLogLog()]
+                entry[0] += 1
+                if visitor:
+                    entry[1].add(visitor)
+        if self.timer:
+            self.timer.start()
+
+    def pending(self, page):
+        """Return the (total, visitors sketch) counted for ``page`` but not yet flushed."""
+        with self._lock:
+            total, visitors = self.pages.get(page, (0, None))
+            return total, HyperLogLog(visitors.registers) if visitors else None
+
+    def flush_due(self):
+        return (
+            len(self.days) >= settings.PAGE_COUNTER_BUFFER_SIZE or
+            time.time() - self.last_flush >= settings.PAGE_COUNTER_FLUSH_INTERVAL
+        )
+
+    def drain(self):
+        """Empty the buffer, returning its (pages, days)."""
+        with self._lock:
+            pages, days = self.pages, dict(self.days)
+            self._reset()
+            self.last_flush = time.time()
+        return pages, days
+
+    def restore(self, pages, days):
+        """Put drained counts that could not be written back into the buffer."""
+        with self._lock:
+            for key, total in days.items():
+                self.days[key] += total
+            for page, (total, visitors) in pages.items():
+                entry = self.pages.get(page)
+                if entry is None:
+                    entry = self.pages[page] = [0, HyperLogLog()]
+                entry[0] += total
+                if visitors:
+                    entry[1].merge(visitors)
+
+
+def write_page_counters():
+    """Write the buffered page counters, keeping them in the buffer if that fails."""
+    from osf.models import PageCounter
+    pages, days = page_counter_buffer.drain()
+    if not (pages or days):
+        return
+    try:
+        PageCounter.flush_counts(pages, days)
+    except Exception:
+        logger.exception('Could not write {} page counters, keeping them for the next flush'.format(len(days)))
+        page_counter_buffer.restore(pages, days)
+
+
+page_counter_buffer = PageCounterBuffer(timer=FlushTimer(write_page_counters, 'PAGE_COUNTER_FLUSH_INTERVAL'))
+atexit.register(write_page_counters)
+
+
+@run_postcommit(once_per_request=True, celery=False)
+def flush_page_counters():
+    write_page_counters()
+
+
 def update_counter(page, node_info=None, db=None):
     """Update counters for page.
 
@@ -180,10 +180,17 @@ class CasClient(object):
 
     def revoke_tokens(self, payload):
         """Revoke a tokens based on payload"""
+        from framework.auth import token_cache
+
         url = self.get_auth_token_revocation_url()
 
         resp = requests.post(url, data=payload)
         if resp.status_code == 204:
+            if 'token' in payload:
+                token_cache.evict(payload['token'])
+            else:
+                # Every token of an application (by client_id) was revoked
+                token_cache.clear()
             return True
         else:
             self._handle_error(resp)
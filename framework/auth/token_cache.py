@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""A cache of the CAS profiles of OAuth2 bearer tokens.
+
+Validating a bearer token takes an HTTP round trip to CAS. ``get_profile`` caches the result per
+token (by its SHA-256, tokens themselves are never stored) for ``CAS_TOKEN_CACHE_TTL`` seconds,
+and remembers tokens that CAS rejected for ``CAS_TOKEN_NEGATIVE_CACHE_TTL`` seconds. Profiles are
+kept in an in-process LRU and, if ``CAS_TOKEN_CACHE_ALIAS`` is set, in that shared Django cache.
+
+Revoking a token drops its entry, both at once and when the transaction commits. Revoking all tokens of an application drops every entry, since
+the tokens of an application aren't known here; other processes' in-process entries may outlive
+a revocation by up to ``CAS_TOKEN_LOCAL_CACHE_TTL`` seconds.
+"""
+import hashlib
+
+from django.core.cache import caches
+from django.db import transaction
+
+from framework.auth import cas
+from osf.utils.caching import LRUCache
+from website import settings
+
+CACHE_KEY = 'cas-token:{}'
+# Bumped to invalidate every entry in the shared cache
+EPOCH_KEY = 'cas-token-epoch'
+
+local_cache = LRUCache(settings.CAS_TOKEN_LOCAL_CACHE_SIZE, settings.CAS_TOKEN_LOCAL_CACHE_TTL)
+
+
+def get_shared_cache():
+    if settings.CAS_TOKEN_CACHE_ALIAS:
+        return caches[settings.CAS_TOKEN_CACHE_ALIAS]
+    return None
+
+
+def _hash(access_token):
+    return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+
+def _get(key):
+    """Return the cached (user guid, attributes) or error code for ``key``, or None."""
+    value = local_cache.get(key)
+    if value is None:
+        shared_cache = get_shared_cache()
+        if shared_cache:
+            cached = shared_cache.get_many([CACHE_KEY.format(key), EPOCH_KEY])
+            entry = cached.get(CACHE_KEY.format(key))
+            if entry and entry[0] == cached.get(EPOCH_KEY, 0):
+                value = entry[1]
+                local_cache.set(key, value)
+    return value
+
+
+def _set(key, value, ttl):
+    if ttl <= 0:
+        return
+    local_cache.set(key, value, ttl=min(ttl, settings.CAS_TOKEN_LOCAL_CACHE_TTL))
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        epoch = shared_cache.get(EPOCH_KEY, 0)
+        shared_cache.set(CACHE_KEY.format(key), (epoch, value), ttl)
+
+
+def get_profile(access_token):
+    """Same as ``cas.get_client().profile(access_token)``, read through the cache.
+
+    :rtype: CasResponse
+    :raises: CasHTTPError if CAS rejects (or recently rejected) the token
+    """
+    key = _hash(access_token)
+    value = _get(key)
+    if isinstance(value, int):
+        raise cas.CasHTTPError(value, 'CAS rejected this token', {}, '')
+    if value is not None:
+        user, attributes = value
+        response = cas.CasResponse(authenticated=True, user=user, attributes=dict(attributes))
+        response.attributes['accessToken'] = access_token
+        return response
+
+    try:
+        response = cas.get_client().profile(access_token)
+    except cas.CasHTTPError as error:
+        # Don't remember CAS being unavailable
+        if error.code < 500:
+            _set(key, error.code, settings.CAS_TOKEN_NEGATIVE_CACHE_TTL)
+        raise
+    if response.authenticated:
+        attributes = {name: value for name, value in response.attributes.items() if name != 'accessToken'}
+        _set(key, (response.user, attributes), settings.CAS_TOKEN_CACHE_TTL)
+    return response
+
+
+def _evict(key):
+    local_cache.delete(key)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.delete(CACHE_KEY.format(key))
+
+
+def _clear():
+    local_cache.clear()
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        try:
+            shared_cache.incr(EPOCH_KEY)
+        except ValueError:
+            # No epoch yet, entries were stored with epoch 0
+            shared_cache.set(EPOCH_KEY, 1, None)
+
+
+def evict(access_token):
+    """Drop the entry of ``access_token`` now, and again once the transaction commits in case
+    another request cached its old profile (e.g. its old scopes) in the meantime.
+    """
+    key = _hash(access_token)
+    _evict(key)
+    transaction.on_commit(lambda: _evict(key))
+
+
+def clear():
+    """Drop every entry now, and again once the transaction commits."""
+    _clear()
+    transaction.on_commit(_clear)
@@ -20,6 +20,15 @@ def clear_caches(*args, **kwargs):
     StoredObject._clear_caches()
 
 
+@signals.task_postrun.connect
+def flush_analytics(*args, **kwargs):
+    """Write the counters buffered by a task, as its worker may not count anything else for a while.
+    """
+    from framework.analytics import flush_user_activity_counters, write_page_counters
+    flush_user_activity_counters()
+    write_page_counters()
+
+
 @signals.worker_process_init.connect
 def attach_models(*args, **kwargs):
     """Attach models to database collections on worker initialization.
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""A long-lived, bounded pool of threads running postcommit tasks once the response is on its way.
+
+Each process starts ``POSTCOMMIT_WORKERS`` threads the first time a task is submitted (after a
+fork, so that uWSGI workers get their own). Submitted tasks wait in a queue of at most
+``POSTCOMMIT_QUEUE_SIZE`` items; ``submit`` returns False instead of blocking when it is full, so
+callers can apply backpressure. Per-task latency and queue depth are kept in ``stats()``.
+"""
+import logging
+import os
+import threading
+import time
+from Queue import Full, Queue
+
+from django.db import close_old_connections
+
+from framework import sentry
+from website import settings
+
+logger = logging.getLogger(__name__)
+
+
+def task_name(func):
+    func = getattr(func, 'func', func)  # unwrap functools.partial
+    return '{}.{}'.format(getattr(func, '__module__', None), getattr(func, '__name__', repr(func)))
+
+
+class PostcommitExecutor(object):
+
+    def __init__(self, workers, queue_size, slow_task_threshold=None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.slow_task_threshold = slow_task_threshold
+        self.queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = Queue(maxsize=self.queue_size)
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._work, args=(self.queue, ), name='postcommit')
+                thread.daemon = True
+                thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, func):
+        """Queue ``func`` to be called on a worker thread. Return False, without queueing it, if
+        the queue is full.
+        """
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((func, time.time()))
+        except Full:
+            with self._stats_lock:
+                self._rejected += 1
+            return False
+        with self._stats_lock:
+            self._max_queue_depth = max(self._max_queue_depth, self.queue.qsize())
+        return True
+
+    def join(self):
+        """Wait until every submitted task has run."""
+        if self.queue is not None:
+            self.queue.join()
+
+    def _work(self, queue):
+        while True:
+            func, queued_at = queue.get()
+            started = time.time()
+            failed = False
+            try:
+                close_old_connections()
+                func()
+            except Exception:
+                failed = True
+                logger.exception('Postcommit task {} failed'.format(task_name(func)))
+                sentry.log_exception()
+            finally:
+                close_old_connections()
+                self._record(task_name(func), started - queued_at, time.time() - started, failed)
+                queue.task_done()
+
+    def _record(self, name, wait, duration, failed):
+        if self.slow_task_threshold is not None and duration > self.slow_task_threshold:
+            logger.warning('Postcommit task {} took {:.2f}s'.format(name, duration))
+        with self._stats_lock:
+            stats = self._tasks.setdefault(name, {'count': 0, 'failures': 0, 'total_time': 0.0, 'max_time': 0.0, 'total_wait': 0.0})
+            stats['count'] += 1
+            stats['failures'] += failed
+            stats['total_time'] += duration
+            stats['max_time'] = max(stats['max_time'], duration)
+            stats['total_wait'] += wait
+
+    def stats(self):
+        """Return the current queue depth, the deepest it got, how many tasks were rejected and
+        count, failures and timings (in seconds) per task.
+        """
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue.qsize() if self.queue is not None else 0,
+                'max_queue_depth': self._max_queue_depth,
+                'rejected': self._rejected,
+                'tasks': {name: dict(stats) for name, stats in self._tasks.items()},
+            }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._tasks = {}
+            self._rejected = 0
+            self._max_queue_depth = 0
+
+
+postcommit_executor = PostcommitExecutor(
+    workers=settings.POSTCOMMIT_WORKERS,
+    queue_size=settings.POSTCOMMIT_QUEUE_SIZE,
+    slow_task_threshold=settings.POSTCOMMIT_SLOW_TASK_THRESHOLD,
+)
@@ -1,18 +1,18 @@
 # -*- coding: utf-8 -*-
 import functools
-import hashlib
+import itertools
 import logging
 import threading
 
-import binascii
 from collections import OrderedDict
-import os
 
 from celery import chain
+from django.db import transaction
 from framework.celery_tasks import app
 from celery.local import PromiseProxy
-from gevent.pool import Pool
 
+from framework import sentry
+from framework.postcommit_tasks.executor import postcommit_executor, task_name
 from website import settings
 
 _local = threading.local()
@@ -28,9 +28,16 @@ def postcommit_celery_queue():
         _local.postcommit_celery_queue = OrderedDict()
     return _local.postcommit_celery_queue
 
+def postcommit_request_state():
+    """State of the current request's postcommit tasks, emptied along with the queues"""
+    if not hasattr(_local, 'postcommit_request_state'):
+        _local.postcommit_request_state = {}
+    return _local.postcommit_request_state
+
 def postcommit_before_request():
     _local.postcommit_queue = OrderedDict()
     _local.postcommit_celery_queue = OrderedDict()
+    _local.postcommit_request_state = {}
 
 @app.task(max_retries=5, default_retry_delay=60)
 def postcommit_celery_task_wrapper(queue):
@@ -38,18 +45,33 @@ def postcommit_celery_task_wrapper(queue):
     # http://stackoverflow.com/questions/34177131/how-to-solve-python-celery-error-when-using-chain-encodeerrorruntimeerrormaxi?answertab=votes#tab-top
     chain(*queue.values()).apply()
 
+def run_postcommit_tasks(tasks):
+    """Hand ``tasks`` to the postcommit executor. If it is saturated, send the ones that are celery
+    tasks to celery and run the others in this thread.
+    """
+    for task in tasks:
+        if postcommit_executor.submit(task):
+            continue
+        logger.warning('Postcommit executor is saturated, running {} outside of it'.format(task_name(task)))
+        if settings.USE_CELERY and isinstance(task.func, PromiseProxy):
+            task.func.delay(*task.args, **task.keywords)
+            continue
+        try:
+            task()
+        except Exception:
+            logger.exception('Postcommit task {} failed'.format(task_name(task)))
+            sentry.log_exception()
+
 def postcommit_after_request(response, base_status_error_code=500):
     if response.status_code >= base_status_error_code:
         _local.postcommit_queue = OrderedDict()
         _local.postcommit_celery_queue = OrderedDict()
+        _local.postcommit_request_state = {}
         return response
     try:
         if postcommit_queue():
-            number_of_threads = 30  # one db connection per greenlet, let's share
-            pool = Pool(number_of_threads)
-            for func in postcommit_queue().values():
-                pool.spawn(func)
-            pool.join(timeout=5.0, raise_error=True)  # 5 second timeout and reraise exceptions
+            # Run once the request's transaction (if any) has been committed, without holding up the response
+            transaction.on_commit(functools.partial(run_postcommit_tasks, postcommit_queue().values()))
 
         if postcommit_celery_queue():
             if settings.USE_CELERY:
@@ -64,16 +86,24 @@ def postcommit_after_request(response, base_status_error_code=500):
             logger.error('Post commit task queue not initialized: {}'.format(ex))
     return response
 
+_unique_keys = itertools.count()
+
+def postcommit_task_key(fn, args, kwargs):
+    """Identify a call of ``fn``, so that it can be queued once per request"""
+    key = (fn.__module__, fn.__name__, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        # Unhashable arguments, e.g. lists or dicts
+        key = repr(key)
+    return key
+
 def enqueue_postcommit_task(fn, args, kwargs, celery=False, once_per_request=True):
-    # make a hash of the pertinent data
-    raw = [fn.__name__, fn.__module__, args, kwargs]
-    m = hashlib.md5()
-    m.update('-'.join([x.__repr__() for x in raw]))
-    key = m.hexdigest()
+    key = postcommit_task_key(fn, args, kwargs)
 
     if not once_per_request:
-        # we want to run it once for every occurrence, add a random string
-        key = '{}:{}'.format(key, binascii.hexlify(os.urandom(8)))
+        # we want to run it once for every occurrence, make the key unique
+        key = (key, next(_unique_keys))
 
     if celery and isinstance(fn, PromiseProxy):
         postcommit_celery_queue().update({key: fn.si(*args, **kwargs)})
@@ -15,6 +15,7 @@ from weakref import WeakKeyDictionary
 from werkzeug.local import LocalProxy
 
 from framework.flask import redirect
+from framework.sessions.store import load_session, save_session
 from framework.sessions.utils import remove_session
 from website import settings
 
@@ -158,7 +159,7 @@ def before_request():
     if cookie:
         try:
             session_id = itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie)
-            user_session = Session.load(session_id) or Session(_id=session_id)
+            user_session = load_session(session_id) or Session(_id=session_id)
         except itsdangerous.BadData:
             return
         if not util_time.throttle_period_expired(user_session.date_created, settings.OSF_SESSION_TIMEOUT):
@@ -178,7 +179,8 @@ def before_request():
 
 def after_request(response):
     if session.data.get('auth_user_id'):
-        session.save()
+        # Only written if the session changed or is due for a refresh
+        save_session(session._get_current_object())
     # Disallow embedding in frames
     response.headers['X-Frame-Options'] = 'SAMEORIGIN'
     return response
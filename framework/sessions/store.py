@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""Read-through caching and write elision for ``osf.Session``.
+
+Sessions are read from a small in-process LRU, then from the shared Django cache named by
+``SESSION_CACHE_ALIAS`` (if any), and only then from the database. Entries in the in-process
+cache live for ``SESSION_LOCAL_CACHE_TTL`` seconds, so a change made by another process can
+take that long to be seen here. The shared cache is updated whenever a session is saved or
+deleted.
+
+``save_session`` writes a session only if it is new, if its data changed since it was loaded,
+or if it was last written more than ``SESSION_REFRESH_THRESHOLD`` seconds ago (which keeps
+``date_modified`` fresh for ``scripts/clear_sessions.py``).
+"""
+import copy
+import datetime as dt
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from osf.utils.caching import LRUCache
+from website import settings
+
+CACHE_KEY = 'osf-session:{}'
+
+
+local_cache = LRUCache(settings.SESSION_LOCAL_CACHE_SIZE, settings.SESSION_LOCAL_CACHE_TTL)
+
+
+def get_shared_cache():
+    if settings.SESSION_CACHE_ALIAS:
+        return caches[settings.SESSION_CACHE_ALIAS]
+    return None
+
+
+def serialize_session(session):
+    return {
+        'id': session.id,
+        '_id': session._id,
+        'date_created': session.date_created,
+        'date_modified': session.date_modified,
+        'data': copy.deepcopy(session.data),
+    }
+
+
+def deserialize_session(state):
+    Session = apps.get_model('osf.Session')
+    session = Session(**copy.deepcopy(state))
+    session._state.adding = False
+    session._state.db = 'default'
+    session._loaded_data = copy.deepcopy(session.data)
+    return session
+
+
+def load_session(session_id):
+    """Return the session with ``session_id``, or None if there is none. Each call returns a
+    separate instance, so concurrent requests never share session data.
+    """
+    state = local_cache.get(session_id)
+    if state is None:
+        shared_cache = get_shared_cache()
+        state = shared_cache.get(CACHE_KEY.format(session_id)) if shared_cache else None
+        if state is None:
+            Session = apps.get_model('osf.Session')
+            session = Session.load(session_id)
+            if session is None:
+                return None
+            state = serialize_session(session)
+            if shared_cache:
+                shared_cache.set(CACHE_KEY.format(session_id), state, settings.SESSION_SHARED_CACHE_TTL)
+        local_cache.set(session_id, state)
+    return deserialize_session(state)
+
+
+def session_needs_save(session):
+    if session._state.adding or session.date_modified is None:
+        return True
+    if session.data != getattr(session, '_loaded_data', None):
+        return True
+    refresh_before = timezone.now() - dt.timedelta(seconds=settings.SESSION_REFRESH_THRESHOLD)
+    return session.date_modified < refresh_before
+
+
+def save_session(session, force=False):
+    """Save ``session`` if it needs to be, or always if ``force`` is set. Returns whether the
+    session was written.
+    """
+    if not (force or session_needs_save(session)):
+        return False
+    session.save()
+    session._loaded_data = copy.deepcopy(session.data)
+    return True
+
+
+def evict_session(session_id):
+    local_cache.delete(session_id)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.delete(CACHE_KEY.format(session_id))
+
+
+def update_cached_session(session):
+    """Drop the cached copy of a session that was just saved, and cache the saved state once
+    the transaction commits.
+    """
+    evict_session(session._id)
+    state = serialize_session(session)
+
+    def cache_session():
+        local_cache.set(session._id, state)
+        shared_cache = get_shared_cache()
+        if shared_cache:
+            shared_cache.set(CACHE_KEY.format(session._id), state, settings.SESSION_SHARED_CACHE_TTL)
+    transaction.on_commit(cache_session)
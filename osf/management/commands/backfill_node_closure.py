@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Rebuild and/or verify the materialized component-tree closure table (osf_nodeclosure)."""
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from osf.models import NodeClosure
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+
+def verify_node_closure():
+    missing, extra = NodeClosure.objects.verify()
+    for ancestor_id, descendant_id, depth in missing:
+        logger.error('Missing closure row ancestor={} descendant={} depth={}'.format(ancestor_id, descendant_id, depth))
+    for ancestor_id, descendant_id, depth in extra:
+        logger.error('Unexpected closure row ancestor={} descendant={} depth={}'.format(ancestor_id, descendant_id, depth))
+    logger.info('Verified node closure table: {} missing, {} extra rows.'.format(len(missing), len(extra)))
+    return not (missing or extra)
+
+
+class Command(BaseCommand):
+    """
+    Backfill osf_nodeclosure from osf_noderelation, or verify that it is in sync.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run rebuild and roll back changes to db',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            dest='verify',
+            help='Only compare the closure table against osf_noderelation; make no changes',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if options.get('verify', False):
+            if not verify_node_closure():
+                raise RuntimeError('Node closure table is out of sync, run without --verify to rebuild.')
+            return
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+        with transaction.atomic():
+            count = NodeClosure.objects.rebuild()
+            logger.info('Wrote {} node closure rows.'.format(count))
+            verify_node_closure()
+            if dry_run:
+                raise RuntimeError('Dry run, transaction rolled back.')
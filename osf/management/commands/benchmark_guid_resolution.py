@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""Measure how long resolving a GUID to its deep_url takes from the database and from the GUID cache."""
+from __future__ import division, unicode_literals
+import logging
+import time
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+
+from osf.models import Guid
+from osf.utils import guid_cache
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_from_database(guid_id):
+    guid = Guid.objects.get(_id=guid_id)
+    return guid.referent.deep_url
+
+
+def resolve_from_cache(guid_id):
+    return guid_cache.get_entry(guid_id).deep_url
+
+
+def time_calls(func, guid_ids):
+    timings = []
+    for guid_id in guid_ids:
+        start = time.time()
+        func(guid_id)
+        timings.append(time.time() - start)
+    timings.sort()
+    return {
+        'mean': sum(timings) / len(timings),
+        'p50': timings[len(timings) // 2],
+        'p95': timings[int(len(timings) * 0.95)],
+    }
+
+
+class Command(BaseCommand):
+    """
+    Resolve a sample of GUIDs first from the database, then from the GUID cache, and report
+    the latency of each in microseconds. Only the in-process cache tier is used unless
+    GUID_CACHE_ALIAS is set.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--count',
+            type=int,
+            dest='count',
+            default=1000,
+            help='Number of GUIDs to resolve',
+        )
+
+    def handle(self, *args, **options):
+        sample = Guid.objects.filter(object_id__isnull=False).order_by('?')[:options['count']]
+        guids = [guid for guid in sample if getattr(guid.referent, 'deep_url', None)]
+        if not guids:
+            logger.info('No GUIDs to resolve.')
+            return
+        for guid in guids:
+            guid_cache.set_deep_url(guid, guid.referent.deep_url)
+        guid_ids = [guid._id for guid in guids]
+
+        for name, func in (('database', resolve_from_database), ('cache', resolve_from_cache)):
+            stats = time_calls(func, guid_ids)
+            logger.info('{}: mean {:.0f}us, p50 {:.0f}us, p95 {:.0f}us over {} GUIDs'.format(
+                name, stats['mean'] * 1e6, stats['p50'] * 1e6, stats['p95'] * 1e6, len(guid_ids)
+            ))
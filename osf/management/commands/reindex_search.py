@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Build a new version of the search index in parallel and swap the index alias to it."""
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+
+from scripts import utils as script_utils
+from website import settings
+from website.search_migration.migrate import PARTITION_SIZE, default_state_path, reindex
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Reindex nodes, users, files and institutions into a new versioned index while the
+    current one keeps serving searches, then point the alias at the new index.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--index',
+            type=str,
+            dest='index',
+            default=settings.ELASTIC_INDEX,
+            help='Alias to rebuild, defaults to ELASTIC_INDEX',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            dest='workers',
+            default=None,
+            help='Number of worker processes, defaults to the number of CPUs',
+        )
+        parser.add_argument(
+            '--partition-size',
+            type=int,
+            dest='partition_size',
+            default=PARTITION_SIZE,
+            help='Number of ids in each partition',
+        )
+        parser.add_argument(
+            '--state-file',
+            type=str,
+            dest='state_path',
+            default=None,
+            help='File that progress is saved to, defaults to a file in the temp directory',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            dest='resume',
+            help='Continue the build saved in the state file, retrying failed partitions',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            dest='delete',
+            help='Delete the previous index once the alias has been swapped',
+        )
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            dest='convert',
+            help='Replace the index if it is not an alias yet. Search is briefly unavailable, only needed once',
+        )
+
+    def handle(self, *args, **options):
+        script_utils.add_file_logger(logger, __file__)
+        alias = options['index']
+        state_path = options.get('state_path') or default_state_path(alias)
+        index = reindex(
+            alias=alias,
+            workers=options.get('workers'),
+            partition_size=options['partition_size'],
+            state_path=state_path,
+            resume=options.get('resume', False),
+            delete=options.get('delete', False),
+            convert=options.get('convert', False),
+        )
+        logger.info('Reindexed {} into {}'.format(alias, index))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Repair and/or verify the stored materialized paths of file nodes."""
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from addons.osfstorage.models import OsfStorageFileNode
+from osf.models import BaseFileNode
+from scripts import utils as script_utils
+
+logger = logging.getLogger(__name__)
+
+
+def get_unrooted_file_nodes():
+    """Non-OSF Storage file nodes whose materialized path is missing its leading "/"."""
+    return BaseFileNode.objects.exclude(provider='osfstorage').exclude(
+        _materialized_path__startswith='/'
+    ).exclude(_materialized_path__isnull=True).exclude(_materialized_path='')
+
+
+def repair_unrooted_file_nodes(dry=False):
+    targets = get_unrooted_file_nodes()
+    count = targets.count()
+    if not dry:
+        for file_node in targets.iterator():
+            file_node.materialized_path = '/' + file_node.materialized_path
+            file_node.save()
+            logger.info('Updated materialized path for file {0} to {1}'.format(file_node._id, file_node.materialized_path))
+    return count
+
+
+class Command(BaseCommand):
+    """
+    Recompute the stored materialized paths of OSF Storage files and folders from their
+    parents, and prefix the paths of other providers' file nodes with "/" where it is missing.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Run repair and roll back changes to db',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            dest='verify',
+            help='Only count the file nodes with wrong paths; make no changes',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if options.get('verify', False):
+            osfstorage = OsfStorageFileNode.repair_materialized_paths(dry=True)
+            unrooted = repair_unrooted_file_nodes(dry=True)
+            logger.info('Found {} OSF Storage and {} other file nodes with wrong materialized paths.'.format(osfstorage, unrooted))
+            if osfstorage or unrooted:
+                raise RuntimeError('Materialized paths are out of date, run without --verify to repair.')
+            return
+        if not dry_run:
+            script_utils.add_file_logger(logger, __file__)
+        with transaction.atomic():
+            osfstorage = OsfStorageFileNode.repair_materialized_paths()
+            unrooted = repair_unrooted_file_nodes()
+            logger.info('Repaired {} OSF Storage and {} other file nodes.'.format(osfstorage, unrooted))
+            if dry_run:
+                raise RuntimeError('Dry run, transaction rolled back.')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Send the preprints modified (or that failed to be sent) within a date range to SHARE again."""
+from __future__ import unicode_literals
+import logging
+
+import django
+django.setup()
+
+import pytz
+from dateutil.parser import parse as parse_date
+from django.core.management.base import BaseCommand
+
+from osf.models import PreprintService
+from website import settings
+from website.preprints.tasks import send_preprints_to_share
+
+logger = logging.getLogger(__name__)
+
+
+def parse_datetime(value):
+    date = parse_date(value)
+    return date if date.tzinfo else date.replace(tzinfo=pytz.utc)
+
+
+class Command(BaseCommand):
+    """
+    Send every preprint modified between --start and --end to SHARE, batched per provider.
+    With --failed, only send the preprints whose last submission failed in that range.
+    """
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--start',
+            type=parse_datetime,
+            dest='start',
+            required=True,
+            help='Start of the range (inclusive), e.g. 2017-06-01',
+        )
+        parser.add_argument(
+            '--end',
+            type=parse_datetime,
+            dest='end',
+            default=None,
+            help='End of the range (exclusive), defaults to now',
+        )
+        parser.add_argument(
+            '--provider',
+            type=str,
+            dest='provider',
+            default=None,
+            help='Only send the preprints of the provider with this _id',
+        )
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            dest='failed',
+            help='Only send the preprints whose submission failed within the range',
+        )
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Count the preprints to send without sending them',
+        )
+
+    def handle(self, *args, **options):
+        assert settings.SHARE_URL, 'SHARE_URL must be set to send preprints to SHARE.'
+        date_field = 'failed_share_submission__date_modified' if options['failed'] else 'date_modified'
+        preprints = PreprintService.objects.filter(**{'{}__gte'.format(date_field): options['start']})
+        if options['end']:
+            preprints = preprints.filter(**{'{}__lt'.format(date_field): options['end']})
+        if options['provider']:
+            preprints = preprints.filter(provider___id=options['provider'])
+
+        logger.info('Sending {} preprints to SHARE'.format(preprints.count()))
+        if options['dry_run']:
+            return
+        batcher = send_preprints_to_share(preprints)
+        for preprint_id, error in batcher.failed:
+            logger.warning('Failed to send preprint {}: {}'.format(preprint_id, error))
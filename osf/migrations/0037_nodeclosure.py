@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+POPULATE_SQL = """
+    INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+    WITH RECURSIVE paths AS (
+        SELECT parent_id AS ancestor_id, child_id AS descendant_id, 1 AS depth
+        FROM osf_noderelation
+        WHERE is_node_link IS FALSE
+    UNION
+        SELECT R.parent_id, P.descendant_id, P.depth + 1
+        FROM paths AS P
+            JOIN osf_noderelation AS R ON R.child_id = P.ancestor_id
+        WHERE R.is_node_link IS FALSE
+    ) SELECT ancestor_id, descendant_id, MIN(depth)
+    FROM paths
+    GROUP BY ancestor_id, descendant_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0036_auto_20170605_1520'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.AbstractNode')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='nodeclosure',
+            unique_together=set([('ancestor', 'descendant')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='nodeclosure',
+            index_together=set([('descendant', 'depth')]),
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# Store the materialized path of every active OSF Storage file node, which used to be
+# computed on read and saved as an empty string.
+POPULATE_SQL = """
+    WITH RECURSIVE tree(id, path) AS (
+        SELECT
+          F.id,
+          COALESCE(F.name, '') || CASE WHEN F.type = 'osf.osfstoragefolder' THEN '/' ELSE '' END
+        FROM osf_basefilenode AS F
+        WHERE F.parent_id IS NULL AND F.provider = 'osfstorage'
+          AND F.type IN ('osf.osfstoragefile', 'osf.osfstoragefolder')
+      UNION ALL
+        SELECT
+          F.id,
+          T.path || COALESCE(F.name, '') || CASE WHEN F.type = 'osf.osfstoragefolder' THEN '/' ELSE '' END
+        FROM osf_basefilenode AS F
+          JOIN tree AS T ON F.parent_id = T.id
+        WHERE F.type IN ('osf.osfstoragefile', 'osf.osfstoragefolder')
+    )
+    UPDATE osf_basefilenode AS F
+    SET _materialized_path = T.path
+    FROM tree AS T
+    WHERE F.id = T.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0037_nodeclosure'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                """
+                CREATE INDEX osf_basefilenode_materialized_path_index
+                ON public.osf_basefilenode
+                (node_id, _materialized_path text_pattern_ops);
+                """,
+            ],
+            [
+                """
+                DROP INDEX public.osf_basefilenode_materialized_path_index RESTRICT;
+                """
+            ]
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
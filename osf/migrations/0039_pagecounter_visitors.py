@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0038_basefilenode_materialized_path_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagecounter',
+            name='visitors',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.SmallIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.CreateModel(
+            name='PageDayCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page', models.CharField(max_length=300)),
+                ('day', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pagedaycounter',
+            unique_together=set([('page', 'day')]),
+        ),
+    ]
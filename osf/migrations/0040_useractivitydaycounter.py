@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0039_pagecounter_visitors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserActivityDayCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_guid', models.CharField(max_length=5)),
+                ('action', models.CharField(max_length=255)),
+                ('day', models.DateField()),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='useractivitydaycounter',
+            unique_together=set([('user_guid', 'action', 'day')]),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0040_useractivitydaycounter'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                """
+                CREATE INDEX osf_fileversion_metadata_sha256_index
+                ON public.osf_fileversion
+                ((metadata ->> 'sha256'));
+                """,
+            ],
+            [
+                """
+                DROP INDEX public.osf_fileversion_metadata_sha256_index RESTRICT;
+                """
+            ]
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import osf.utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0041_fileversion_metadata_sha256_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FailedShareSubmission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('attempts', models.PositiveIntegerField(default=1)),
+                ('date_created', osf.utils.fields.NonNaiveDateTimeField(auto_now_add=True)),
+                ('date_modified', osf.utils.fields.NonNaiveDateTimeField(auto_now=True)),
+                ('preprint', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='failed_share_submission', to='osf.PreprintService')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
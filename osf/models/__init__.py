@@ -22,14 +22,14 @@ from osf.models.notifications import NotificationDigest, NotificationSubscriptio
 from osf.models.spam import SpamStatus, SpamMixin  # noqa
 from osf.models.subject import Subject  # noqa
 from osf.models.preprint_provider import PreprintProvider  # noqa
-from osf.models.preprint_service import PreprintService  # noqa
+from osf.models.preprint_service import PreprintService, FailedShareSubmission  # noqa
 from osf.models.identifiers import Identifier  # noqa
 from osf.models.files import (  # noqa
     BaseFileNode,
     File, Folder,  # noqa
     FileVersion, TrashedFile, TrashedFileNode, TrashedFolder,  # noqa
 )  # noqa
-from osf.models.node_relation import NodeRelation  # noqa
-from osf.models.analytics import UserActivityCounter, PageCounter  # noqa
+from osf.models.node_relation import NodeClosure, NodeRelation  # noqa
+from osf.models.analytics import UserActivityCounter, UserActivityDayCounter, PageCounter, PageDayCounter  # noqa
 from osf.models.admin_profile import AdminProfile  # noqa
 from osf.models.admin_log_entry import AdminLogEntry  # noqa
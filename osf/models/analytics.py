@@ -1,17 +1,24 @@
+import collections
 import logging
 
 from dateutil import parser
-from django.db import models, transaction
+from django.contrib.postgres.fields import ArrayField
+from django.db import connection, models, transaction
 from django.utils import timezone
 
 from framework.sessions import session
 from osf.models.base import BaseModel
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from osf.utils.hyperloglog import HyperLogLog
 
 logger = logging.getLogger(__name__)
 
 
 class UserActivityCounter(BaseModel):
+    """All-time number of actions of a user. ``action`` and ``date`` hold the per-action and
+    per-day breakdowns counted before ``UserActivityDayCounter`` was introduced; they are no
+    longer written.
+    """
     primary_identifier_name = '_id'
 
     _id = models.CharField(max_length=5, null=False, blank=False, db_index=True,
@@ -22,38 +29,77 @@ class UserActivityCounter(BaseModel):
 
     @classmethod
     def get_total_activity_count(cls, user_id):
+        """Return the number of actions of ``user_id``, including those this process hasn't
+        written yet.
+        """
+        from framework.analytics import user_activity_buffer
+
+        total = user_activity_buffer.pending(user_id)
         try:
-            return cls.objects.get(_id=user_id).total
+            return total + cls.objects.values_list('total', flat=True).get(_id=user_id)
         except cls.DoesNotExist:
-            return 0
+            return total
 
     @classmethod
     def increment(cls, user_id, action, date_string):
-        date = parser.parse(date_string).strftime('%Y/%m/%d')
-        with transaction.atomic():
-            # select_for_update locks the row but only inside a transaction
-            uac, created = cls.objects.select_for_update().get_or_create(_id=user_id)
-            if uac.total > 0:
-                uac.total += 1
-            else:
-                uac.total = 1
-            if action in uac.action:
-                uac.action[action]['total'] += 1
-                if date in uac.action[action]['date']:
-                    uac.action[action]['date'][date] += 1
-                else:
-                    uac.action[action]['date'][date] = 1
-            else:
-                uac.action[action] = dict(total=1, date={date: 1})
-            if date in uac.date:
-                uac.date[date]['total'] += 1
-            else:
-                uac.date[date] = dict(total=1)
-            uac.save()
+        """Count an action of ``user_id`` on ``date_string``. The count is buffered in memory
+        and written by ``framework.analytics.flush_user_activity_counters``.
+        """
+        from framework.analytics import flush_user_activity_counters, user_activity_buffer
+
+        user_activity_buffer.add(user_id, action, parser.parse(date_string).date())
+        if user_activity_buffer.flush_due():
+            flush_user_activity_counters()
         return True
 
+    @classmethod
+    def flush_counts(cls, counts):
+        """Add buffered counts to the database with one upsert per table.
+
+        :param dict counts: (user_id, action, day) -> total
+        """
+        totals = collections.defaultdict(int)
+        for (user_id, action, day), total in counts.items():
+            totals[user_id] += total
+        with transaction.atomic(), connection.cursor() as cursor:
+            rows = sorted(totals.items())
+            cursor.execute(
+                """
+                INSERT INTO osf_useractivitycounter (_id, action, date, total)
+                VALUES {}
+                ON CONFLICT (_id) DO UPDATE SET
+                  total = osf_useractivitycounter.total + EXCLUDED.total;
+                """.format(', '.join(["(%s, '{}', '{}', %s)"] * len(rows))),
+                [value for row in rows for value in row]
+            )
+            rows = sorted(counts.items())
+            cursor.execute(
+                """
+                INSERT INTO osf_useractivitydaycounter (user_guid, action, day, total)
+                VALUES {}
+                ON CONFLICT (user_guid, action, day) DO UPDATE SET
+                  total = osf_useractivitydaycounter.total + EXCLUDED.total;
+                """.format(', '.join(['(%s, %s, %s, %s)'] * len(rows))),
+                [value for (user_id, action, day), total in rows for value in (user_id, action, day, total)]
+            )
+
+
+class UserActivityDayCounter(BaseModel):
+    """Number of times a user took an action on one day."""
+    user_guid = models.CharField(max_length=5)
+    action = models.CharField(max_length=255)
+    day = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user_guid', 'action', 'day')
+
 
 class PageCounter(BaseModel):
+    """All-time view/download counts of a page. ``unique`` holds visitors counted before
+    ``visitors``, a HyperLogLog sketch of the visitors since, was introduced; the number of
+    unique visitors is their sum.
+    """
     primary_identifier_name = '_id'
 
     _id = models.CharField(max_length=300, null=False, blank=False, db_index=True,
@@ -62,6 +108,7 @@ class PageCounter(BaseModel):
 
     total = models.PositiveIntegerField(default=0)
     unique = models.PositiveIntegerField(default=0)
+    visitors = ArrayField(models.SmallIntegerField(), default=list, blank=True)
 
     @staticmethod
     def clean_page(page):
@@ -73,72 +120,90 @@ class PageCounter(BaseModel):
 
     @classmethod
     def update_counter(cls, page, node_info):
+        """Count a visit to ``page`` by the current session. The count is buffered in memory
+        and written by ``framework.analytics.flush_page_counters``.
+        """
+        from framework.analytics import flush_page_counters, page_counter_buffer
+
         cleaned_page = cls.clean_page(page)
-        date = timezone.now()
-        date_string = date.strftime('%Y/%m/%d')
-        visited_by_date = session.data.get('visited_by_date', {'date': date_string, 'pages': []})
-
-        with transaction.atomic():
-            model_instance, created = cls.objects.select_for_update().get_or_create(_id=cleaned_page)
-
-            # if they visited something today
-            if date_string == visited_by_date['date']:
-                # if they haven't visited this page today
-                if cleaned_page not in visited_by_date['pages']:
-                    # if the model_instance has today in it
-                    if date_string in model_instance.date.keys():
-                        # increment the number of unique visitors for today
-                        model_instance.date[date_string]['unique'] += 1
-                    else:
-                        # set the number of unique visitors for today to 1
-                        model_instance.date[date_string] = dict(unique=1)
-            # if they haven't visited something today
-            else:
-                # set their visited by date to blank
-                visited_by_date['date'] = date_string
-                visited_by_date['pages'] = []
-                # if the model_instance has today in it
-                if date_string in model_instance.date.keys():
-                    # increment the number of unique visitors for today
-                    model_instance.date[date_string]['unique'] += 1
-                else:
-                    # set the number of unique visitors to 1
-                    model_instance.date[date_string] = dict(unique=1)
-
-            # update their sessions
-            visited_by_date['pages'].append(cleaned_page)
-            session.data['visited_by_date'] = visited_by_date
-
-            if date_string in model_instance.date.keys():
-                if 'total' not in model_instance.date[date_string].keys():
-                    model_instance.date[date_string].update(total=0)
-                model_instance.date[date_string]['total'] += 1
-            else:
-                model_instance.date[date_string] = dict(total=1)
-
-            # if a download counter is being updated, only perform the update
-            # if the user who is downloading isn't a contributor to the project
-            page_type = cleaned_page.split(':')[0]
-            if page_type == 'download' and node_info:
-                if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
-                    model_instance.save()
-                    return
-
-            visited = session.data.get('visited', [])
-            if page not in visited:
-                model_instance.unique += 1
-                visited.append(page)
-                session.data['visited'] = visited
-
-            session.save()
-            model_instance.total += 1
-
-            model_instance.save()
+        count_page = True
+        # if a download counter is being updated, only count it in the page totals
+        # if the user who is downloading isn't a contributor to the project
+        page_type = cleaned_page.split(':')[0]
+        if page_type == 'download' and node_info:
+            if node_info['contributors'].filter(guids___id__isnull=False, guids___id=session.data.get('auth_user_id')).exists():
+                count_page = False
+
+        page_counter_buffer.add(cleaned_page, timezone.now().date(), visitor=session._id, count_page=count_page)
+        if page_counter_buffer.flush_due():
+            flush_page_counters()
+
+    @classmethod
+    def flush_counts(cls, pages, days):
+        """Add buffered counts to the database with one upsert per table.
+
+        :param dict pages: page -> (total, HyperLogLog of visitors)
+        :param dict days: (page, day) -> total
+        """
+        with transaction.atomic(), connection.cursor() as cursor:
+            if pages:
+                rows = sorted(pages.items())
+                cursor.execute(
+                    """
+                    INSERT INTO osf_pagecounter (_id, date, total, "unique", visitors)
+                    VALUES {}
+                    ON CONFLICT (_id) DO UPDATE SET
+                      total = osf_pagecounter.total + EXCLUDED.total,
+                      visitors = COALESCE((
+                        SELECT array_agg(GREATEST(R.old, R.new) ORDER BY R.i)
+                        FROM unnest(osf_pagecounter.visitors, EXCLUDED.visitors) WITH ORDINALITY AS R(old, new, i)
+                      ), '{{}}');
+                    """.format(', '.join(["(%s, '{}', %s, 0, %s::smallint[])"] * len(rows))),
+                    [
+                        value for page, (total, visitors) in rows
+                        for value in (page, total, visitors.registers if visitors else [])
+                    ]
+                )
+            if days:
+                rows = sorted(days.items())
+                cursor.execute(
+                    """
+                    INSERT INTO osf_pagedaycounter (page, day, total)
+                    VALUES {}
+                    ON CONFLICT (page, day) DO UPDATE SET
+                      total = osf_pagedaycounter.total + EXCLUDED.total;
+                    """.format(', '.join(['(%s, %s, %s)'] * len(rows))),
+                    [value for (page, day), total in rows for value in (page, day, total)]
+                )
 
     @classmethod
     def get_basic_counters(cls, page):
+        """Return (unique, total) for ``page``, including counts this process hasn't written
+        yet, or (None, None) if it was never counted.
+        """
+        from framework.analytics import page_counter_buffer
+
+        cleaned_page = cls.clean_page(page)
+        total, visitors = page_counter_buffer.pending(cleaned_page)
+        visitors = visitors or HyperLogLog()
+        unique = 0
         try:
-            counter = cls.objects.get(_id=cls.clean_page(page))
-            return (counter.unique, counter.total)
+            counter = cls.objects.get(_id=cleaned_page)
         except cls.DoesNotExist:
-            return (None, None)
+            if not total:
+                return (None, None)
+        else:
+            total += counter.total
+            unique = counter.unique
+            visitors.merge(counter.visitors)
+        return (unique + visitors.count(), total)
+
+
+class PageDayCounter(BaseModel):
+    """Views/downloads of a page on one day."""
+    page = models.CharField(max_length=300)
+    day = models.DateField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('page', 'day')
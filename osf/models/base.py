@@ -8,12 +8,13 @@ from django.contrib.contenttypes.fields import (GenericForeignKey,
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.exceptions import ValidationError as DjangoValidationError
-from django.db import models
+from django.db import models, transaction
 from django.db.models import ForeignKey
 from django.db.models.expressions import F
 from django.db.models.query_utils import Q
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from osf.utils import guid_cache
 from osf.utils.caching import cached_property
 from osf.exceptions import ValidationError
 from osf.modm_compat import to_django_query
@@ -208,10 +209,17 @@ class Guid(BaseModel):
     # Override load in order to load by GUID
     @classmethod
     def load(cls, data):
+        if isinstance(data, basestring):
+            entry = guid_cache.get_entry(data)
+            if entry is not None:
+                return entry.to_guid(data.lower())
         try:
-            return cls.objects.get(_id=data)
+            guid = cls.objects.get(_id=data)
         except cls.DoesNotExist:
             return None
+        # Only cache committed state
+        transaction.on_commit(lambda: guid_cache.set_entry(guid._id, guid_cache.GuidEntry.from_guid(guid)))
+        return guid
 
     class Meta:
         ordering = ['-created']
@@ -221,6 +229,12 @@ class Guid(BaseModel):
         )
 
 
+@receiver(post_save, sender=Guid)
+@receiver(post_delete, sender=Guid)
+def invalidate_cached_guid(sender, instance, **kwargs):
+    guid_cache.invalidate([instance._id])
+
+
 class BlackListGuid(BaseModel):
     id = models.AutoField(primary_key=True)
     guid = LowercaseCharField(max_length=255, unique=True, db_index=True)
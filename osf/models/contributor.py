@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from osf.utils.fields import NonNaiveDateTimeField
+from osf.utils.permission_cache import invalidate_user_permissions
 from website.util.permissions import (
     READ,
     WRITE,
@@ -51,6 +54,12 @@ class Contributor(AbstractBaseContributor):
         # NOTE: Adds an _order column
         order_with_respect_to = 'node'
 
+
+@receiver(post_save, sender=Contributor)
+@receiver(post_delete, sender=Contributor)
+def invalidate_contributor_permissions(sender, instance, **kwargs):
+    invalidate_user_permissions(instance.user_id)
+
 class InstitutionalContributor(AbstractBaseContributor):
     institution = models.ForeignKey('Institution')
 
@@ -1,12 +1,13 @@
 from __future__ import unicode_literals
 
+import json
 import logging
 import os
 
 import requests
 from dateutil.parser import parse as parse_date
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import Manager
 from django.utils import timezone
 from modularodm.exceptions import NoResultsFound
@@ -19,7 +20,8 @@ from osf.models.comment import CommentableMixin
 from osf.models.mixins import Taggable
 from osf.models.validators import validate_location
 from osf.modm_compat import Q
-from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
+from osf.utils import guid_cache
+from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONEncoder, DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
 from website.files import utils
 from website.files.exceptions import VersionNotFoundError
@@ -176,6 +178,78 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
             obj = cls(node=node, _path='/' + path.lstrip('/'))
         return obj
 
+    @classmethod
+    def bulk_update_metadata(cls, node, items, user=None):
+        """Store WaterButler's metadata for ``items``, a listing of one of ``node``'s folders, and
+        return the matching file nodes in the same order. Existing file nodes are looked up with
+        one query, missing ones are bulk created, and only those whose metadata changed are
+        rewritten. File nodes of providers that override ``update`` are updated one at a time.
+
+        :param list items: The ``attributes`` of each entry WaterButler returned
+        """
+        now = timezone.now()
+        classes = [
+            cls.resolve_class(data['provider'], cls.FOLDER if data['kind'] == 'folder' else cls.FILE)
+            for data in items
+        ]
+        paths = ['/' + data['path'].lstrip('/') for data in items]
+        existing = {}
+        for file_node in BaseFileNode.objects.filter(
+            node=node,
+            _path__in=set(paths),
+            type__in=list({file_class._typedmodels_type for file_class in classes}),
+        ).order_by('-id'):
+            existing[(file_node.type, file_node._path)] = file_node
+
+        file_nodes, created, changed, unchanged = [], [], [], []
+        seen = set()
+        for data, file_class, path in zip(items, classes, paths):
+            key = (file_class._typedmodels_type, path)
+            file_node = existing.get(key)
+            if file_class.update.__func__ not in (File.update.__func__, Folder.update.__func__):
+                file_node = file_node or file_class(node=node, _path=path)
+                file_node.update(None, data, user=user)
+                existing[key] = file_node
+            elif key in seen:
+                # Listed twice, keep the first entry
+                pass
+            elif file_node is None:
+                file_node = existing[key] = file_class(
+                    node=node, _path=path, provider=file_class._provider, type=file_class._typedmodels_type
+                )
+                file_node.set_metadata(data)
+                file_node.last_touched = now
+                created.append(file_node)
+            else:
+                file_node.last_touched = now
+                (changed if file_node.set_metadata(data) else unchanged).append(file_node)
+            seen.add(key)
+            file_nodes.append(file_node)
+
+        with transaction.atomic():
+            if created:
+                BaseFileNode.objects.bulk_create(created)
+            if changed:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        """
+                        UPDATE osf_basefilenode AS F
+                        SET name = V.name, _materialized_path = V.materialized_path, _history = V.history, last_touched = %s
+                        FROM (VALUES {}) AS V(id, name, materialized_path, history)
+                        WHERE F.id = V.id;
+                        """.format(', '.join(['(%s, %s, %s, %s::jsonb)'] * len(changed))),
+                        [now] + [
+                            value for changed_node in changed
+                            for value in (
+                                changed_node.id, changed_node.name, changed_node._materialized_path,
+                                json.dumps(changed_node._history, cls=DateTimeAwareJSONEncoder),
+                            )
+                        ]
+                    )
+            if unchanged:
+                BaseFileNode.objects.filter(id__in=[unchanged_node.id for unchanged_node in unchanged]).update(last_touched=now)
+        return file_nodes
+
     @classmethod
     def get_file_guids(cls, materialized_path, provider, node):
         guids = []
@@ -346,8 +420,10 @@ class BaseFileNode(TypedModel, CommentableMixin, OptionalGuidMixin, Taggable, Ob
         logger.warn('BaseFileNode._repoint_guids is deprecated.')
 
     def _update_node(self, recursive=True, save=True):
-        if self.parent is not None:
+        if self.parent is not None and self.parent.node_id != self.node_id:
             self.node = self.parent.node
+            # deep_url includes the node
+            guid_cache.invalidate_referent(self)
         if save:
             self.save()
         if recursive and not self.is_file:
@@ -419,12 +495,31 @@ class File(models.Model):
         :param dict data: Metadata recieved from waterbutler
         :returns: FileVersion
         """
-        self.name = data['name']
-        self.materialized_path = data['materialized']
-
         version = FileVersion(identifier=revision)
         version.update_metadata(data, save=False)
 
+        # if revision is none then version is the latest version
+        # Dont save the latest information
+        if revision is not None:
+            version.save()
+            self.versions.add(version)
+
+        self.set_metadata(data)
+
+        # Finally update last touched
+        self.last_touched = timezone.now()
+
+        self.save()
+        return version
+
+    def set_metadata(self, data):
+        """Set name, materialized path and history from the WaterButler metadata ``data``,
+        without saving. Returns whether any of them changed.
+        """
+        changed = self.name != data['name'] or self.materialized_path != data['materialized']
+        self.name = data['name']
+        self.materialized_path = data['materialized']
+
         # Transform here so it can be sortted on later
         if data['modified'] is not None and data['modified'] != '':
             data['modified'] = parse_date(
@@ -433,11 +528,6 @@ class File(models.Model):
                 default=timezone.now()  # Just incase nothing can be parsed
             )
 
-        # if revision is none then version is the latest version
-        # Dont save the latest information
-        if revision is not None:
-            version.save()
-            self.versions.add(version)
         for entry in self.history:
             if ('etag' in entry and 'etag' in data) and (entry['etag'] == data['etag']):
                 break
@@ -448,12 +538,8 @@ class File(models.Model):
             # If modified not included in the metadata, insert at the end of the history
             else:
                 self.history.append(data)
-
-        # Finally update last touched
-        self.last_touched = timezone.now()
-
-        self.save()
-        return version
+            changed = True
+        return changed
 
     def serialize(self):
         newest_version = self.versions.all().last()
@@ -501,12 +587,20 @@ class Folder(models.Model):
         dataverse and django
         See dataversefile.update
         """
-        self.name = data['name']
-        self.materialized_path = data['materialized']
+        self.set_metadata(data)
         self.last_touched = timezone.now()
         if save:
             self.save()
 
+    def set_metadata(self, data):
+        """Set name and materialized path from the WaterButler metadata ``data``, without saving.
+        Returns whether either changed.
+        """
+        changed = self.name != data['name'] or self.materialized_path != data['materialized']
+        self.name = data['name']
+        self.materialized_path = data['materialized']
+        return changed
+
     def append_file(self, name, path=None, materialized_path=None, save=True):
         return self._create_child(name, File, path=path, materialized_path=materialized_path, save=save)
 
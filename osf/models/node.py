@@ -16,7 +16,6 @@ from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from keen import scoped_keys
-from psycopg2._psycopg import AsIs
 from typedmodels.models import TypedModel, TypedModelManager
 from include import IncludeQuerySet, IncludeManager
 
@@ -34,7 +33,7 @@ from osf.models.identifiers import Identifier, IdentifierMixin
 from osf.models.licenses import NodeLicenseRecord
 from osf.models.mixins import (AddonModelMixin, CommentableMixin, Loggable,
                                NodeLinkMixin, Taggable)
-from osf.models.node_relation import NodeRelation
+from osf.models.node_relation import NodeClosure, NodeRelation
 from osf.models.nodelog import NodeLog
 from osf.models.sanctions import RegistrationApproval
 from osf.models.private_link import PrivateLink
@@ -46,6 +45,7 @@ from osf.modm_compat import Q
 from osf.utils.auth import Auth, get_user
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
+from osf.utils.permission_cache import get_permission_cache, invalidate_user_permissions, prime_permissions
 from website import language, settings
 from website.citations.utils import datetime_to_csl
 from website.exceptions import (InvalidTagError, NodeStateError,
@@ -74,48 +74,10 @@ class AbstractNodeQuerySet(MODMCompatibilityQuerySet, IncludeQuerySet):
         return self.filter(id__in=self.exclude(type='osf.collection').values_list('root_id', flat=True))
 
     def get_children(self, root, active=False):
-        # If `root` is a root node, we can use the 'descendants' related name
-        # rather than doing a recursive query
-        if root.id == root.root_id:
-            query = root.descendants.exclude(id=root.id)
-            if active:
-                query = query.filter(is_deleted=False)
-            return query
-        else:
-            sql = """
-                WITH RECURSIVE descendants AS (
-                SELECT
-                    parent_id,
-                    child_id,
-                    1 AS LEVEL
-                FROM %s
-                %s
-                WHERE is_node_link IS FALSE %s
-                UNION ALL
-                SELECT
-                    s.parent_id,
-                    d.child_id,
-                    d.level + 1
-                FROM descendants AS d
-                    JOIN %s AS s
-                    ON d.parent_id = s.child_id
-                WHERE s.is_node_link IS FALSE
-                ) SELECT array_agg(DISTINCT child_id)
-                FROM descendants
-                WHERE parent_id = %s;
-            """
-            with connection.cursor() as cursor:
-                node_relation_table = AsIs(NodeRelation._meta.db_table)
-                cursor.execute(sql, [
-                    node_relation_table,
-                    AsIs('LEFT JOIN osf_abstractnode ON {}.child_id = osf_abstractnode.id'.format(node_relation_table) if active else ''),
-                    AsIs('AND osf_abstractnode.is_deleted IS FALSE' if active else ''),
-                    node_relation_table,
-                    root.pk])
-                row = cursor.fetchone()[0]
-                if not row:
-                    return AbstractNode.objects.none()
-                return AbstractNode.objects.filter(id__in=row)
+        query = self.filter(id__in=NodeClosure.objects.filter(ancestor=root).values('descendant_id'))
+        if active:
+            query = query.filter(is_deleted=False)
+        return query
 
     def can_view(self, user=None, private_link=None):
         qs = self.filter(is_public=True)
@@ -135,21 +97,9 @@ class AbstractNodeQuerySet(MODMCompatibilityQuerySet, IncludeQuerySet):
                 raise TypeError('"user" must be either {} or {}. Got {!r}'.format(int, OSFUser, user))
 
             qs |= self.filter(contributor__user_id=user, contributor__read=True)
-            qs |= self.extra(where=['''
-                "osf_abstractnode".id in (
-                    WITH RECURSIVE implicit_read AS (
-                        SELECT "osf_contributor"."node_id"
-                        FROM "osf_contributor"
-                        WHERE "osf_contributor"."user_id" = %s
-                        AND "osf_contributor"."admin" is TRUE
-                    UNION ALL
-                        SELECT "osf_noderelation"."child_id"
-                        FROM "implicit_read"
-                        LEFT JOIN "osf_noderelation" ON "osf_noderelation"."parent_id" = "implicit_read"."node_id"
-                        WHERE "osf_noderelation"."is_node_link" IS FALSE
-                    ) SELECT * FROM implicit_read
-                )
-            '''], params=(user, ))
+            admin_node_ids = Contributor.objects.filter(user_id=user, admin=True).values('node_id')
+            qs |= self.filter(id__in=admin_node_ids)
+            qs |= self.filter(id__in=NodeClosure.objects.filter(ancestor_id__in=admin_node_ids).values('descendant_id'))
 
         return qs.distinct()
 
@@ -676,11 +626,11 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             logger.exception(e)
             log_exception()
 
-    def update_search(self):
+    def update_search(self, saved_fields=None):
         from website import search
 
         try:
-            search.search.update_node(self, bulk=False, async=True)
+            search.search.update_node(self, bulk=False, async=True, saved_fields=saved_fields)
         except search.exceptions.SearchUnavailableError as e:
             logger.exception(e)
             log_exception()
@@ -803,10 +753,16 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.absolute_api_v2_url
 
     def get_permissions(self, user):
-        if hasattr(self.contributor_set.all(), '_result_cache'):
+        if 'contributor_set' in getattr(self, '_prefetched_objects_cache', {}):
             for contrib in self.contributor_set.all():
                 if contrib.user_id == user.id:
                     return get_contributor_permissions(contrib)
+        cache = get_permission_cache()
+        if cache is not None and self.pk and user.pk:
+            permissions = cache.get_permissions(user.pk, self.pk)
+            if permissions is None:
+                return []
+            return [perm for perm, granted in zip((READ, WRITE, ADMIN), permissions) if granted]
         try:
             contrib = user.contributor_set.get(node=self)
         except Contributor.DoesNotExist:
@@ -829,8 +785,12 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         """
         if not user:
             return False
-        query = {'node': self, permission: True}
-        has_permission = user.contributor_set.filter(**query).exists()
+        cache = get_permission_cache()
+        if cache is not None and self.pk and user.pk:
+            has_permission = cache.has_permission(user.pk, self.pk, permission)
+        else:
+            query = {'node': self, permission: True}
+            has_permission = user.contributor_set.filter(**query).exists()
         if not has_permission and permission == 'read' and check_parent:
             return self.is_admin_parent(user)
         return has_permission
@@ -847,12 +807,18 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return False
 
     def is_admin_parent(self, user):
-        if self.has_permission(user, 'admin', check_parent=False):
-            return True
-        parent = self.parent_node
-        if parent:
-            return parent.is_admin_parent(user)
-        return False
+        """Whether ``user`` is an admin on this node or on any of its ancestors."""
+        if not user or not user.pk:
+            return False
+        cache = get_permission_cache()
+        if cache is not None and self.pk:
+            return cache.is_admin_parent(user.pk, self.pk)
+        ancestor_ids = NodeClosure.objects.filter(descendant_id=self.pk).values('ancestor_id')
+        return Contributor.objects.filter(
+            models.Q(node_id=self.pk) | models.Q(node_id__in=ancestor_ids),
+            user_id=user.pk,
+            admin=True,
+        ).exists()
 
     def find_readable_descendants(self, auth):
         """ Returns a generator of first descendant node(s) readable by <user>
@@ -1055,7 +1021,12 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
 
     def is_contributor(self, user):
         """Return whether ``user`` is a contributor on this node."""
-        return user is not None and Contributor.objects.filter(user=user, node=self).exists()
+        if user is None:
+            return False
+        cache = get_permission_cache()
+        if cache is not None and self.pk and user.pk:
+            return cache.get_permissions(user.pk, self.pk) is not None
+        return Contributor.objects.filter(user=user, node=self).exists()
 
     def set_visible(self, user, visible, log=True, auth=None, save=False):
         if not self.is_contributor(user):
@@ -1548,36 +1519,13 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.private_links.filter(is_deleted=True).values_list('key', flat=True)
 
     def get_root(self):
-        sql = """
-            WITH RECURSIVE ascendants AS (
-              SELECT
-                parent_id,
-                child_id,
-                1 AS LEVEL
-              FROM %s
-              WHERE is_node_link IS FALSE
-              UNION ALL
-              SELECT
-                S.parent_id,
-                D.child_id,
-                D.level + 1
-              FROM ascendants AS D
-                JOIN %s AS S
-                  ON D.parent_id = S.child_id
-              WHERE S.is_node_link IS FALSE
-            ) SELECT parent_id
-              FROM ascendants
-              WHERE child_id = %s
-              ORDER BY level DESC
-              LIMIT 1;
-        """
-        with connection.cursor() as cursor:
-            node_relation_table = AsIs(NodeRelation._meta.db_table)
-            cursor.execute(sql, [node_relation_table, node_relation_table, self.pk])
-            res = cursor.fetchone()
-            if res:
-                return AbstractNode.objects.get(pk=res[0])
-            return self
+        root_id = (NodeClosure.objects.filter(descendant=self)
+                   .order_by('-depth')
+                   .values_list('ancestor_id', flat=True)
+                   .first())
+        if root_id:
+            return AbstractNode.objects.get(pk=root_id)
+        return self
 
     def find_readable_antecedent(self, auth):
         """ Returns first antecendant node readable by <user>.
@@ -1596,6 +1544,9 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             contrib.node = self
             contribs.append(contrib)
         Contributor.objects.bulk_create(contribs)
+        # bulk_create does not send post_save
+        for contrib in contribs:
+            invalidate_user_permissions(contrib.user_id)
 
     def register_node(self, schema, auth, data, parent=None):
         """Make a frozen copy of a node.
@@ -1852,15 +1803,17 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         if save:
             self.save()
 
-    # TODO: Optimize me (e.g. use bulk create)
     def fork_node(self, auth, title=None):
-        """Recursively fork a node.
+        """Fork a node and every component beneath it that the user can read.
+
+        The component tree is walked one level at a time, so forking takes a fixed number of
+        queries per level of the tree (plus the saves of the forked nodes themselves). Logs,
+        tags and citations of all forked nodes are copied in bulk.
 
         :param Auth auth: Consolidated authorization
         :param str title: Optional text to prepend to forked title
         :return: Forked node
         """
-        Registration = apps.get_model('osf.Registration')
         PREFIX = 'Fork of '
         user = auth.user
 
@@ -1868,114 +1821,146 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         if not (self.is_public or self.has_permission(user, 'read')):
             raise PermissionsError('{0!r} does not have permission to fork node {1!r}'.format(user, self._id))
 
+        if self.is_deleted:
+            raise NodeStateError('Cannot fork deleted node.')
+
+        if title is None:
+            title = PREFIX + self.title
+        elif title == '':
+            title = self.title
+
         when = timezone.now()
+        with transaction.atomic():
+            forked = self._fork_one(user, when, title)
+            forks = [(self, forked)]
+            level = forks
+            while level:
+                forks_by_parent = {original.pk: fork for original, fork in level}
+                relations = list(
+                    NodeRelation.objects.filter(parent_id__in=forks_by_parent.keys(), child__is_deleted=False)
+                    .select_related('child').order_by('parent_id', '_order')
+                )
+                prime_permissions(user, [relation.child for relation in relations if not relation.is_node_link])
+                level = []
+                for relation in relations:
+                    child, parent_fork = relation.child, forks_by_parent[relation.parent_id]
+                    if relation.is_node_link:
+                        # Copy linked nodes
+                        NodeRelation.objects.get_or_create(is_node_link=True, parent=parent_fork, child=child)
+                    elif child.is_public or child.has_permission(user, 'read'):
+                        # Components the user can't read are omitted, along with everything beneath them
+                        level.append((child, child._fork_one(user, when, child.title, parent=parent_fork, root=forked)))
+                forks.extend(level)
+
+            self._copy_fork_data(forks)
+
+            for original, fork in forks:
+                # Need to call this after save for the notifications to be created with the _primary_key
+                project_signals.contributor_added.send(fork, contributor=user, auth=auth)
+                fork.add_log(
+                    action=NodeLog.NODE_FORKED,
+                    params={
+                        'parent_node': original.parent_id,
+                        'node': original._primary_key,
+                        'registration': fork._primary_key,  # TODO: Remove this in favor of 'fork'
+                        'fork': fork._primary_key,
+                    },
+                    auth=auth,
+                    log_date=when,
+                    save=False,
+                )
+                fork.refresh_from_db()
 
-        original = self
+                # After fork callback
+                for addon in original.get_addons():
+                    addon.after_fork(original, fork, user)
 
-        if original.is_deleted:
+        return forked
+
+    def fork_node_async(self, auth, title=None):
+        """Fork this node in a celery task. Returns the task's ``AsyncResult``, whose result is
+        the ``_id`` of the fork.
+        """
+        if not (self.is_public or self.has_permission(auth.user, 'read')):
+            raise PermissionsError('{0!r} does not have permission to fork node {1!r}'.format(auth.user, self._id))
+        if self.is_deleted:
             raise NodeStateError('Cannot fork deleted node.')
+        return node_tasks.fork_node.delay(self._id, auth.user._id, title=title)
+
+    def _fork_one(self, user, when, title, parent=None, root=None):
+        """Create and save a fork of this node alone, as a component of ``parent`` if given."""
+        Registration = apps.get_model('osf.Registration')
 
         # Note: Cloning a node will clone each node wiki page version and add it to
         # `registered.wiki_pages_current` and `registered.wiki_pages_versions`.
-        forked = original.clone()
+        forked = self.clone()
         if isinstance(forked, Registration):
             forked.recast('osf.node')
 
         forked.is_fork = True
         forked.forked_date = when
-        forked.forked_from = original
+        forked.forked_from = self
         forked.creator = user
-        forked.node_license = original.license.copy() if original.license else None
+        forked.node_license = self.license.copy() if self.license else None
         forked.wiki_private_uuids = {}
-
+        forked.title = title
         # Forks default to private status
         forked.is_public = False
 
-        # Need to save here in order to access m2m fields
+        # The root and the parent relation are set by set_parent_and_root when the fork is saved
+        forked.root = root
+        forked._parent = parent
         forked.save()
 
-        forked.tags.add(*self.all_tags.values_list('pk', flat=True))
-        for node_relation in original.node_relations.filter(child__is_deleted=False):
-            node_contained = node_relation.child
-            # Fork child nodes
-            if not node_relation.is_node_link:
-                try:  # Catch the potential PermissionsError above
-                    forked_node = node_contained.fork_node(auth=auth, title='')
-                except PermissionsError:
-                    pass  # If this exception is thrown omit the node from the result set
-                    forked_node = None
-                if forked_node is not None:
-                    NodeRelation.objects.get_or_create(
-                        is_node_link=False,
-                        parent=forked,
-                        child=forked_node
-                    )
-                    forked_node.root = None
-                    forked_node.save()  # Recompute root on save()
-            else:
-                # Copy linked nodes
-                NodeRelation.objects.get_or_create(
-                    is_node_link=True,
-                    parent=forked,
-                    child=node_contained
-                )
-
-        if title is None:
-            forked.title = PREFIX + original.title
-        elif title == '':
-            forked.title = original.title
-        else:
-            forked.title = title
-
-        # TODO: Optimize me
-        for citation in self.alternative_citations.all():
-            cloned_citation = citation.clone()
-            cloned_citation.save()
-            forked.add_citation(
-                auth=auth,
-                citation=cloned_citation,
-                log=False,
-                save=False
-            )
-
         forked.add_contributor(
             contributor=user,
             permissions=CREATOR_PERMISSIONS,
             log=False,
             save=False
         )
+        return forked
 
-        forked.root = None  # Recompute root on save
-
-        forked.save()
-
-        # Need to call this after save for the notifications to be created with the _primary_key
-        project_signals.contributor_added.send(forked, contributor=user, auth=auth)
-
-        forked.add_log(
-            action=NodeLog.NODE_FORKED,
-            params={
-                'parent_node': original.parent_id,
-                'node': original._primary_key,
-                'registration': forked._primary_key,  # TODO: Remove this in favor of 'fork'
-                'fork': forked._primary_key,
-            },
-            auth=auth,
-            log_date=when,
-            save=False,
+    def _copy_fork_data(self, forks, batch_size=1000):
+        """Copy the tags, citations and logs of every original node in ``forks``, a list of
+        (original, fork) pairs, to its fork.
+        """
+        fork_ids = {original.pk: fork.pk for original, fork in forks}
+
+        TagThrough = AbstractNode.tags.through
+        TagThrough.objects.bulk_create([
+            TagThrough(abstractnode_id=fork_ids[node_id], tag_id=tag_id)
+            for node_id, tag_id in TagThrough.objects.filter(abstractnode_id__in=fork_ids.keys())
+            .order_by('id').values_list('abstractnode_id', 'tag_id')
+        ])
+
+        CitationThrough = AbstractNode.alternative_citations.through
+        citations = []
+        for through in CitationThrough.objects.filter(abstractnode_id__in=fork_ids.keys()).select_related('alternativecitation').order_by('id'):
+            original_citation = through.alternativecitation
+            citations.append((
+                fork_ids[through.abstractnode_id],
+                AlternativeCitation(name=original_citation.name, text=original_citation.text)
+            ))
+        AlternativeCitation.objects.bulk_create([citation for _, citation in citations])
+        CitationThrough.objects.bulk_create([
+            CitationThrough(abstractnode_id=fork_id, alternativecitation_id=citation.pk)
+            for fork_id, citation in citations
+        ])
+
+        # Clone each log from the original nodes for their forks.
+        logs = (
+            NodeLog.objects.filter(node_id__in=fork_ids.keys()).order_by('id')
+            .values('node_id', 'date', 'action', 'params', 'should_hide', 'user_id', 'foreign_user', 'original_node_id')
+            .iterator()
         )
-
-        # Clone each log from the original node for this fork.
-        for log in original.logs.all():
-            log.clone_node_log(forked._id)
-
-        forked.refresh_from_db()
-
-        # After fork callback
-        for addon in original.get_addons():
-            addon.after_fork(original, forked, user)
-
-        return forked
+        while True:
+            batch = [
+                NodeLog(**dict(log, node_id=fork_ids[log['node_id']]))
+                for log in itertools.islice(logs, batch_size)
+            ]
+            if not batch:
+                break
+            NodeLog.objects.bulk_create(batch)
 
     def use_as_template(self, auth, changes=None, top_level=True):
         """Create a new project, using an existing project as a template.
@@ -2314,12 +2299,14 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
 
         if self.preprint_file:
             # avoid circular imports
-            from website.preprints.tasks import on_preprint_updated
+            from website.preprints.tasks import enqueue_share_update, on_preprint_updated
             PreprintService = apps.get_model('osf.PreprintService')
-            update_share = bool(self.SEARCH_UPDATE_FIELDS.intersection(saved_fields))
             # .preprints wouldn't return a single deleted preprint
-            for preprint in PreprintService.objects.filter(node_id=self.id, is_published=True):
-                enqueue_task(on_preprint_updated.s(preprint._id, update_share=update_share))
+            preprint_ids = [preprint._id for preprint in PreprintService.objects.filter(node_id=self.id, is_published=True)]
+            for preprint_id in preprint_ids:
+                enqueue_task(on_preprint_updated.s(preprint_id))
+            if self.SEARCH_UPDATE_FIELDS.intersection(saved_fields):
+                enqueue_share_update(preprint_ids)
 
         user = User.load(user_id)
         if user and self.check_spam(user, saved_fields, request_headers):
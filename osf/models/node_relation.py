@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import connection, models
 
+from osf.utils.permission_cache import invalidate_relation_permissions
 from .base import BaseModel, ObjectIDMixin
 
 
@@ -19,9 +20,141 @@ class NodeRelation(ObjectIDMixin, BaseModel):
         """For v1 compat."""
         return self.child
 
+    def save(self, *args, **kwargs):
+        previous = None
+        if self.pk:
+            previous = NodeRelation.objects.filter(pk=self.pk).values('parent_id', 'child_id', 'is_node_link').first()
+        ret = super(NodeRelation, self).save(*args, **kwargs)
+        if previous and not previous['is_node_link']:
+            if (previous['parent_id'], previous['child_id'], previous['is_node_link']) == (self.parent_id, self.child_id, self.is_node_link):
+                return ret
+            NodeClosure.objects.remove_relation(previous['parent_id'], previous['child_id'])
+            invalidate_relation_permissions()
+        if not self.is_node_link:
+            NodeClosure.objects.add_relation(self.parent_id, self.child_id)
+            invalidate_relation_permissions()
+        return ret
+
+    def delete(self, *args, **kwargs):
+        parent_id, child_id, is_node_link = self.parent_id, self.child_id, self.is_node_link
+        ret = super(NodeRelation, self).delete(*args, **kwargs)
+        if not is_node_link:
+            NodeClosure.objects.remove_relation(parent_id, child_id)
+            invalidate_relation_permissions()
+        return ret
+
     class Meta:
         order_with_respect_to = 'parent'
         unique_together = ('parent', 'child')
         index_together = (
             ('is_node_link', 'child', 'parent'),
         )
+
+
+class NodeClosureManager(models.Manager):
+
+    # Every (ancestor, descendant) pair reachable through component (non-link) relations,
+    # computed from scratch. Used to backfill and to verify the materialized table.
+    EXPECTED_SQL = """
+        WITH RECURSIVE paths AS (
+            SELECT parent_id AS ancestor_id, child_id AS descendant_id, 1 AS depth
+            FROM osf_noderelation
+            WHERE is_node_link IS FALSE
+        UNION
+            SELECT R.parent_id, P.descendant_id, P.depth + 1
+            FROM paths AS P
+                JOIN osf_noderelation AS R ON R.child_id = P.ancestor_id
+            WHERE R.is_node_link IS FALSE
+        ) SELECT ancestor_id, descendant_id, MIN(depth) AS depth
+        FROM paths
+        GROUP BY ancestor_id, descendant_id
+    """
+
+    def add_relation(self, parent_id, child_id):
+        """Materialize the paths created by making ``child_id`` a component of ``parent_id``:
+        every ancestor of the parent (and the parent itself) becomes an ancestor of
+        the child and of everything beneath it.
+        """
+        sql = """
+            INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+            SELECT A.ancestor_id, D.descendant_id, A.depth + D.depth + 1
+            FROM (
+                SELECT %(parent_id)s AS ancestor_id, 0 AS depth
+                UNION ALL
+                SELECT ancestor_id, depth FROM osf_nodeclosure WHERE descendant_id = %(parent_id)s
+            ) AS A CROSS JOIN (
+                SELECT %(child_id)s AS descendant_id, 0 AS depth
+                UNION ALL
+                SELECT descendant_id, depth FROM osf_nodeclosure WHERE ancestor_id = %(child_id)s
+            ) AS D
+            ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'parent_id': parent_id, 'child_id': child_id})
+
+    def remove_relation(self, parent_id, child_id):
+        """Remove every path that ran through the ``parent_id`` -> ``child_id`` edge."""
+        sql = """
+            DELETE FROM osf_nodeclosure
+            WHERE ancestor_id IN (
+                SELECT %(parent_id)s
+                UNION ALL
+                SELECT ancestor_id FROM osf_nodeclosure WHERE descendant_id = %(parent_id)s
+            ) AND descendant_id IN (
+                SELECT %(child_id)s
+                UNION ALL
+                SELECT descendant_id FROM osf_nodeclosure WHERE ancestor_id = %(child_id)s
+            );
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {'parent_id': parent_id, 'child_id': child_id})
+
+    def rebuild(self):
+        """Truncate and recompute the closure table from ``osf_noderelation``.
+        Returns the number of rows written.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM osf_nodeclosure;')
+            cursor.execute(
+                'INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth) {};'.format(self.EXPECTED_SQL)
+            )
+            return cursor.rowcount
+
+    def verify(self):
+        """Compare the materialized table against a recursive walk of ``osf_noderelation``.
+        Returns a tuple of (missing, extra) row lists of (ancestor_id, descendant_id, depth).
+        """
+        sql = """
+            WITH expected AS ({expected}),
+            actual AS (SELECT ancestor_id, descendant_id, depth FROM osf_nodeclosure)
+            SELECT 'missing', * FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual) AS M
+            UNION ALL
+            SELECT 'extra', * FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected) AS E;
+        """.format(expected=self.EXPECTED_SQL)
+        missing, extra = [], []
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            for kind, ancestor_id, descendant_id, depth in cursor.fetchall():
+                (missing if kind == 'missing' else extra).append((ancestor_id, descendant_id, depth))
+        return missing, extra
+
+
+class NodeClosure(BaseModel):
+    """Materialized ancestor/descendant pairs of the component tree (node links excluded).
+    ``depth`` is 1 for a direct parent, 2 for a grandparent and so on. Kept in sync by
+    ``NodeRelation.save``/``NodeRelation.delete``.
+    """
+    ancestor = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    descendant = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    objects = NodeClosureManager()
+
+    def __unicode__(self):
+        return 'ancestor={}, descendant={}, depth={}'.format(self.ancestor_id, self.descendant_id, self.depth)
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        index_together = (
+            ('descendant', 'depth'),
+        )
@@ -11,6 +11,7 @@ from framework.celery_tasks.handlers import enqueue_task
 from framework.exceptions import PermissionsError
 from osf.models import NodeLog, Subject
 from osf.models.validators import validate_subject_hierarchy
+from osf.utils import taxonomy_index
 from osf.utils.fields import NonNaiveDateTimeField
 from website.preprints.tasks import on_preprint_updated, get_and_set_preprint_identifiers
 from website.project.licenses import set_license
@@ -73,8 +74,12 @@ class PreprintService(DirtyFieldsMixin, GuidMixin, IdentifierMixin, BaseModel):
 
     @cached_property
     def subject_hierarchy(self):
+        index = taxonomy_index.get_index()
+        subjects = list(self.subjects.all())
+        subject_ids = set(s.pk for s in subjects)
         return [
-            s.object_hierarchy for s in self.subjects.exclude(children__in=self.subjects.all())
+            s.object_hierarchy for s in subjects
+            if not any(child.pk in subject_ids for child in index.children(s.pk))
         ]
 
     @property
@@ -231,3 +236,15 @@ class PreprintService(DirtyFieldsMixin, GuidMixin, IdentifierMixin, BaseModel):
         if (not first_save and 'is_published' in saved_fields) or self.is_published:
             enqueue_task(on_preprint_updated.s(self._id))
         return ret
+
+
+class FailedShareSubmission(BaseModel):
+    """A preprint SHARE didn't accept, kept until it is sent successfully (see the
+    ``replay_share_preprints`` management command).
+    """
+    preprint = models.OneToOneField('osf.PreprintService', related_name='failed_share_submission', on_delete=models.CASCADE)
+    status_code = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=1)
+    date_created = NonNaiveDateTimeField(auto_now_add=True)
+    date_modified = NonNaiveDateTimeField(auto_now=True)
@@ -1,3 +1,6 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
 from osf.models.base import BaseModel, ObjectIDMixin
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField
@@ -15,3 +18,15 @@ class Session(ObjectIDMixin, BaseModel):
     @property
     def is_external_first_login(self):
         return 'auth_user_external_first_login' in self.data
+
+
+@receiver(post_save, sender=Session)
+def update_cached_session(sender, instance, **kwargs):
+    from framework.sessions import store
+    store.update_cached_session(instance)
+
+
+@receiver(post_delete, sender=Session)
+def evict_cached_session(sender, instance, **kwargs):
+    from framework.sessions import store
+    store.evict_session(instance._id)
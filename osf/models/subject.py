@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 from dirtyfields import DirtyFieldsMixin
 from django.db import models
-from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 from django.utils.functional import cached_property
 from include import IncludeQuerySet
@@ -10,12 +11,12 @@ from website.util import api_v2_url
 
 from osf.models.base import BaseModel, MODMCompatibilityQuerySet, ObjectIDMixin
 from osf.models.validators import validate_subject_hierarchy_length, validate_subject_provider_mapping
+from osf.utils import taxonomy_index
 
 class SubjectQuerySet(MODMCompatibilityQuerySet, IncludeQuerySet):
     def include_children(self):
-        # It would be more efficient to OR self with the latter two Q's,
-        # but this breaks for certain querysets when relabeling aliases.
-        return Subject.objects.filter(Q(id__in=self.values_list('id', flat=True)) | Q(parent__in=self) | Q(parent__parent__in=self))
+        subject_ids = self.values_list('id', flat=True)
+        return Subject.objects.filter(id__in=taxonomy_index.get_index().with_descendants(subject_ids))
 
 class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
     """A subject discipline that may be attached to a preprint."""
@@ -41,7 +42,7 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
     @property
     def child_count(self):
         """For v1 compat."""
-        return self.children.count()
+        return len(taxonomy_index.get_index().children(self.pk))
 
     def get_absolute_url(self):
         return self.absolute_api_v2_url
@@ -54,12 +55,15 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
 
     @cached_property
     def hierarchy(self):
-        if self.parent:
-            return self.parent.hierarchy + [self._id]
-        return [self._id]
+        return [subject._id for subject in self.object_hierarchy]
 
     @cached_property
     def object_hierarchy(self):
+        index = taxonomy_index.get_index()
+        entry = index.get(self.pk)
+        # Subjects that are unsaved or whose parent changed since the index was built walk the database
+        if entry is not None and entry.parent_id == self.parent_id:
+            return [index.to_subject(pk) for pk in entry.hierarchy[:-1]] + [self]
         if self.parent:
             return self.parent.object_hierarchy + [self]
         return [self]
@@ -75,3 +79,9 @@ class Subject(ObjectIDMixin, BaseModel, DirtyFieldsMixin):
         if self.preprint_services.exists():
             raise ValidationError('Cannot delete a used Subject')
         return super(Subject, self).delete()
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+def invalidate_taxonomy_index(sender, instance, **kwargs):
+    taxonomy_index.on_subject_changed()
@@ -42,8 +42,10 @@ from osf.models.session import Session
 from osf.models.tag import Tag
 from osf.models.validators import validate_email, validate_social, validate_history_item
 from osf.modm_compat import Q
+from osf.utils import guid_cache
 from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField, LowercaseEmailField
+from osf.utils.permission_cache import invalidate_user_permissions
 from osf.utils.names import impute_names
 from website import settings as website_settings
 from website import filters, mails
@@ -656,6 +658,9 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
                 node.contributor_set.filter(user=user).delete()
             else:
                 node.contributor_set.filter(user=user).update(user=self)
+                # update does not send post_save
+                invalidate_user_permissions(self.id)
+                invalidate_user_permissions(user.id)
 
             node.save()
 
@@ -681,6 +686,7 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
         user.merged_by = self
 
         user.save()
+        guid_cache.invalidate_referent(user)
 
     def disable_account(self):
         """
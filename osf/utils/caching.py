@@ -8,9 +8,14 @@ The property can also be safely set and deleted without interference.
 NOTE: Properties will *not* be cached if they return `None`. Use
 `django.utils.functional.cached_property` for properties that
 can return `None` and do not need a setter.
+
+``LRUCache`` is a bounded, expiring in-process cache for values that outlive a request.
 """
 from __future__ import unicode_literals
 
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 
 # from https://github.com/etianen/django-optimizations/blob/master/src/optimizations/propertycache.py
@@ -65,3 +70,41 @@ class _CachedProperty(property):
 
 # Public name for the cached property decorator. Using a class as a decorator just looks plain ugly. :P
 cached_property = _CachedProperty
+
+
+class LRUCache(object):
+    """A thread-safe LRU cache whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                return None
+            self._entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl=None):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
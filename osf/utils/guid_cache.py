@@ -0,0 +1,110 @@
+"""
+A cache of GUID lookups, used by ``Guid.load`` and GUID URL resolution.
+
+Each GUID maps to a ``GuidEntry``: the Guid's own fields plus the ``deep_url`` of its referent
+once that has been resolved. Entries are read from a small in-process LRU, then from the shared
+Django cache named by ``GUID_CACHE_ALIAS`` (if any). Entries in the in-process cache live for
+``GUID_LOCAL_CACHE_TTL`` seconds, so another process's invalidation can take that long to be seen.
+
+Entries are invalidated when a Guid is saved or deleted, and when a referent's ``deep_url`` can
+change: files moving to another node, wiki pages being renamed and users being merged.
+"""
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import transaction
+
+from osf.utils.caching import LRUCache
+from website import settings
+
+CACHE_KEY = 'osf-guid:{}'
+
+
+class GuidEntry(namedtuple('GuidEntry', ['pk', 'content_type_id', 'object_id', 'created', 'deep_url'])):
+    __slots__ = ()
+
+    @classmethod
+    def from_guid(cls, guid, deep_url=None):
+        return cls(guid.pk, guid.content_type_id, guid.object_id, guid.created, deep_url)
+
+    def to_guid(self, guid_id):
+        """Return an unsaved-looking Guid instance built from this entry."""
+        Guid = apps.get_model('osf.Guid')
+        guid = Guid(id=self.pk, _id=guid_id, content_type_id=self.content_type_id, object_id=self.object_id, created=self.created)
+        guid._state.adding = False
+        guid._state.db = 'default'
+        return guid
+
+
+local_cache = LRUCache(settings.GUID_LOCAL_CACHE_SIZE, settings.GUID_LOCAL_CACHE_TTL)
+
+
+def get_shared_cache():
+    if settings.GUID_CACHE_ALIAS:
+        return caches[settings.GUID_CACHE_ALIAS]
+    return None
+
+
+def get_entry(guid_id):
+    """Return the cached ``GuidEntry`` for ``guid_id``, or None."""
+    guid_id = guid_id.lower()
+    entry = local_cache.get(guid_id)
+    if entry is None:
+        shared_cache = get_shared_cache()
+        state = shared_cache.get(CACHE_KEY.format(guid_id)) if shared_cache else None
+        if state is None:
+            return None
+        entry = GuidEntry(*state)
+        local_cache.set(guid_id, entry)
+    return entry
+
+
+def set_entry(guid_id, entry):
+    guid_id = guid_id.lower()
+    local_cache.set(guid_id, entry)
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        shared_cache.set(CACHE_KEY.format(guid_id), tuple(entry), settings.GUID_SHARED_CACHE_TTL)
+
+
+def set_deep_url(guid, deep_url):
+    """Cache ``guid`` along with the ``deep_url`` of its referent."""
+    set_entry(guid._id, GuidEntry.from_guid(guid, deep_url=deep_url))
+
+
+def _evict(guid_ids):
+    shared_cache = get_shared_cache()
+    for guid_id in guid_ids:
+        local_cache.delete(guid_id.lower())
+    if shared_cache:
+        shared_cache.delete_many([CACHE_KEY.format(guid_id.lower()) for guid_id in guid_ids])
+
+
+def invalidate(guid_ids):
+    """Drop the entries of ``guid_ids`` now, and again once the transaction commits in case
+    another request cached the old state in the meantime.
+    """
+    guid_ids = list(guid_ids)
+    if guid_ids:
+        _evict(guid_ids)
+        transaction.on_commit(lambda: _evict(guid_ids))
+
+
+def invalidate_referent(referent):
+    """Drop the entries of every GUID of ``referent``."""
+    invalidate_referents(type(referent), [referent.pk])
+
+
+def invalidate_referents(model, pks):
+    """Drop the entries of every GUID of the ``model`` instances with primary keys ``pks``."""
+    Guid = apps.get_model('osf.Guid')
+    ContentType = apps.get_model('contenttypes.ContentType')
+    pks = list(pks)
+    if pks:
+        invalidate(Guid.objects.filter(
+            content_type=ContentType.objects.get_for_model(model),
+            object_id__in=pks,
+        ).values_list('_id', flat=True))
@@ -0,0 +1,54 @@
+"""
+A small HyperLogLog sketch for estimating the number of distinct values (e.g. visitors) in a
+fixed amount of space. Registers are stored as a plain list of small integers, so sketches can
+be kept in a Postgres ``smallint[]`` column and merged there with ``GREATEST``.
+"""
+from __future__ import division
+
+import hashlib
+import math
+
+# 2 ** 10 registers give a standard error of about 3%
+DEFAULT_PRECISION = 10
+
+
+class HyperLogLog(object):
+
+    def __init__(self, registers=None, precision=DEFAULT_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = list(registers) if registers else [0] * self.size
+        if len(self.registers) != self.size:
+            raise ValueError('Expected {} registers, got {}'.format(self.size, len(self.registers)))
+
+    def add(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        hashed = int(hashlib.sha1(str(value)).hexdigest()[:16], 16)
+        index = hashed >> (64 - self.precision)
+        remaining = (hashed << self.precision) & ((1 << 64) - 1)
+        rank = 1
+        while rank <= 64 - self.precision and not remaining & (1 << 63):
+            rank += 1
+            remaining <<= 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Fold ``other`` (a sketch or a list of registers) into this sketch."""
+        registers = other.registers if isinstance(other, HyperLogLog) else other
+        if registers:
+            self.registers = [max(mine, theirs) for mine, theirs in zip(self.registers, registers)]
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def __nonzero__(self):
+        return any(self.registers)
@@ -0,0 +1,140 @@
+"""
+A request-scoped cache of contributor permissions.
+
+Permission checks (``AbstractNode.has_permission``, ``can_view``, ``is_admin_parent``) are made
+over and over for the same (user, node) pairs while serving a single request. When a request is
+active, those checks read through a ``PermissionCache`` that can be filled for a whole page of
+nodes with two queries. Outside of a request (celery tasks, scripts, shells) no cache is active
+and every check goes to the database.
+
+The cache is invalidated when ``Contributor`` rows are saved or deleted (for the affected user)
+and when component relations change (for inherited admin permissions).
+"""
+from __future__ import unicode_literals
+
+import threading
+
+from django.apps import apps
+
+_local = threading.local()
+
+
+class PermissionCache(object):
+
+    def __init__(self):
+        # (user_id, node_id) -> (read, write, admin), or None if the user is not a contributor
+        self._contributors = {}
+        # (user_id, node_id) -> whether the user is an admin on the node or any of its ancestors
+        self._admin_parents = {}
+
+    def prime(self, user_id, node_ids):
+        """Load permissions of ``user_id`` on every node in ``node_ids``, including admin
+        permissions inherited from ancestors.
+        """
+        Contributor = apps.get_model('osf.Contributor')
+        NodeClosure = apps.get_model('osf.NodeClosure')
+
+        node_ids = set(node_ids)
+        missing = set(node_id for node_id in node_ids if (user_id, node_id) not in self._contributors)
+        if missing:
+            for node_id in missing:
+                self._contributors[(user_id, node_id)] = None
+            rows = Contributor.objects.filter(user_id=user_id, node_id__in=missing).values_list('node_id', 'read', 'write', 'admin')
+            for node_id, read, write, admin in rows:
+                self._contributors[(user_id, node_id)] = (read, write, admin)
+
+        missing = set(node_id for node_id in node_ids if (user_id, node_id) not in self._admin_parents)
+        if missing:
+            ancestors = {}
+            for descendant_id, ancestor_id in NodeClosure.objects.filter(descendant_id__in=missing).values_list('descendant_id', 'ancestor_id'):
+                ancestors.setdefault(descendant_id, set()).add(ancestor_id)
+            candidates = set(missing).union(*ancestors.values())
+            admin_ids = set(
+                Contributor.objects.filter(user_id=user_id, admin=True, node_id__in=candidates).values_list('node_id', flat=True)
+            )
+            for node_id in missing:
+                self._admin_parents[(user_id, node_id)] = bool(
+                    node_id in admin_ids or ancestors.get(node_id, set()) & admin_ids
+                )
+
+    def get_permissions(self, user_id, node_id):
+        """Return (read, write, admin) for a contributor, or None for a non-contributor."""
+        if (user_id, node_id) not in self._contributors:
+            self.prime(user_id, [node_id])
+        return self._contributors[(user_id, node_id)]
+
+    def has_permission(self, user_id, node_id, permission):
+        permissions = self.get_permissions(user_id, node_id)
+        if permissions is None:
+            return False
+        read, write, admin = permissions
+        return {'read': read, 'write': write, 'admin': admin}[permission]
+
+    def is_admin_parent(self, user_id, node_id):
+        if (user_id, node_id) not in self._admin_parents:
+            self.prime(user_id, [node_id])
+        return self._admin_parents[(user_id, node_id)]
+
+    def invalidate_user(self, user_id):
+        self._contributors = {key: value for key, value in self._contributors.items() if key[0] != user_id}
+        self._admin_parents = {key: value for key, value in self._admin_parents.items() if key[0] != user_id}
+
+    def invalidate_relations(self):
+        self._admin_parents = {}
+
+    def clear(self):
+        self._contributors = {}
+        self._admin_parents = {}
+
+
+def get_permission_cache():
+    """Return the active request's ``PermissionCache``, or None outside of a request."""
+    return getattr(_local, 'permission_cache', None)
+
+
+def prime_permissions(user, objects):
+    """Fill the active cache with ``user``'s permissions on every node in ``objects``.
+    Non-node objects are ignored, as are anonymous users.
+    """
+    cache = get_permission_cache()
+    if cache is None or not user or not getattr(user, 'pk', None):
+        return
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    node_ids = [obj.pk for obj in objects or [] if isinstance(obj, AbstractNode)]
+    if node_ids:
+        cache.prime(user.pk, node_ids)
+
+
+def invalidate_user_permissions(user_id):
+    cache = get_permission_cache()
+    if cache is not None:
+        cache.invalidate_user(user_id)
+
+
+def invalidate_relation_permissions():
+    cache = get_permission_cache()
+    if cache is not None:
+        cache.invalidate_relations()
+
+
+def clear_permission_cache():
+    cache = get_permission_cache()
+    if cache is not None:
+        cache.clear()
+
+
+def permission_cache_before_request():
+    _local.permission_cache = PermissionCache()
+
+def permission_cache_after_request(response):
+    _local.permission_cache = None
+    return response
+
+def permission_cache_teardown_request(error=None):
+    _local.permission_cache = None
+
+handlers = {
+    'before_request': permission_cache_before_request,
+    'after_request': permission_cache_after_request,
+    'teardown_request': permission_cache_teardown_request,
+}
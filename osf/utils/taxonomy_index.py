@@ -0,0 +1,161 @@
+"""
+An in-memory index of every provider's subject taxonomy.
+
+The subject tree is small and rarely changes, so instead of walking ``parent`` one query per level,
+``get_index`` loads every Subject at once into an immutable ``TaxonomyIndex`` and answers hierarchy,
+children and provider lookups from dictionaries.
+
+Each process keeps one index. It is rebuilt after a Subject is saved or deleted in that process,
+after the version kept in the shared Django cache named by ``TAXONOMY_CACHE_ALIAS`` (if any) is
+bumped by another process, and otherwise every ``TAXONOMY_INDEX_TTL`` seconds, which bounds how
+long changes made by bulk queries (or other processes, without a shared cache) take to be seen.
+"""
+from __future__ import unicode_literals
+
+import threading
+import time
+from collections import namedtuple
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import transaction
+
+from website import settings
+
+VERSION_KEY = 'taxonomy-index-version'
+
+SubjectEntry = namedtuple('SubjectEntry', ['pk', '_id', 'text', 'provider_id', 'parent_id', 'bepress_subject_id', 'children', 'hierarchy'])
+
+
+class TaxonomyIndex(object):
+    """Every Subject, with its children and its hierarchy (pks from its root down to itself)."""
+
+    def __init__(self, field_names, rows, version=0):
+        self.version = version
+        self.built = time.time()
+        self._field_names = tuple(field_names)
+        self._values = {}
+        self._entries = {}
+        self._by_id = {}
+        self._by_provider = {}
+
+        pk_index = self._field_names.index('id')
+        fields = [self._field_names.index(name) for name in ('_id', 'text', 'provider_id', 'parent_id', 'bepress_subject_id')]
+        rows = {row[pk_index]: row for row in rows}
+        children = {}
+        for pk, row in rows.items():
+            parent_id = row[fields[3]]
+            if parent_id in rows:
+                children.setdefault(parent_id, []).append(pk)
+
+        for pk, row in rows.items():
+            hierarchy = [pk]
+            parent_id = row[fields[3]]
+            # Hierarchies are at most three levels deep, but don't trust that to end a cycle
+            while parent_id in rows and parent_id not in hierarchy:
+                hierarchy.insert(0, parent_id)
+                parent_id = rows[parent_id][fields[3]]
+            entry = SubjectEntry(pk, *([row[i] for i in fields] + [tuple(sorted(children.get(pk, ()))), tuple(hierarchy)]))
+            self._values[pk] = tuple(row)
+            self._entries[pk] = entry
+            self._by_id[entry._id] = pk
+            self._by_provider.setdefault(entry.provider_id, []).append(pk)
+        self._by_provider = {provider_id: tuple(sorted(pks)) for provider_id, pks in self._by_provider.items()}
+
+    @classmethod
+    def build(cls, version=0):
+        Subject = apps.get_model('osf.Subject')
+        field_names = [field.attname for field in Subject._meta.concrete_fields]
+        return cls(field_names, Subject.objects.values_list(*field_names), version=version)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, pk):
+        """Return the ``SubjectEntry`` of the Subject with primary key ``pk``, or None."""
+        return self._entries.get(pk)
+
+    def lookup(self, subject_id):
+        """Return the ``SubjectEntry`` of the Subject with ``_id`` ``subject_id``, or None."""
+        return self._entries.get(self._by_id.get(subject_id))
+
+    def children(self, pk):
+        return tuple(self._entries[child] for child in self._entries[pk].children) if pk in self._entries else ()
+
+    def hierarchy(self, pk):
+        return [self._entries[ancestor] for ancestor in self._entries[pk].hierarchy] if pk in self._entries else []
+
+    def provider_subjects(self, provider_id):
+        """Return the pks of the subjects of the PreprintProvider with primary key ``provider_id``."""
+        return self._by_provider.get(provider_id, ())
+
+    def with_descendants(self, pks):
+        """Return ``pks`` along with the pks of all of their descendants."""
+        found = set(pks)
+        pending = list(found)
+        while pending:
+            entry = self._entries.get(pending.pop())
+            if entry is not None:
+                for child in entry.children:
+                    if child not in found:
+                        found.add(child)
+                        pending.append(child)
+        return found
+
+    def to_subject(self, pk):
+        """Return a Subject instance built from the index, as if it had been loaded from the database."""
+        Subject = apps.get_model('osf.Subject')
+        return Subject.from_db('default', self._field_names, self._values[pk])
+
+
+_lock = threading.Lock()
+_current = None
+# Bumped by every invalidation, so that an index built meanwhile isn't kept
+_generation = 0
+
+
+def get_shared_cache():
+    if settings.TAXONOMY_CACHE_ALIAS:
+        return caches[settings.TAXONOMY_CACHE_ALIAS]
+    return None
+
+
+def get_index():
+    """Return the current ``TaxonomyIndex``, building it if needed.
+
+    :rtype: TaxonomyIndex
+    """
+    global _current
+    shared_cache = get_shared_cache()
+    version = shared_cache.get(VERSION_KEY, 0) if shared_cache else 0
+    current = _current
+    if current is not None and current.version == version and time.time() - current.built < settings.TAXONOMY_INDEX_TTL:
+        return current
+
+    generation = _generation
+    index = TaxonomyIndex.build(version=version)
+    if settings.TAXONOMY_INDEX_TTL > 0:
+        with _lock:
+            if generation == _generation:
+                _current = index
+    return index
+
+
+def invalidate():
+    """Drop this process's index and bump the shared version, so that every process rebuilds its own."""
+    global _current, _generation
+    with _lock:
+        _generation += 1
+        _current = None
+    shared_cache = get_shared_cache()
+    if shared_cache:
+        try:
+            shared_cache.incr(VERSION_KEY)
+        except ValueError:
+            shared_cache.set(VERSION_KEY, 1, None)
+
+
+def on_subject_changed():
+    """Rebuild the index now so this transaction sees its changes, and again once they're committed."""
+    invalidate()
+    transaction.on_commit(invalidate)
@@ -72,6 +72,15 @@ def patched_settings():
     """Patch settings for tests"""
     settings.ENABLE_EMAIL_SUBSCRIPTIONS = False
     settings.BCRYPT_LOG_ROUNDS = 1
+    settings.ELASTIC_REFRESH_ON_WRITE = True
+    settings.PAGE_COUNTER_FLUSH_INTERVAL = 0
+    settings.USER_ACTIVITY_FLUSH_INTERVAL = 0
+    settings.CAS_TOKEN_CACHE_TTL = 0
+    settings.CAS_TOKEN_NEGATIVE_CACHE_TTL = 0
+    settings.CITATION_CACHE_TTL = 0
+    settings.TAXONOMY_INDEX_TTL = 0
+    settings.ANALYTICS_INCREMENTAL_SNAPSHOTS = False
+    settings.ANALYTICS_SNAPSHOT_DIR = None
 
 @pytest.fixture()
 def fake():
@@ -3,8 +3,10 @@
 Unit tests for analytics logic in framework/analytics/__init__.py
 """
 
+import time
 import unittest
 
+import mock
 import pytest
 from django.utils import timezone
 from nose.tools import *  # flake8: noqa  (PEP8 asserts)
@@ -14,7 +16,9 @@ from datetime import datetime
 
 from framework import analytics, sessions
 from framework.sessions import session
-from osf.models import PageCounter, Session
+from osf.models import PageCounter, PageDayCounter, Session, UserActivityCounter, UserActivityDayCounter
+from osf.utils.hyperloglog import HyperLogLog
+from website import settings
 
 from tests.base import OsfTestCase
 from osf_tests.factories import UserFactory, ProjectFactory
@@ -43,6 +47,51 @@ class TestAnalytics(OsfTestCase):
         analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat(), db=None)
         assert_equal(user.get_activity_points(db=None), 1)
 
+    def test_increment_user_activity_counters_buffers_until_flush(self):
+        user = UserFactory()
+        date = timezone.now()
+        with mock.patch.object(settings, 'USER_ACTIVITY_FLUSH_INTERVAL', 3600):
+            analytics.user_activity_buffer.last_flush = time.time()
+            analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+            analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+            analytics.increment_user_activity_counters(user._id, 'node_forked', date.isoformat())
+
+            assert_false(UserActivityCounter.objects.filter(_id=user._id).exists())
+            assert_equal(analytics.get_total_activity_count(user._id), 3)
+
+            analytics.flush_user_activity_counters()
+
+        assert_equal(UserActivityCounter.objects.get(_id=user._id).total, 3)
+        assert_equal(analytics.get_total_activity_count(user._id), 3)
+        days = UserActivityDayCounter.objects.filter(user_guid=user._id, day=date.date())
+        assert_equal(dict(days.values_list('action', 'total')), {'project_created': 2, 'node_forked': 1})
+
+    def test_failed_flush_keeps_counts(self):
+        user = UserFactory()
+        date = timezone.now()
+        with mock.patch.object(settings, 'USER_ACTIVITY_FLUSH_INTERVAL', 3600):
+            analytics.user_activity_buffer.last_flush = time.time()
+            analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+            with mock.patch('osf.models.UserActivityCounter.flush_counts', side_effect=Exception):
+                analytics.flush_user_activity_counters()
+
+            assert_false(UserActivityCounter.objects.filter(_id=user._id).exists())
+            assert_equal(analytics.get_total_activity_count(user._id), 1)
+
+            analytics.flush_user_activity_counters()
+
+        assert_equal(UserActivityCounter.objects.get(_id=user._id).total, 1)
+
+    def test_flush_adds_to_existing_counts(self):
+        user = UserFactory()
+        date = timezone.now()
+        UserActivityCounter.objects.create(_id=user._id, total=5)
+        analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+        analytics.increment_user_activity_counters(user._id, 'project_created', date.isoformat())
+
+        assert_equal(UserActivityCounter.objects.get(_id=user._id).total, 7)
+        assert_equal(UserActivityDayCounter.objects.get(user_guid=user._id).total, 2)
+
 
 class UpdateCountersTestCase(OsfTestCase):
 
@@ -85,9 +134,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, self.fid), db=None)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=self.fid)
 
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, self.fid), db=None)
@@ -106,9 +152,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, self.fid), db=None)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
-
-        session.data['visited'].append(page)
         session.data['auth_user_id'] = self.userid
         download_file_(node=self.node, fid=self.fid)
 
@@ -128,9 +171,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, self.fid), db=None)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}'.format(self.node._id, self.fid)
-
-        session.data['visited'].append(page)
         session.data['auth_user_id'] = "asv12uey821vavshl"
         download_file_(node=self.node, fid=self.fid)
 
@@ -150,9 +190,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node._id, self.fid, self.vid), db=None)
         assert_equal(count, (1, 1))
 
-        page = 'download:{0}:{1}:{2}'.format(self.node._id, self.fid, self.vid)
-
-        session.data['visited'].append(page)
         download_file_version_(node=self.node, fid=self.fid, vid=self.vid)
 
         count = analytics.get_basic_counters('download:{0}:{1}:{2}'.format(self.node._id, self.fid, self.vid), db=None)
@@ -165,6 +202,54 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters(page, db=None)
         assert_equal(count, (3, 5))
 
+    def test_update_counters_buffers_until_flush(self):
+        page = 'node:' + str(self.node._id)
+        with mock.patch.object(settings, 'PAGE_COUNTER_FLUSH_INTERVAL', 3600):
+            analytics.page_counter_buffer.last_flush = time.time()
+            analytics.update_counter(page)
+            analytics.update_counter(page)
+
+            assert_false(PageCounter.objects.filter(_id=page).exists())
+            assert_equal(analytics.get_basic_counters(page), (1, 2))
+
+            analytics.flush_page_counters()
+
+        counter = PageCounter.objects.get(_id=page)
+        assert_equal((counter.total, counter.unique), (2, 0))
+        assert_equal(analytics.get_basic_counters(page), (1, 2))
+        day = PageDayCounter.objects.get(page=page)
+        assert_equal((day.day, day.total), (timezone.now().date(), 2))
+
+    def test_failed_flush_keeps_counts(self):
+        page = 'node:' + str(self.node._id)
+        with mock.patch.object(settings, 'PAGE_COUNTER_FLUSH_INTERVAL', 3600):
+            analytics.page_counter_buffer.last_flush = time.time()
+            analytics.update_counter(page)
+            analytics.update_counter(page)
+            with mock.patch('osf.models.PageCounter.flush_counts', side_effect=Exception):
+                analytics.flush_page_counters()
+
+            assert_false(PageCounter.objects.filter(_id=page).exists())
+            assert_equal(analytics.get_basic_counters(page), (1, 2))
+
+            analytics.flush_page_counters()
+
+        assert_equal(PageCounter.objects.get(_id=page).total, 2)
+        assert_equal(PageDayCounter.objects.get(page=page).total, 2)
+
+    def test_flush_merges_visitors(self):
+        page = 'node:' + str(self.node._id)
+        PageCounter.objects.create(_id=page, total=5, unique=3)
+        for visitor in ('a', 'b'):
+            sessions.set_session(Session(_id=visitor))
+            analytics.update_counter(page)
+
+        sessions.set_session(Session(_id='a'))
+        analytics.update_counter(page)
+
+        assert_equal(analytics.get_basic_counters(page), (5, 8))
+        assert_equal(PageDayCounter.objects.get(page=page).total, 3)
+
     @unittest.skip('Reverted the fix for #2281. Unskip this once we use GUIDs for keys in the download counts collection')
     def test_update_counters_different_files(self):
         # Regression test for https://github.com/CenterForOpenScience/osf.io/issues/2281
@@ -182,9 +267,6 @@ class TestUpdateCounters(UpdateCountersTestCase):
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, fid2), db=None)
         assert_equal(count, (None, None))
 
-        page = 'download:{0}:{1}'.format(self.node._id, fid1)
-
-        session.data['visited'].append(page)
         download_file_(node=self.node, fid=fid1)
         download_file_(node=self.node, fid=fid2)
 
@@ -192,3 +274,26 @@ class TestUpdateCounters(UpdateCountersTestCase):
         assert_equal(count, (1, 2))
         count = analytics.get_basic_counters('download:{0}:{1}'.format(self.node._id, fid2), db=None)
         assert_equal(count, (1, 1))
+
+
+class TestHyperLogLog:
+
+    def test_small_counts_are_exact(self):
+        sketch = HyperLogLog()
+        for value in ['a', 'b', 'c', 'a', u'\u00e9']:
+            sketch.add(value)
+        assert sketch.count() == 4
+
+    def test_estimate_is_close(self):
+        sketch = HyperLogLog()
+        for value in range(20000):
+            sketch.add(value)
+        assert abs(sketch.count() - 20000) < 20000 * 0.1
+
+    def test_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for value in range(100):
+            first.add(value)
+        for value in range(50, 150):
+            second.add(value)
+        assert abs(first.merge(second.registers).count() - 150) < 10
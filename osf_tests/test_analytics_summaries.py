@@ -0,0 +1,96 @@
+import datetime
+
+import mock
+import pytest
+from django.db.models import Q
+from django.utils import timezone
+
+from osf.models import AbstractNode, NodeRelation
+from osf_tests.factories import ProjectFactory, RegistrationFactory
+from scripts.analytics.base import count_buckets
+from scripts.analytics.node_summary import NodeSummary
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def snapshot_dir(tmpdir):
+    with mock.patch('scripts.analytics.base.settings.ANALYTICS_SNAPSHOT_DIR', str(tmpdir)):
+        yield tmpdir
+
+
+def summarize(date):
+    return NodeSummary().get_events(date)[0]
+
+
+class TestNodeSummary:
+
+    @pytest.fixture()
+    def nodes(self):
+        public_project = ProjectFactory(is_public=True)
+        private_project = ProjectFactory(is_public=False)
+        component = ProjectFactory(parent=private_project, is_public=False)
+        registration = RegistrationFactory(project=public_project, is_public=True)
+        ProjectFactory(is_deleted=True)
+        return public_project, private_project, component, registration
+
+    def test_counts(self, nodes, snapshot_dir):
+        results = summarize(timezone.now().date())
+        # Every creator also has a private bookmark collection
+        live_nodes = AbstractNode.objects.filter(is_deleted=False)
+        assert results['nodes'] == {
+            'total': live_nodes.count(),
+            'public': 2,
+            'private': live_nodes.filter(is_public=False).count(),
+        }
+        assert results['projects'] == {'total': 2, 'public': 1, 'private': 1}
+        assert results['registered_nodes'] == {'total': 1, 'public': 1, 'embargoed': 0, 'withdrawn': 0}
+        assert results['registered_projects'] == {'total': 1, 'public': 1, 'embargoed': 0, 'withdrawn': 0}
+
+    def test_nodes_created_after_date_are_not_counted(self, nodes, snapshot_dir):
+        yesterday = timezone.now().date() - datetime.timedelta(1)
+        assert summarize(yesterday)['nodes']['total'] == 0
+
+    def test_count_buckets(self, nodes):
+        counts = count_buckets(AbstractNode.objects.filter(is_deleted=False), {
+            'public': Q(is_public=True),
+            'deleted': Q(is_deleted=True),
+        })
+        assert counts == {'public': 2, 'deleted': 0}
+
+    def test_incremental_snapshots_recount_modified_days(self, nodes, snapshot_dir):
+        public_project, private_project, component, registration = nodes
+        today = timezone.now().date()
+        with mock.patch('scripts.analytics.node_summary.settings.ANALYTICS_INCREMENTAL_SNAPSHOTS', True):
+            assert summarize(today)['nodes']['public'] == 2
+            assert snapshot_dir.join('node_summary_snapshots.json').check()
+
+            private_project.is_public = True
+            private_project.save()
+            ProjectFactory(is_public=True)
+            results = summarize(today)
+        live_nodes = AbstractNode.objects.filter(is_deleted=False)
+        assert results['nodes']['total'] == live_nodes.count()
+        assert results['nodes']['public'] == 4
+        assert results['projects'] == {'total': 3, 'public': 3, 'private': 0}
+
+    def test_incremental_snapshots_recount_new_components(self, nodes, snapshot_dir):
+        public_project, private_project, component, registration = nodes
+        today = timezone.now().date()
+        with mock.patch('scripts.analytics.node_summary.settings.ANALYTICS_INCREMENTAL_SNAPSHOTS', True):
+            assert summarize(today)['projects']['total'] == 2
+            # Adding the relation alone does not touch the child's date_modified
+            NodeRelation.objects.create(parent=private_project, child=public_project)
+            results = summarize(today)
+        assert results['projects'] == {'total': 1, 'public': 0, 'private': 1}
+
+    def test_stale_snapshots_are_rebuilt(self, nodes, snapshot_dir):
+        public_project, private_project, component, registration = nodes
+        today = timezone.now().date()
+        with mock.patch('scripts.analytics.node_summary.settings.ANALYTICS_INCREMENTAL_SNAPSHOTS', True):
+            assert summarize(today)['nodes']['public'] == 2
+            # Changed without updating date_modified, so only a rebuild sees it
+            AbstractNode.objects.filter(pk=private_project.pk).update(is_public=True)
+            assert summarize(today)['nodes']['public'] == 2
+            with mock.patch('scripts.analytics.base.settings.ANALYTICS_SNAPSHOT_MAX_AGE', -1):
+                assert summarize(today)['nodes']['public'] == 3
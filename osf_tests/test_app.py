@@ -6,6 +6,7 @@ import framework
 from flask import Flask
 from nose.tools import *  # noqa (PEP8 asserts)
 from website import settings
+from osf.utils import permission_cache
 from website.app import attach_handlers
 
 
@@ -22,6 +23,7 @@ def test_attach_handlers():
         framework.celery_tasks.handlers.celery_before_request,
         framework.transactions.handlers.transaction_before_request,
         framework.postcommit_tasks.handlers.postcommit_before_request,
+        permission_cache.permission_cache_before_request,
         framework.sessions.prepare_private_key,
         framework.sessions.before_request,
     }
@@ -31,6 +33,7 @@ def test_attach_handlers():
         framework.postcommit_tasks.handlers.postcommit_after_request,
         framework.celery_tasks.handlers.celery_after_request,
         framework.transactions.handlers.transaction_after_request,
+        permission_cache.permission_cache_after_request,
         framework.sessions.after_request,
     }
 
@@ -38,6 +41,7 @@ def test_attach_handlers():
         framework.django.handlers.close_old_django_db_connections,
         framework.celery_tasks.handlers.celery_teardown_request,
         framework.transactions.handlers.transaction_teardown_request,
+        permission_cache.permission_cache_teardown_request,
     }
 
     # Check that necessary handlers are attached and correctly ordered
@@ -6,6 +6,7 @@ import json
 import logging
 import random
 import re
+import time
 from contextlib import nested
 
 import celery
@@ -21,6 +22,7 @@ from nose.tools import *  # flake8: noqa
 from scripts.stuck_registration_audit import find_failed_registrations
 
 from framework.auth import Auth
+from framework.exceptions import HTTPError
 from framework.celery_tasks import handlers
 
 from website.archiver import (
@@ -44,7 +46,9 @@ from website import settings
 from website.util import waterbutler_url_for
 from website.util.sanitize import strip_html
 from osf.models import MetaSchema
+from addons.base.crawler import FileTreeCrawler, TokenBucket, fetch_metadata
 from addons.base.models import BaseStorageAddon
+from addons.osfstorage import settings as osfstorage_settings
 
 from osf_tests import factories
 from tests.factories import MockOAuthAddonNodeSettings
@@ -103,6 +107,22 @@ def file_tree_factory(depth, num_files, num_folders):
         ] if depth > 0 else []
     }
 
+def create_osfstorage_files(node, file_tree):
+    """Store the files of ``file_tree`` (as made by file_tree_factory) in ``node``'s OSF Storage."""
+    stack = [(node.get_or_add_addon('osfstorage', auth=Auth(node.creator), log=False).get_root(), file_tree)]
+    while len(stack):
+        folder, tree = stack.pop(0)
+        for child in tree['children']:
+            if child['kind'] == 'file':
+                sha256 = child['extra']['hashes']['sha256']
+                folder.append_file(child['name']).create_version(node.creator, {
+                    'object': sha256[:6],
+                    'service': 'cloud',
+                    osfstorage_settings.WATERBUTLER_RESOURCE: 'osf',
+                }, {'size': child['size'], 'sha256': sha256})
+            else:
+                stack.append((folder.append_folder(os.path.basename(child['path'])), child))
+
 def select_files_from_tree(file_tree):
     """
     Select a file from every depth of a file_tree. This implementation relies on:
@@ -409,6 +429,70 @@ class TestStorageAddonBase(ArchiverTestCase):
         for addon in [a for a in settings.ADDONS_ARCHIVABLE if a not in ['wiki', 'forward']]:
             self._test_addon(addon)
 
+class TestFileTreeCrawler(OsfTestCase):
+
+    LISTINGS = {
+        '/': copy.deepcopy(FILE_TREE['children']),
+        '/qwerty': copy.deepcopy(FILE_TREE['children'][1]['children']),
+    }
+
+    def _fetch_metadata(self, provider, url):
+        return copy.deepcopy(self.LISTINGS[url])
+
+    def test_crawl(self):
+        with mock.patch('addons.base.crawler.fetch_metadata', side_effect=self._fetch_metadata):
+            crawler = FileTreeCrawler('dropbox', lambda folder: folder['path'])
+            file_tree = crawler.crawl({'path': '/', 'name': '', 'kind': 'folder'})
+        assert_equal(file_tree, FILE_TREE)
+        assert_equal(crawler.size, 128 + 256)
+
+    def test_crawl_stops_after_max_size(self):
+        with mock.patch('addons.base.crawler.fetch_metadata', side_effect=self._fetch_metadata) as mock_fetch:
+            crawler = FileTreeCrawler('dropbox', lambda folder: folder['path'], max_size=100)
+            file_tree = crawler.crawl({'path': '/', 'name': '', 'kind': 'folder'})
+        assert_equal(mock_fetch.call_count, 1)
+        assert_not_in('children', file_tree['children'][1])
+        assert_greater(archiver_utils.aggregate_file_tree_metadata('dropbox', file_tree, None).disk_usage, 100)
+
+    def test_crawl_raises_fetch_errors(self):
+        with mock.patch('addons.base.crawler.fetch_metadata', side_effect=HTTPError(404, data={'error': 'nope'})):
+            with assert_raises(HTTPError):
+                FileTreeCrawler('dropbox', lambda folder: folder['path']).crawl({'path': '/', 'kind': 'folder'})
+
+    @mock.patch('addons.base.crawler.time.sleep')
+    @mock.patch('addons.base.crawler.session')
+    def test_fetch_metadata_retries(self, mock_session, mock_sleep):
+        mock_session.get.side_effect = [
+            mock.Mock(status_code=503, json=lambda: {}),
+            mock.Mock(status_code=200, json=lambda: {'data': FILE_TREE['children']}),
+        ]
+        assert_equal(fetch_metadata('dropbox', 'http://wb/metadata'), FILE_TREE['children'])
+        assert_equal(mock_session.get.call_count, 2)
+        mock_sleep.assert_called_with(settings.ARCHIVE_CRAWL_RETRY_BACKOFF)
+
+    @mock.patch('addons.base.crawler.time.sleep')
+    @mock.patch('addons.base.crawler.session')
+    def test_fetch_metadata_does_not_retry_client_errors(self, mock_session, mock_sleep):
+        mock_session.get.return_value = mock.Mock(status_code=403, json=lambda: {'message': 'Forbidden'})
+        with assert_raises(HTTPError) as e:
+            fetch_metadata('dropbox', 'http://wb/metadata')
+        assert_equal(e.exception.code, 403)
+        assert_equal(mock_session.get.call_count, 1)
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        with mock.patch('addons.base.crawler.time.sleep') as mock_sleep:
+            bucket.acquire()
+            bucket.acquire()
+            assert_false(mock_sleep.called)
+            bucket.tokens = 0.5
+            bucket.updated = time.time()
+            with mock.patch('addons.base.crawler.time.time', side_effect=[bucket.updated, bucket.updated + 0.05]):
+                bucket.acquire()
+        assert_equal(mock_sleep.call_count, 1)
+        assert_almost_equal(mock_sleep.call_args[0][0], 0.05, places=3)
+
+
 class TestArchiverTasks(ArchiverTestCase):
 
     @mock.patch('framework.celery_tasks.handlers.enqueue_task')
@@ -536,24 +620,24 @@ class TestArchiverTasks(ArchiverTestCase):
         )
         schema = generate_schema_from_data(data)
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_trees[node._id])):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
-                registration.reload()
-                for key, question in registration.registered_meta[schema._id].items():
-                    target = None
-                    if isinstance(question.get('value'), dict):
-                        target = [v for v in question['value'].values() if 'extra' in v and 'sha256' in v['extra'][0]][0]
-                    elif 'extra' in question and 'hashes' in question['extra'][0]:
-                        target = question
-                    if target:
-                        assert_in(registration._id, target['extra'][0]['viewUrl'])
-                        assert_not_in(node._id, target['extra'][0]['viewUrl'])
-                        del selected_files[target['extra'][0]['sha256']]
-                    else:
-                        # check non-file questions are unmodified
-                        assert_equal(data[key]['value'], question['value'])
-                assert_false(selected_files)
+            create_osfstorage_files(registration, file_trees[node._id])
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
+            registration.reload()
+            for key, question in registration.registered_meta[schema._id].items():
+                target = None
+                if isinstance(question.get('value'), dict):
+                    target = [v for v in question['value'].values() if 'extra' in v and 'sha256' in v['extra'][0]][0]
+                elif 'extra' in question and 'hashes' in question['extra'][0]:
+                    target = question
+                if target:
+                    assert_in(registration._id, target['extra'][0]['viewUrl'])
+                    assert_not_in(node._id, target['extra'][0]['viewUrl'])
+                    del selected_files[target['extra'][0]['sha256']]
+                else:
+                    # check non-file questions are unmodified
+                    assert_equal(data[key]['value'], question['value'])
+            assert_false(selected_files)
 
     def test_archive_success_escaped_file_names(self):
         file_tree = file_tree_factory(0, 0, 0)
@@ -580,12 +664,12 @@ class TestArchiverTasks(ArchiverTestCase):
         draft = factories.DraftRegistrationFactory(branched_from=node, registration_schema=schema, registered_metadata=data)
 
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
-                registration.reload()
-                for key, question in registration.registered_meta[schema._id].items():
-                    assert_equal(question['extra'][0]['selectedFileName'], fake_file_name)
+            create_osfstorage_files(registration, file_tree)
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
+            registration.reload()
+            for key, question in registration.registered_meta[schema._id].items():
+                assert_equal(question['extra'][0]['selectedFileName'], fake_file_name)
 
     def test_archive_success_with_deeply_nested_schema(self):
         node = factories.NodeFactory(creator=self.user)
@@ -604,24 +688,24 @@ class TestArchiverTasks(ArchiverTestCase):
         }
         schema = generate_schema_from_data(data)
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_trees[node._id])):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
-                registration.reload()
-                for key, question in registration.registered_meta[schema._id].items():
-                    target = None
-                    if isinstance(question['value'], dict):
-                        target = [v for v in question['value'].values() if 'extra' in v and 'sha256' in v['extra'][0]][0]
-                    elif 'extra' in question and 'sha256' in question['extra'][0]:
-                        target = question
-                    if target:
-                        assert_in(registration._id, target['extra'][0]['viewUrl'])
-                        assert_not_in(node._id, target['extra'][0]['viewUrl'])
-                        del selected_files[target['extra'][0]['sha256']]
-                    else:
-                        # check non-file questions are unmodified
-                        assert_equal(data[key]['value'], question['value'])
-                assert_false(selected_files)
+            create_osfstorage_files(registration, file_trees[node._id])
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
+            registration.reload()
+            for key, question in registration.registered_meta[schema._id].items():
+                target = None
+                if isinstance(question['value'], dict):
+                    target = [v for v in question['value'].values() if 'extra' in v and 'sha256' in v['extra'][0]][0]
+                elif 'extra' in question and 'sha256' in question['extra'][0]:
+                    target = question
+                if target:
+                    assert_in(registration._id, target['extra'][0]['viewUrl'])
+                    assert_not_in(node._id, target['extra'][0]['viewUrl'])
+                    del selected_files[target['extra'][0]['sha256']]
+                else:
+                    # check non-file questions are unmodified
+                    assert_equal(data[key]['value'], question['value'])
+            assert_false(selected_files)
 
     def test_archive_success_with_components(self):
         node = factories.NodeFactory(creator=self.user)
@@ -638,11 +722,10 @@ class TestArchiverTasks(ArchiverTestCase):
         schema = generate_schema_from_data(data)
 
         with test_utils.mock_archive(node, schema=schema, data=copy.deepcopy(data), autocomplete=True, autoapprove=True) as registration:
-            def mock_get_file_tree(self, *args, **kwargs):
-                return file_trees[self.owner.registered_from._id]
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock_get_file_tree):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
+            for registered_node in registration.node_and_primary_descendants():
+                create_osfstorage_files(registered_node, file_trees[registered_node.registered_from._id])
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
 
             registration.reload()
 
@@ -694,11 +777,11 @@ class TestArchiverTasks(ArchiverTestCase):
         schema = generate_schema_from_data(data)
 
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
-                for key, question in registration.registered_meta[schema._id].items():
-                    assert_equal(question['extra'][0]['selectedFileName'], fake_file['name'])
+            create_osfstorage_files(registration, file_tree)
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
+            for key, question in registration.registered_meta[schema._id].items():
+                assert_equal(question['extra'][0]['selectedFileName'], fake_file['name'])
 
     def test_archive_failure_different_name_same_sha(self):
         file_tree = file_tree_factory(0, 0, 0)
@@ -725,12 +808,12 @@ class TestArchiverTasks(ArchiverTestCase):
         draft = factories.DraftRegistrationFactory(branched_from=node, registration_schema=schema, registered_metadata=data)
 
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                draft.registered_node = registration
-                draft.save()
-                with assert_raises(ArchivedFileNotFound):
-                    archive_success(registration._id, job._id)
+            create_osfstorage_files(registration, file_tree)
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            draft.registered_node = registration
+            draft.save()
+            with assert_raises(ArchivedFileNotFound):
+                archive_success(registration._id, job._id)
 
     def test_archive_success_same_file_in_component(self):
         file_tree = file_tree_factory(3, 3, 3)
@@ -759,13 +842,14 @@ class TestArchiverTasks(ArchiverTestCase):
         schema = generate_schema_from_data(data)
 
         with test_utils.mock_archive(node, schema=schema, data=data, autocomplete=True, autoapprove=True) as registration:
-            with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-                job = factories.ArchiveJobFactory(initiator=registration.creator)
-                archive_success(registration._id, job._id)
-                registration.reload()
-                child_reg = registration.nodes[0]
-                for key, question in registration.registered_meta[schema._id].items():
-                    assert_in(child_reg._id, question['extra'][0]['viewUrl'])
+            child_reg = registration.nodes[0]
+            create_osfstorage_files(registration, file_tree)
+            create_osfstorage_files(child_reg, child_file_tree)
+            job = factories.ArchiveJobFactory(initiator=registration.creator)
+            archive_success(registration._id, job._id)
+            registration.reload()
+            for key, question in registration.registered_meta[schema._id].items():
+                assert_in(child_reg._id, question['extra'][0]['viewUrl'])
 
 
 class TestArchiverUtils(ArchiverTestCase):
@@ -867,65 +951,59 @@ class TestArchiverUtils(ArchiverTestCase):
         archiver_utils.link_archive_provider(wo, self.user)
         assert_true(archiver_utils.has_archive_provider(wo, self.user))
 
-    def test_get_file_map(self):
-        node = factories.NodeFactory(creator=self.user)
-        file_tree = file_tree_factory(3, 3, 3)
-        with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-            file_map = archiver_utils.get_file_map(node)
-        stack = [file_tree]
+    def _assert_file_map_matches(self, file_map, file_tree):
         file_map = {
             sha256: value
             for sha256, value, _ in file_map
         }
+        stack = [file_tree]
         while len(stack):
             item = stack.pop(0)
             if item['kind'] == 'file':
                 sha256 = item['extra']['hashes']['sha256']
                 assert_in(sha256, file_map)
                 map_file = file_map[sha256]
-                assert_equal(item, map_file)
+                assert_equal(item['name'], map_file['name'])
+                assert_equal(item['extra'], map_file['extra'])
             else:
                 stack = stack + item['children']
 
-    def test_get_file_map_with_components(self):
-        node = factories.NodeFactory()
-        comp1 = factories.NodeFactory(parent=node)
-        factories.NodeFactory(parent=comp1)
-        factories.NodeFactory(parent=node)
-
+    def test_get_file_map(self):
+        node = factories.NodeFactory(creator=self.user)
         file_tree = file_tree_factory(3, 3, 3)
-        with mock.patch.object(BaseStorageAddon, '_get_file_tree', mock.Mock(return_value=file_tree)):
-            file_map = archiver_utils.get_file_map(node)
-            stack = [file_tree]
-            file_map = {
-                sha256: value
-                for sha256, value, _ in file_map
-            }
-            while len(stack):
-                item = stack.pop(0)
-                if item['kind'] == 'file':
-                    sha256 = item['extra']['hashes']['sha256']
-                    assert_in(sha256, file_map)
-                    map_file = file_map[sha256]
-                    assert_equal(item, map_file)
-                else:
-                    stack = stack + item['children']
+        create_osfstorage_files(node, file_tree)
+        file_map = list(archiver_utils.get_file_map(node))
+        assert_equal({node_id for _, _, node_id in file_map}, {node._id})
+        self._assert_file_map_matches(file_map, file_tree)
 
-    def test_get_file_map_memoization(self):
+    def test_get_file_map_with_components(self):
         node = factories.NodeFactory()
         comp1 = factories.NodeFactory(parent=node)
-        factories.NodeFactory(parent=comp1)
+        comp2 = factories.NodeFactory(parent=comp1)
         factories.NodeFactory(parent=node)
 
-        with mock.patch.object(BaseStorageAddon, '_get_file_tree') as mock_get_file_tree:
-            mock_get_file_tree.return_value = file_tree_factory(3, 3, 3)
-
-            # first call
-            archiver_utils.get_file_map(node)
-            call_count = mock_get_file_tree.call_count
-            # second call
-            archiver_utils.get_file_map(node)
-            assert_equal(mock_get_file_tree.call_count, call_count)
+        file_tree = file_tree_factory(3, 3, 3)
+        comp_file_tree = file_tree_factory(2, 2, 2)
+        create_osfstorage_files(node, file_tree)
+        create_osfstorage_files(comp2, comp_file_tree)
+        file_map = list(archiver_utils.get_file_map(node))
+        assert_equal({node_id for _, _, node_id in file_map}, {node._id, comp2._id})
+        self._assert_file_map_matches(file_map, file_tree)
+        self._assert_file_map_matches(file_map, comp_file_tree)
+
+    def test_get_file_map_uses_latest_version(self):
+        node = factories.NodeFactory(creator=self.user)
+        file_tree = file_tree_factory(0, 0, 0)
+        old_file = file_factory()
+        file_tree['children'] = [old_file]
+        create_osfstorage_files(node, file_tree)
+        new_sha256 = sha256_factory()
+        node.get_addon('osfstorage').get_root().find_child_by_name(old_file['name']).create_version(self.user, {
+            'object': new_sha256[:6],
+            'service': 'cloud',
+            osfstorage_settings.WATERBUTLER_RESOURCE: 'osf',
+        }, {'sha256': new_sha256})
+        assert_equal([sha256 for sha256, _, _ in archiver_utils.get_file_map(node)], [new_sha256])
 
 
 class TestArchiverListeners(ArchiverTestCase):
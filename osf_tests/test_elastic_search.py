@@ -5,9 +5,12 @@ import time
 import unittest
 import logging
 import functools
+import os
+import tempfile
 
 from nose.tools import *  # flake8: noqa (PEP8 asserts)
 import mock
+from django.utils import timezone
 from modularodm import Q
 
 from framework.auth.core import Auth
@@ -16,7 +19,7 @@ from website import settings
 import website.search.search as search
 from website.search import elastic_search
 from website.search.util import build_query
-from website.search_migration.migrate import migrate
+from website.search_migration.migrate import catch_up, load_reindex_state, migrate, reindex
 from osf.models import Retraction, NodeLicense, Tag
 from addons.osfstorage.models import OsfStorageFile
 
@@ -872,6 +875,112 @@ class TestSearchMigration(OsfTestCase):
 
         assert_equal(institution_bucket_found, True)
 
+class InProcessPool(object):
+    """Stands in for multiprocessing.Pool, returning results out of order like imap_unordered."""
+    processes = None
+
+    def __init__(self, processes, initializer=None):
+        InProcessPool.processes = processes
+        if initializer:
+            initializer()
+
+    def imap_unordered(self, func, iterable):
+        return reversed([func(args) for args in iterable])
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class TestParallelReindex(OsfTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super(TestParallelReindex, cls).tearDownClass()
+        search.create_index(settings.ELASTIC_INDEX)
+
+    def setUp(self):
+        super(TestParallelReindex, self).setUp()
+        self.es = search.search_engine.CLIENT
+        search.delete_index(settings.ELASTIC_INDEX)
+        search.create_index(settings.ELASTIC_INDEX)
+        self.state_path = os.path.join(tempfile.mkdtemp(), 'reindex.json')
+        self.user = factories.UserFactory(fullname='Wilson Pickett')
+        self.project = factories.ProjectFactory(title='Midnight Hour', creator=self.user, is_public=True)
+        self.project.get_addon('osfstorage').get_root().append_file('Mustang Sally.mp3')
+
+    def reindex(self, **kwargs):
+        kwargs.setdefault('workers', 0)
+        kwargs.setdefault('convert', True)
+        return reindex(
+            alias=settings.ELASTIC_INDEX, partition_size=1,
+            state_path=self.state_path, app=self.app.app, **kwargs
+        )
+
+    def test_reindex_refuses_to_replace_index_without_convert(self):
+        with assert_raises(RuntimeError):
+            self.reindex(convert=False)
+        assert_false(os.path.exists(self.state_path))
+        assert_true(self.es.indices.exists(index=settings.ELASTIC_INDEX))
+        assert_false(self.es.indices.exists_alias(name=settings.ELASTIC_INDEX))
+
+    def test_reindex_with_workers(self):
+        # Forked workers would not see this test's uncommitted rows, so the pool runs in process
+        with mock.patch('website.search_migration.migrate.multiprocessing.Pool', InProcessPool), \
+                mock.patch('website.search_migration.migrate.connections') as connections:
+            index = self.reindex(workers=2)
+        assert_true(connections.close_all.called)
+        assert_equal(InProcessPool.processes, 2)
+        assert_equal(self.es.indices.get_aliases()[index]['aliases'].keys(), [settings.ELASTIC_INDEX])
+        assert_equal(len(query(self.project.title)['results']), 1)
+        assert_equal(len(query_user(self.user.fullname)['results']), 1)
+        assert_equal(len(query_file('Mustang Sally.mp3')['results']), 1)
+
+    def test_reindex_swaps_alias(self):
+        index = self.reindex()
+        assert_equal(index, settings.ELASTIC_INDEX + '_v1')
+        assert_equal(self.es.indices.get_aliases()[index]['aliases'].keys(), [settings.ELASTIC_INDEX])
+        assert_equal(len(query(self.project.title)['results']), 1)
+        assert_equal(len(query_user(self.user.fullname)['results']), 1)
+        assert_equal(len(query_file('Mustang Sally.mp3')['results']), 1)
+        assert_false(os.path.exists(self.state_path))
+
+        assert_equal(self.reindex(delete=True), settings.ELASTIC_INDEX + '_v2')
+        assert_false(self.es.indices.exists(index=index))
+
+    def test_resume_failed_partition(self):
+        with mock.patch.dict('website.search_migration.migrate.INDEXERS', {'user': mock.Mock(side_effect=ValueError)}):
+            with assert_raises(RuntimeError):
+                self.reindex()
+        state = load_reindex_state(self.state_path)
+        statuses = {key.split(':')[0]: status for key, status in state['partitions'].items() if status == 'failed'}
+        assert_equal(statuses, {'user': 'failed'})
+        assert_false(self.es.indices.exists_alias(name=settings.ELASTIC_INDEX))
+
+        assert_equal(self.reindex(resume=True), state['index'])
+        assert_equal(self.es.indices.get_aliases()[state['index']]['aliases'].keys(), [settings.ELASTIC_INDEX])
+        assert_equal(len(query_user(self.user.fullname)['results']), 1)
+
+    def test_catch_up_indexes_rows_modified_during_build(self):
+        since = timezone.now()
+        with mock.patch('website.search.search.update_node'):
+            project = factories.ProjectFactory(title='Land of 1000 Dances', is_public=True)
+        assert_equal(len(query(project.title)['results']), 0)
+        catch_up(settings.ELASTIC_INDEX, since, {})
+        assert_equal(len(query(project.title)['results']), 1)
+
+    def test_catch_up_removes_files_trashed_during_build(self):
+        since = timezone.now()
+        file_ = self.project.get_addon('osfstorage').get_root().children[0]
+        with mock.patch('website.search.search.update_file'):
+            file_.delete()
+        assert_equal(len(query_file('Mustang Sally.mp3')['results']), 1)
+        catch_up(settings.ELASTIC_INDEX, since, {})
+        assert_equal(len(query_file('Mustang Sally.mp3')['results']), 0)
+
+
 class TestSearchFiles(OsfTestCase):
 
     def setUp(self):
@@ -972,3 +1081,38 @@ class TestSearchFiles(OsfTestCase):
         assert_equal(file_.path, path)
         assert_equal(find[0]['guid_url'], None)
         assert_equal(find[0]['deep_url'], deep_url)
+
+
+class TestBulkIndexing(OsfTestCase):
+
+    def setUp(self):
+        super(TestBulkIndexing, self).setUp()
+        self.node = factories.ProjectFactory(is_public=True, title='Green Onions')
+        self.root = self.node.get_addon('osfstorage').get_root()
+        for name in ('Behave Yourself.wav', 'Mo Onions.wav', 'Chinese Checkers.wav'):
+            self.root.append_file(name)
+
+    def test_update_node_sends_one_bulk_request(self):
+        with mock.patch.object(elastic_search.helpers, 'bulk', wraps=elastic_search.helpers.bulk) as mock_bulk:
+            elastic_search.update_node(self.node)
+        assert_equal(mock_bulk.call_count, 1)
+        actions = mock_bulk.call_args[0][1]
+        assert_equal(sorted(action['_type'] for action in actions), ['file', 'file', 'file', 'project'])
+        assert_equal(len(query_file('Onions')['results']), 1)
+
+    def test_update_node_skips_files_unless_file_fields_changed(self):
+        with mock.patch.object(elastic_search, 'update_node_files') as mock_update_files:
+            elastic_search.update_node(self.node, saved_fields=['description'])
+            assert_false(mock_update_files.called)
+            elastic_search.update_node(self.node, saved_fields=['title'])
+            assert_true(mock_update_files.called)
+
+    def test_bulk_indexer_collects_updates(self):
+        self.node.is_public = False
+        self.node.save()
+        with elastic_search.bulk_indexer() as indexer:
+            elastic_search.update_node(self.node)
+            assert_equal(len(indexer.actions), 4)
+        assert_equal(indexer.actions, [])
+        assert_equal(indexer.errors, 0)
+        assert_equal(len(query_file('Onions')['results']), 0)
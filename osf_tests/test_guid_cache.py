@@ -0,0 +1,118 @@
+import mock
+import pytest
+from django.contrib.contenttypes.models import ContentType
+
+from addons.wiki.tests.factories import NodeWikiFactory
+from osf.models import Guid, PreprintService
+from osf.utils import guid_cache
+from osf_tests.factories import ProjectFactory, UserFactory
+from website.views import resolve_guid
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def empty_guid_cache():
+    guid_cache.local_cache.clear()
+    yield
+    guid_cache.local_cache.clear()
+
+
+def cache_guid(referent):
+    guid = referent.guids.first()
+    guid_cache.set_deep_url(guid, referent.deep_url)
+    return guid
+
+
+class TestGuidCache:
+
+    def test_entries_round_trip(self):
+        project = ProjectFactory()
+        guid = cache_guid(project)
+        entry = guid_cache.get_entry(guid._id.upper())
+        assert entry.deep_url == project.deep_url
+        loaded = entry.to_guid(guid._id)
+        assert (loaded.pk, loaded._id, loaded.content_type_id, loaded.object_id, loaded.created) == \
+            (guid.pk, guid._id, guid.content_type_id, guid.object_id, guid.created)
+        assert loaded.referent == project
+
+    @pytest.mark.django_assert_num_queries
+    def test_load_reads_through_cache(self, django_assert_num_queries):
+        project = ProjectFactory()
+        guid = cache_guid(project)
+        with django_assert_num_queries(0):
+            assert Guid.load(guid._id).object_id == project.pk
+
+    def test_load_caches_committed_guids(self):
+        project = ProjectFactory()
+        with mock.patch('osf.models.base.transaction.on_commit') as on_commit:
+            Guid.load(project._id)
+        assert guid_cache.get_entry(project._id) is None
+        on_commit.call_args[0][0]()
+        assert guid_cache.get_entry(project._id).object_id == project.pk
+
+    def test_saving_or_deleting_guid_invalidates(self):
+        project = ProjectFactory()
+        guid = cache_guid(project)
+        guid.save()
+        assert guid_cache.get_entry(guid._id) is None
+
+        cache_guid(project)
+        guid.delete()
+        assert guid_cache.get_entry(guid._id) is None
+
+    def test_moving_file_to_another_node_invalidates(self):
+        project, other = ProjectFactory(), ProjectFactory()
+        file_node = project.get_addon('osfstorage').get_root().append_file('file')
+        guid = file_node.get_guid(create=True)
+        guid_cache.set_deep_url(guid, file_node.deep_url)
+        file_node.move_under(other.get_addon('osfstorage').get_root())
+        assert guid_cache.get_entry(guid._id) is None
+
+    def test_moving_folder_to_another_node_invalidates_descendants(self, app):
+        project, other = ProjectFactory(), ProjectFactory()
+        folder = project.get_addon('osfstorage').get_root().append_folder('folder')
+        file_node = folder.append_folder('subfolder').append_file('file')
+        guid = file_node.get_guid(create=True)
+        guid_cache.set_deep_url(guid, file_node.deep_url)
+        folder.move_under(other.get_addon('osfstorage').get_root())
+        assert guid_cache.get_entry(guid._id) is None
+
+        file_node.refresh_from_db()
+        assert file_node.node == other
+        with app.test_request_context(), mock.patch('website.views.proxy_url') as proxy_url:
+            resolve_guid(guid._id)
+        assert other._id in proxy_url.call_args[0][0]
+
+    def test_renaming_wiki_page_invalidates(self):
+        wiki = NodeWikiFactory()
+        guid = cache_guid(wiki)
+        wiki.rename('new name')
+        assert guid_cache.get_entry(guid._id) is None
+
+    def test_merging_user_invalidates(self):
+        user = UserFactory()
+        merged = UserFactory()
+        guid = cache_guid(merged)
+        user.merge_user(merged)
+        assert guid_cache.get_entry(guid._id) is None
+
+
+class TestResolveGuid:
+
+    @pytest.mark.django_assert_num_queries
+    def test_resolves_cached_deep_url_without_queries(self, app, django_assert_num_queries):
+        project = ProjectFactory()
+        guid = cache_guid(project)
+        ContentType.objects.get_for_model(PreprintService)
+        with app.test_request_context(), mock.patch('website.views.proxy_url') as proxy_url:
+            with django_assert_num_queries(0):
+                resolve_guid(guid._id, suffix='files')
+        proxy_url.assert_called_with('/project/{}/files/'.format(project._id))
+
+    def test_caches_resolved_deep_url(self, app):
+        project = ProjectFactory()
+        with app.test_request_context(), mock.patch('website.views.proxy_url'), \
+                mock.patch('website.views.transaction.on_commit', side_effect=lambda func: func()):
+            resolve_guid(project._id)
+        assert guid_cache.get_entry(project._id).deep_url == project.deep_url
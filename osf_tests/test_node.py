@@ -18,7 +18,7 @@ from website.util import permissions, disconnected_from_listeners, api_url_for,
 from website.citations.utils import datetime_to_csl
 from website import language, settings
 from website.project.model import ensure_schemas
-from website.project.tasks import on_node_updated
+from website.project.tasks import on_node_updated, fork_node as fork_node_task
 
 from osf.models import (
     AbstractNode,
@@ -28,6 +28,7 @@ from osf.models import (
     Contributor,
     MetaSchema,
     Sanction,
+    NodeClosure,
     NodeRelation,
     Registration,
     DraftRegistration,
@@ -480,6 +481,57 @@ class TestRoot:
                 assert p.parent_node._id in parent_list
 
 
+class TestNodeClosure:
+
+    def closure(self, node):
+        return set(NodeClosure.objects.filter(descendant=node).values_list('ancestor_id', 'depth'))
+
+    def test_components_are_materialized(self, project):
+        child = NodeFactory(parent=project)
+        grandchild = NodeFactory(parent=child)
+
+        assert self.closure(child) == {(project.id, 1)}
+        assert self.closure(grandchild) == {(child.id, 1), (project.id, 2)}
+        assert self.closure(project) == set()
+
+    def test_node_links_are_not_materialized(self, project, auth):
+        other = ProjectFactory()
+        project.add_node_link(other, auth=auth, save=True)
+
+        assert self.closure(other) == set()
+
+    def test_attaching_subtree_adds_paths_for_descendants(self, project):
+        subtree_root = ProjectFactory()
+        leaf = NodeFactory(parent=subtree_root)
+
+        NodeRelation.objects.create(parent=project, child=subtree_root, is_node_link=False)
+
+        assert self.closure(leaf) == {(subtree_root.id, 1), (project.id, 2)}
+        assert leaf.get_root() == project
+
+    def test_deleting_relation_removes_paths(self, project):
+        child = NodeFactory(parent=project)
+        grandchild = NodeFactory(parent=child)
+
+        NodeRelation.objects.get(parent=project, child=child).delete()
+
+        assert self.closure(child) == set()
+        assert self.closure(grandchild) == {(child.id, 1)}
+        assert child not in Node.objects.get_children(project)
+
+    def test_rebuild_and_verify(self, project):
+        child = NodeFactory(parent=project)
+        NodeFactory(parent=child)
+        NodeClosure.objects.filter(descendant=child).delete()
+
+        missing, extra = NodeClosure.objects.verify()
+        assert missing == [(project.id, child.id, 1)]
+        assert extra == []
+
+        NodeClosure.objects.rebuild()
+        assert NodeClosure.objects.verify() == ([], [])
+
+
 class TestNodeMODMCompat:
 
     def test_basic_querying(self):
@@ -2840,6 +2892,50 @@ class TestForkNode:
         assert registration_wiki_version.node == fork
         assert registration_wiki_version._id != wiki._id
 
+    def test_fork_copies_tree_logs_tags_and_citations(self, user, auth):
+        project = ProjectFactory(creator=user)
+        component = NodeFactory(creator=user, parent=project)
+        grandchild = NodeFactory(creator=user, parent=component)
+        NodeFactory(creator=user, parent=component, is_deleted=True)
+        for node in (project, component, grandchild):
+            node.add_tag('forked', auth=auth, save=True)
+            node.add_citation(auth=auth, save=True, name='citation', text=node.title)
+
+        fork = project.fork_node(auth)
+
+        fork_component = fork.nodes[0]
+        fork_grandchild = fork_component.nodes[0]
+        assert len(fork_component.nodes) == 1
+        assert fork_grandchild.forked_from == grandchild
+        for original, forked in ((project, fork), (component, fork_component), (grandchild, fork_grandchild)):
+            assert forked.root == fork
+            assert forked.logs.count() == original.logs.count() + 1
+            assert set(forked.logs.exclude(action=NodeLog.NODE_FORKED).values_list('action', flat=True)) == set(original.logs.values_list('action', flat=True))
+            assert list(forked.tags.values_list('name', flat=True)) == list(original.tags.values_list('name', flat=True))
+            assert list(forked.alternative_citations.values_list('text', flat=True)) == [original.title]
+            assert not set(forked.alternative_citations.all()) & set(original.alternative_citations.all())
+        assert set(NodeClosure.objects.filter(ancestor=fork).values_list('descendant_id', flat=True)) == {fork_component.id, fork_grandchild.id}
+
+    def test_fork_node_task(self, user, auth):
+        project = ProjectFactory(creator=user)
+        NodeFactory(creator=user, parent=project)
+        fork_id = fork_node_task(project._id, user._id, title='')
+        fork = Node.load(fork_id)
+        assert fork.forked_from == project
+        assert fork.title == project.title
+        assert len(fork.nodes) == 1
+
+    @mock.patch('website.project.tasks.fork_node.delay')
+    def test_fork_node_async(self, mock_delay, node, user, auth):
+        assert node.fork_node_async(auth, title='Async') == mock_delay.return_value
+        mock_delay.assert_called_once_with(node._id, user._id, title='Async')
+
+    @mock.patch('website.project.tasks.fork_node.delay')
+    def test_fork_node_async_checks_permission(self, mock_delay, node):
+        with pytest.raises(PermissionsError):
+            node.fork_node_async(Auth(user=UserFactory()))
+        assert not mock_delay.called
+
 class TestAlternativeCitationMethods:
 
     def test_add_citation(self, node, auth, fake):
@@ -0,0 +1,91 @@
+import pytest
+
+from osf.models import NodeRelation
+from osf.utils import permission_cache
+from osf.utils.auth import Auth
+from osf_tests.factories import NodeFactory, ProjectFactory, UserFactory
+from website.util.permissions import ADMIN, READ, WRITE
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.yield_fixture()
+def request_cache():
+    permission_cache.permission_cache_before_request()
+    yield permission_cache.get_permission_cache()
+    permission_cache.permission_cache_teardown_request()
+
+
+@pytest.fixture()
+def user():
+    return UserFactory()
+
+
+class TestPermissionCache:
+
+    def test_no_cache_outside_of_request(self):
+        assert permission_cache.get_permission_cache() is None
+
+    def test_after_request_clears_cache(self, request_cache):
+        response = object()
+        assert permission_cache.permission_cache_after_request(response) is response
+        assert permission_cache.get_permission_cache() is None
+
+    @pytest.mark.django_assert_num_queries
+    def test_repeated_checks_are_cached(self, request_cache, user, django_assert_num_queries):
+        project = ProjectFactory(creator=user)
+        project.has_permission(user, ADMIN)
+
+        with django_assert_num_queries(0):
+            assert project.has_permission(user, ADMIN)
+            assert project.has_permission(user, WRITE)
+            assert project.is_contributor(user)
+            assert project.can_view(Auth(user))
+            assert project.get_permissions(user) == [READ, WRITE, ADMIN]
+
+    @pytest.mark.django_assert_num_queries
+    def test_prime_loads_a_page_of_nodes(self, request_cache, user, django_assert_num_queries):
+        projects = [ProjectFactory(creator=user) for _ in range(3)]
+        other = ProjectFactory()
+        nodes = projects + [other]
+
+        permission_cache.prime_permissions(user, nodes)
+        with django_assert_num_queries(0):
+            assert all(project.has_permission(user, ADMIN) for project in projects)
+            assert not other.has_permission(user, READ)
+
+    @pytest.mark.django_assert_num_queries
+    def test_inherited_admin_read(self, request_cache, user, django_assert_num_queries):
+        project = ProjectFactory(creator=user)
+        child = NodeFactory(parent=project, creator=UserFactory())
+        grandchild = NodeFactory(parent=child, creator=UserFactory())
+
+        permission_cache.prime_permissions(user, [child, grandchild])
+        with django_assert_num_queries(0):
+            assert grandchild.has_permission(user, READ)
+            assert not grandchild.has_permission(user, READ, check_parent=False)
+            assert not grandchild.has_permission(user, WRITE)
+
+    def test_contributor_changes_invalidate(self, request_cache, user):
+        project = ProjectFactory()
+        assert not project.has_permission(user, READ)
+
+        project.add_contributor(user, permissions=[READ, WRITE], auth=Auth(project.creator), save=True)
+        assert project.has_permission(user, WRITE)
+
+        project.set_permissions(user, [READ], save=True)
+        assert not project.has_permission(user, WRITE)
+
+        project.remove_contributor(user, auth=Auth(project.creator))
+        assert not project.has_permission(user, READ)
+
+    def test_relation_changes_invalidate(self, request_cache, user):
+        project = ProjectFactory(creator=user)
+        orphan = ProjectFactory()
+        assert not orphan.has_permission(user, READ)
+
+        NodeRelation.objects.create(parent=project, child=orphan, is_node_link=False)
+        assert orphan.has_permission(user, READ)
+
+        NodeRelation.objects.get(parent=project, child=orphan).delete()
+        assert not orphan.has_permission(user, READ)
@@ -0,0 +1,89 @@
+import functools
+import threading
+
+import mock
+import pytest
+
+from framework.postcommit_tasks import handlers
+from framework.postcommit_tasks.executor import PostcommitExecutor
+
+
+def add_to(results, value):
+    results.append(value)
+
+
+class TestPostcommitExecutor:
+
+    def test_submitted_tasks_run_on_worker_threads(self):
+        executor = PostcommitExecutor(workers=2, queue_size=10)
+        results = []
+        for value in range(5):
+            assert executor.submit(functools.partial(add_to, results, value))
+        executor.join()
+        assert sorted(results) == range(5)
+
+        stats = executor.stats()
+        assert stats['queue_depth'] == 0
+        assert stats['rejected'] == 0
+        task_stats = stats['tasks']['osf_tests.test_postcommit.add_to']
+        assert task_stats['count'] == 5
+        assert task_stats['failures'] == 0
+
+    def test_failures_are_counted_and_do_not_stop_workers(self):
+        executor = PostcommitExecutor(workers=1, queue_size=10)
+        results = []
+
+        def fail():
+            raise ValueError()
+
+        executor.submit(fail)
+        executor.submit(functools.partial(add_to, results, 1))
+        executor.join()
+        assert results == [1]
+        assert executor.stats()['tasks']['osf_tests.test_postcommit.fail']['failures'] == 1
+
+    def test_submit_returns_false_when_saturated(self):
+        executor = PostcommitExecutor(workers=1, queue_size=1)
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        assert executor.submit(block)
+        started.wait()
+        assert executor.submit(block)
+        assert not executor.submit(block)
+        release.set()
+        executor.join()
+        assert executor.stats()['rejected'] == 1
+        assert executor.stats()['max_queue_depth'] == 1
+
+
+class TestRunPostcommitTasks:
+
+    def test_saturated_executor_runs_tasks_in_calling_thread(self):
+        results = []
+        with mock.patch.object(handlers.postcommit_executor, 'submit', return_value=False):
+            handlers.run_postcommit_tasks([functools.partial(add_to, results, 1)])
+        assert results == [1]
+
+    def test_postcommit_task_key_dedupes_equal_calls(self):
+        handlers.postcommit_before_request()
+        handlers.enqueue_postcommit_task(add_to, ([], 1), {})
+        handlers.enqueue_postcommit_task(add_to, ([], 1), {})
+        handlers.enqueue_postcommit_task(add_to, ([], 2), {})
+        assert len(handlers.postcommit_queue()) == 2
+
+        handlers.enqueue_postcommit_task(add_to, ([], 2), {}, once_per_request=False)
+        assert len(handlers.postcommit_queue()) == 3
+
+    @pytest.mark.django_db
+    def test_tasks_wait_for_the_transaction_to_commit(self):
+        response = mock.Mock(status_code=200)
+        handlers.postcommit_before_request()
+        handlers.enqueue_postcommit_task(add_to, ([], 1), {})
+        with mock.patch.object(handlers, 'run_postcommit_tasks') as run_postcommit_tasks:
+            handlers.postcommit_after_request(response)
+        # Tests run inside a transaction that is never committed
+        assert not run_postcommit_tasks.called
@@ -1,6 +1,10 @@
+import datetime as dt
+
 import pytest
+from django.utils import timezone
 
 from framework.sessions import utils
+from framework.sessions.store import load_session, save_session
 from tests.base import DbTestCase
 from osf_tests.factories import SessionFactory, UserFactory
 from osf.models import OSFUser as User, Session
@@ -32,6 +36,54 @@ class TestSession:
         assert Session.objects.count() == 1
 
 
+@pytest.mark.django_db
+class TestSessionStore:
+
+    @pytest.fixture()
+    def session(self):
+        session = Session(data={'auth_user_id': 'abc12'})
+        session.save()
+        return session
+
+    @pytest.mark.django_assert_num_queries
+    def test_load_reads_through_cache(self, session, django_assert_num_queries):
+        assert load_session(session._id).data == session.data
+        with django_assert_num_queries(0):
+            cached = load_session(session._id)
+        assert cached.data == session.data
+        assert cached is not load_session(session._id)
+
+    def test_load_missing_session(self):
+        assert load_session('notasession') is None
+
+    def test_unchanged_session_is_not_saved(self, session):
+        loaded = load_session(session._id)
+        assert save_session(loaded) is False
+
+    def test_changed_session_is_saved(self, session):
+        loaded = load_session(session._id)
+        loaded.data.setdefault('oauth_states', {})['github'] = {'state': 'abc'}
+        assert save_session(loaded) is True
+        assert save_session(loaded) is False
+        assert load_session(session._id).data['oauth_states'] == {'github': {'state': 'abc'}}
+        assert Session.load(session._id).data['oauth_states'] == {'github': {'state': 'abc'}}
+
+    def test_stale_session_is_refreshed(self, session):
+        loaded = load_session(session._id)
+        loaded.date_modified = timezone.now() - dt.timedelta(days=1)
+        assert save_session(loaded) is True
+
+    def test_new_session_is_saved(self):
+        session = Session(data={'auth_user_id': 'abc12'})
+        assert save_session(session) is True
+        assert Session.load(session._id)
+
+    def test_removed_session_is_evicted(self, session):
+        load_session(session._id)
+        utils.remove_session(session)
+        assert load_session(session._id) is None
+
+
 class SessionUtilsTestCase(DbTestCase):
     def setUp(self, *args, **kwargs):
         super(SessionUtilsTestCase, self).setUp(*args, **kwargs)
@@ -0,0 +1,75 @@
+import mock
+import pytest
+
+from osf.models import Subject
+from osf.utils import taxonomy_index
+from osf_tests.factories import PreprintFactory, SubjectFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def cached_index():
+    taxonomy_index.invalidate()
+    with mock.patch('osf.utils.taxonomy_index.settings.TAXONOMY_INDEX_TTL', 60):
+        yield
+    taxonomy_index.invalidate()
+
+
+@pytest.fixture()
+def tree():
+    root = SubjectFactory(text='Root')
+    child = SubjectFactory(text='Child', parent=root)
+    grandchild = SubjectFactory(text='Grandchild', parent=child)
+    other = SubjectFactory(text='Other')
+    return root, child, grandchild, other
+
+
+class TestTaxonomyIndex:
+
+    def test_index(self, tree):
+        root, child, grandchild, other = tree
+        index = taxonomy_index.get_index()
+        assert index.lookup(child._id).parent_id == root.pk
+        assert [entry.pk for entry in index.children(root.pk)] == [child.pk]
+        assert [entry._id for entry in index.hierarchy(grandchild.pk)] == [root._id, child._id, grandchild._id]
+        assert index.with_descendants([root.pk, other.pk]) == {root.pk, child.pk, grandchild.pk, other.pk}
+        assert set(index.provider_subjects(root.provider_id)) >= {root.pk, child.pk, grandchild.pk, other.pk}
+        assert index.to_subject(child.pk) == child
+
+    @pytest.mark.django_assert_num_queries
+    def test_hierarchy_does_not_query_once_indexed(self, tree, django_assert_num_queries):
+        root, child, grandchild, other = tree
+        taxonomy_index.get_index()
+        grandchild = Subject.objects.get(id=grandchild.id)
+        with django_assert_num_queries(0):
+            assert grandchild.hierarchy == [root._id, child._id, grandchild._id]
+            assert grandchild.object_hierarchy == [root, child, grandchild]
+            assert root.child_count == 1
+
+    def test_saving_or_deleting_subject_rebuilds_index(self, tree):
+        root, child, grandchild, other = tree
+        index = taxonomy_index.get_index()
+        assert taxonomy_index.get_index() is index
+
+        new_child = SubjectFactory(parent=root)
+        assert root.child_count == 2
+        new_child.delete()
+        assert root.child_count == 1
+
+    def test_unindexed_parent_change_walks_parents(self, tree):
+        root, child, grandchild, other = tree
+        taxonomy_index.get_index()
+        grandchild.parent = other
+        assert grandchild.hierarchy == [other._id, grandchild._id]
+
+    def test_include_children(self, tree):
+        root, child, grandchild, other = tree
+        subjects = Subject.objects.filter(id=root.id).include_children()
+        assert set(subjects) == {root, child, grandchild}
+
+    def test_preprint_subject_hierarchy(self, tree):
+        root, child, grandchild, other = tree
+        preprint = PreprintFactory(subjects=[[root._id, child._id], [other._id]])
+        hierarchies = [[subject._id for subject in hierarchy] for hierarchy in preprint.subject_hierarchy]
+        assert sorted(hierarchies) == sorted([[root._id, child._id], [other._id]])
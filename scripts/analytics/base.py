@@ -1,10 +1,22 @@
+import os
+import json
+import math
 import time
 import logging
 import argparse
 import importlib
+import tempfile
+import multiprocessing
 from datetime import datetime, timedelta
 from dateutil.parser import parse
 
+import pytz
+from django.db import connections
+from django.db.models import Case, Count, IntegerField, Q, When
+from django.db.models.functions import TruncDay
+from django.utils import timezone
+
+from website import settings
 from website.app import init_app
 from website.settings import KEEN as keen_settings
 from keen.client import KeenClient
@@ -13,6 +25,123 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+def count_buckets(queryset, buckets):
+    """Count the rows of ``queryset`` matching each condition in ``buckets``, a dict of name to Q,
+    in a single pass with one conditional aggregate per bucket.
+    """
+    return queryset.aggregate(**bucket_aggregates(buckets))
+
+
+def bucket_aggregates(buckets):
+    return {
+        name: Count(Case(When(condition, then=1), output_field=IntegerField()))
+        for name, condition in buckets.items()
+    }
+
+
+def days_q(field, days):
+    """Q matching ``field`` on any of the UTC ``days``, with consecutive days merged into one range."""
+    q = Q()
+    days = sorted(days)
+    start = end = None
+    for day in days + [None]:
+        if day is not None and end is not None and day == end + timedelta(1):
+            end = day
+            continue
+        if start is not None:
+            start_datetime = datetime(start.year, start.month, start.day, tzinfo=pytz.UTC)
+            end_datetime = datetime(end.year, end.month, end.day, tzinfo=pytz.UTC) + timedelta(1)
+            q |= Q(**{'{}__gte'.format(field): start_datetime, '{}__lt'.format(field): end_datetime})
+        start = end = day
+    return q
+
+
+class DailySnapshots(object):
+    """Bucket counts of the rows of ``queryset`` for each UTC day they were created on, saved to a
+    JSON file in ``ANALYTICS_SNAPSHOT_DIR``. The totals as of a day are the sums of the counts of
+    every day up to it.
+
+    ``refresh`` only recounts the days that rows modified since the last refresh were created on,
+    in one grouped query, along with those of the rows whose ids ``get_changed_ids(since)`` returns
+    for changes made elsewhere. Rows that are deleted from the table, or that change without either,
+    are only accounted for by a rebuild, which ``refresh`` makes once the snapshots are more than
+    ``ANALYTICS_SNAPSHOT_MAX_AGE`` days old.
+    """
+
+    def __init__(self, name, queryset, buckets, created_field='date_created', modified_field='date_modified',
+                 get_changed_ids=None):
+        self.queryset = queryset
+        self.buckets = buckets
+        self.created_field = created_field
+        self.modified_field = modified_field
+        self.get_changed_ids = get_changed_ids
+        self.path = os.path.join(settings.ANALYTICS_SNAPSHOT_DIR or tempfile.gettempdir(), '{}_snapshots.json'.format(name))
+        self.days = None
+
+    def load(self):
+        try:
+            with open(self.path) as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+    def save(self, state):
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        tmp_path = '{}.tmp'.format(self.path)
+        with open(tmp_path, 'w') as fp:
+            json.dump(state, fp)
+        os.rename(tmp_path, self.path)
+
+    def count_days(self, queryset):
+        rows = queryset.annotate(
+            created_day=TruncDay(self.created_field, tzinfo=pytz.UTC)
+        ).order_by().values('created_day').annotate(**bucket_aggregates(self.buckets))
+        return {row.pop('created_day').date().isoformat(): row for row in rows}
+
+    def is_stale(self, state):
+        rebuilt = state.get('rebuilt')
+        max_age = timedelta(days=settings.ANALYTICS_SNAPSHOT_MAX_AGE)
+        return rebuilt is None or timezone.now() - parse(rebuilt) > max_age
+
+    def refresh(self, rebuild=False):
+        state = None if rebuild else self.load()
+        started = timezone.now()
+        if state is None or self.is_stale(state):
+            logger.info('Counting every day of {}'.format(self.path))
+            days = self.count_days(self.queryset)
+            rebuilt = started.isoformat()
+        else:
+            days = state['days']
+            rebuilt = state['rebuilt']
+            since = parse(state['refreshed'])
+            changed = Q(**{'{}__gte'.format(self.modified_field): since})
+            if self.get_changed_ids:
+                changed |= Q(id__in=self.get_changed_ids(since))
+            modified = self.queryset.filter(changed)
+            dirty = set(
+                day.date() for day in
+                modified.annotate(created_day=TruncDay(self.created_field, tzinfo=pytz.UTC))
+                .order_by().values_list('created_day', flat=True).distinct()
+            )
+            logger.info('Recounting {} days of {}'.format(len(dirty), self.path))
+            if dirty:
+                for day in dirty:
+                    days.pop(day.isoformat(), None)
+                days.update(self.count_days(self.queryset.filter(days_q(self.created_field, dirty))))
+        self.save({'refreshed': started.isoformat(), 'rebuilt': rebuilt, 'days': days})
+        self.days = days
+
+    def totals(self, date):
+        """Return the bucket counts of the rows created on or before ``date``."""
+        totals = dict.fromkeys(self.buckets, 0)
+        for day, counts in self.days.items():
+            if day <= date.isoformat():
+                for name, count in counts.items():
+                    totals[name] += count
+        return totals
+
+
 class BaseAnalytics(object):
 
     @property
@@ -88,6 +217,32 @@ class SummaryAnalytics(BaseAnalytics):
 
         return parser.parse_args()
 
+    def get_events_for_dates(self, dates, workers=1):
+        """Return the events of every date in ``dates``. With several ``workers``, the dates are
+        split into contiguous ranges that are summarized in parallel by worker processes.
+        """
+        if workers <= 1 or len(dates) <= 1:
+            return [event for date in dates for event in self.get_events(date)]
+        size = int(math.ceil(len(dates) / float(workers)))
+        ranges = [(type(self).__module__, type(self).__name__, dates[i:i + size]) for i in range(0, len(dates), size)]
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        pool = multiprocessing.Pool(processes=min(workers, len(ranges)))
+        try:
+            results = pool.map(summarize_dates, ranges)
+        finally:
+            pool.close()
+            pool.join()
+        return [event for events in results for event in events]
+
+
+def summarize_dates(args):
+    """Return the events of one SummaryAnalytics class for a range of dates. Runs in a worker process."""
+    module, class_name, dates = args
+    analytics_class = getattr(importlib.import_module(module), class_name)
+    instance = analytics_class()
+    return [event for date in dates for event in instance.get_events(date)]
+
 
 class EventAnalytics(SummaryAnalytics):
 
@@ -181,9 +336,17 @@ class DateAnalyticsHarness(BaseAnalyticsHarness):
         )
         parser.add_argument('-d', '--date', dest='date', required=False)
         parser.add_argument('-y', '--yesterday', dest='yesterday', action='store_true')
+        parser.add_argument(
+            '-e', '--end-date', dest='end_date', required=False,
+            help='Backfill every date from --date up to and including this one'
+        )
+        parser.add_argument(
+            '-w', '--workers', dest='workers', type=int, default=1,
+            help='Number of worker processes summarizing the backfilled dates'
+        )
         return parser.parse_args()
 
-    def main(self, date=None, yesterday=False, command_line=True):
+    def main(self, date=None, yesterday=False, command_line=True, end_date=None, workers=1):
         analytics_classes = self.analytics_classes
         if yesterday:
             date = (datetime.today() - timedelta(1)).date()
@@ -197,10 +360,20 @@ class DateAnalyticsHarness(BaseAnalyticsHarness):
                     date = parse(args.date).date()
                 except AttributeError:
                     raise AttributeError('You must either specify a date or use the yesterday argument to gather analytics for yesterday.')
+            if args.end_date:
+                end_date = parse(args.end_date).date()
+            workers = args.workers
             if args.analytics_scripts:
                 analytics_classes = self.try_to_import_from_args(args.analytics_scripts)
 
+        dates = [date]
+        if end_date:
+            dates = [date + timedelta(days) for days in range((end_date - date).days + 1)]
+
         for analytics_class in analytics_classes:
             class_instance = analytics_class()
-            events = class_instance.get_events(date)
+            if isinstance(class_instance, SummaryAnalytics):
+                events = class_instance.get_events_for_dates(dates, workers=workers)
+            else:
+                events = [event for day in dates for event in class_instance.get_events(day)]
             class_instance.send_events(events)
@@ -1,17 +1,34 @@
 import pytz
 import logging
-from modularodm import Q
 from dateutil.parser import parse
 from datetime import datetime, timedelta
 
-from osf.models import OSFUser as User, AbstractNode as Node, Institution
+from django.db.models import Count, Q
+
+from osf.models import OSFUser as User, AbstractNode, Institution
 from website.app import init_app
-from scripts.analytics.base import SummaryAnalytics
+from scripts.analytics.base import SummaryAnalytics, bucket_aggregates
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# (group, key, node type, whether it must be a project, extra condition) of every counted bucket
+BUCKETS = [
+    ('nodes', 'total', None, False, Q()),
+    ('nodes', 'public', None, False, Q(is_public=True)),
+    ('nodes', 'private', None, False, Q(is_public=False)),
+    ('projects', 'total', None, True, Q()),
+    ('projects', 'public', None, True, Q(is_public=True)),
+    ('projects', 'private', None, True, Q(is_public=False)),
+    ('registered_nodes', 'total', 'registration', False, Q()),
+    ('registered_nodes', 'public', 'registration', False, Q(is_public=True)),
+    ('registered_nodes', 'embargoed', 'registration', False, Q(is_public=False)),
+    ('registered_projects', 'total', 'registration', True, Q()),
+    ('registered_projects', 'public', 'registration', True, Q(is_public=True)),
+    ('registered_projects', 'embargoed', 'registration', True, Q(is_public=False)),
+]
+
 
 class InstitutionSummary(SummaryAnalytics):
 
@@ -20,12 +37,25 @@ class InstitutionSummary(SummaryAnalytics):
         return 'institution_summary'
 
     def get_institutions(self):
-        institutions = Institution.find(Q('_id', 'ne', None))
+        institutions = Institution.objects.filter(_id__isnull=False)
         return institutions
 
+    def get_buckets(self, query_datetime):
+        from osf.models import NodeRelation, Registration
+        is_project = ~Q(id__in=NodeRelation.objects.values('child_id'))
+
+        buckets = {}
+        for group, key, node_type, project, condition in BUCKETS:
+            condition &= Q(is_deleted=False, date_created__lt=query_datetime)
+            if node_type:
+                condition &= Q(type=Registration._typedmodels_type)
+            if project:
+                condition &= is_project
+            buckets['{}_{}'.format(group, key)] = condition
+        return buckets
+
     def get_events(self, date):
         super(InstitutionSummary, self).get_events(date)
-        from osf.models import AbstractNode, Registration
 
         institutions = self.get_institutions()
         counts = []
@@ -34,52 +64,34 @@ class InstitutionSummary(SummaryAnalytics):
         timestamp_datetime = datetime(date.year, date.month, date.day).replace(tzinfo=pytz.UTC)
         query_datetime = timestamp_datetime + timedelta(1)
 
-        for institution in institutions:
-            user_query = Q('affiliated_institutions', 'eq', institution)
-            node_query = (
-                Q('is_deleted', 'ne', True) &
-                Q('date_created', 'lt', query_datetime)
-            )
+        # Every bucket of every institution, counted in one grouped query
+        node_counts = {
+            row.pop('affiliated_institutions'): row for row in
+            AbstractNode.objects.filter(affiliated_institutions__in=institutions).order_by()
+            .values('affiliated_institutions').annotate(**bucket_aggregates(self.get_buckets(query_datetime)))
+        }
+        user_counts = dict(
+            User.objects.filter(affiliated_institutions__in=institutions).order_by()
+            .values('affiliated_institutions').annotate(total=Count('id'))
+            .values_list('affiliated_institutions', 'total')
+        )
 
-            project_query = node_query & Q('parent_nodes', 'eq', None)
-            public_query = Q('is_public', 'eq', True)
-            private_query = Q('is_public', 'eq', False)
-            node_public_query = node_query & public_query
-            node_private_query = node_query & private_query
-            project_public_query = project_query & public_query
-            project_private_query = project_query & private_query
+        for institution in institutions:
+            institution_counts = node_counts.get(institution.pk, {})
             count = {
                 'institution': {
                     'id': institution._id,
                     'name': institution.name,
                 },
                 'users': {
-                    'total': User.find(user_query).count(),
-                },
-                'nodes': {
-                    'total': AbstractNode.find_by_institutions(institution, node_query).count(),
-                    'public': AbstractNode.find_by_institutions(institution, node_public_query).count(),
-                    'private': AbstractNode.find_by_institutions(institution, node_private_query).count(),
-                },
-                'projects': {
-                    'total': Node.find_by_institutions(institution, project_query).count(),
-                    'public': Node.find_by_institutions(institution, project_public_query).count(),
-                    'private': Node.find_by_institutions(institution, project_private_query).count(),
-                },
-                'registered_nodes': {
-                    'total': Registration.find_by_institutions(institution, node_query).count(),
-                    'public': Registration.find_by_institutions(institution, node_public_query).count(),
-                    'embargoed': Registration.find_by_institutions(institution, node_private_query).count(),
-                },
-                'registered_projects': {
-                    'total': Registration.find_by_institutions(institution, project_query).count(),
-                    'public': Registration.find_by_institutions(institution, project_public_query).count(),
-                    'embargoed': Registration.find_by_institutions(institution, project_private_query).count(),
+                    'total': user_counts.get(institution.pk, 0),
                 },
                 'keen': {
                     'timestamp': timestamp_datetime.isoformat()
                 }
             }
+            for group, key, _, _, _ in BUCKETS:
+                count.setdefault(group, {})[key] = institution_counts.get('{}_{}'.format(group, key), 0)
 
             logger.info(
                 '{} Nodes counted. Nodes: {}, Projects: {}, Registered Nodes: {}, Registered Projects: {}'.format(
@@ -1,74 +1,101 @@
-from itertools import chain
+import bson
 import pytz
 import logging
-from modularodm import Q
 from dateutil.parser import parse
 from datetime import datetime, timedelta
+from django.db.models import Q
 from django.utils import timezone
 
+from website import settings
 from website.app import init_app
-from scripts.analytics.base import SummaryAnalytics
+from scripts.analytics.base import DailySnapshots, SummaryAnalytics
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# (group, key, node type, whether it must be a project, extra condition) of every counted bucket
+BUCKETS = [
+    ('nodes', 'total', None, False, Q()),
+    ('nodes', 'public', None, False, Q(is_public=True)),
+    ('nodes', 'private', None, False, Q(is_public=False)),
+    ('projects', 'total', 'node', True, Q()),
+    ('projects', 'public', 'node', True, Q(is_public=True)),
+    ('projects', 'private', 'node', True, Q(is_public=False)),
+    ('registered_nodes', 'total', 'registration', False, Q()),
+    ('registered_nodes', 'public', 'registration', False, Q(is_public=True)),
+    ('registered_nodes', 'embargoed', 'registration', False, Q(is_public=False)),
+    ('registered_nodes', 'withdrawn', 'registration', False, Q(retraction__isnull=False)),
+    ('registered_projects', 'total', 'registration', True, Q()),
+    ('registered_projects', 'public', 'registration', True, Q(is_public=True)),
+    ('registered_projects', 'embargoed', 'registration', True, Q(is_public=False)),
+    ('registered_projects', 'withdrawn', 'registration', True, Q(retraction__isnull=False)),
+]
+
+
+def get_buckets():
+    from osf.models import Node, NodeRelation, Registration
+    types = {'node': Node._typedmodels_type, 'registration': Registration._typedmodels_type}
+    is_project = ~Q(id__in=NodeRelation.objects.values('child_id'))
+
+    buckets = {}
+    for group, key, node_type, project, condition in BUCKETS:
+        condition &= Q(is_deleted=False)
+        if node_type:
+            condition &= Q(type=types[node_type])
+        if project:
+            condition &= is_project
+        buckets['{}_{}'.format(group, key)] = condition
+    return buckets
+
+
+def get_reparented_node_ids(since):
+    """Ids of the nodes that became components since ``since``, which makes them stop being counted
+    as projects without updating them. NodeRelations have no dates, but their ObjectId ``_id``s start
+    with the time they were created at.
+    """
+    from osf.models import NodeRelation
+    return NodeRelation.objects.filter(_id__gte=str(bson.ObjectId.from_datetime(since))).values('child_id')
+
 
 class NodeSummary(SummaryAnalytics):
+    """Counts every bucket of the nodes created on each day in one grouped query, and keeps them in
+    daily snapshots so that later runs only recount the days of the nodes modified since.
+    """
+
+    def __init__(self):
+        super(NodeSummary, self).__init__()
+        self._snapshots = None
 
     @property
     def collection_name(self):
         return 'node_summary'
 
+    @property
+    def snapshots(self):
+        if self._snapshots is None:
+            from osf.models import AbstractNode
+            self._snapshots = DailySnapshots(
+                self.collection_name, AbstractNode.objects.all(), get_buckets(),
+                get_changed_ids=get_reparented_node_ids,
+            )
+            self._snapshots.refresh(rebuild=not settings.ANALYTICS_INCREMENTAL_SNAPSHOTS)
+        return self._snapshots
+
     def get_events(self, date):
         super(NodeSummary, self).get_events(date)
-        from osf.models import AbstractNode, Node, Registration
 
-        # Convert to a datetime at midnight for queries and the timestamp
+        # Convert to a datetime at midnight for the timestamp
         timestamp_datetime = datetime(date.year, date.month, date.day).replace(tzinfo=pytz.UTC)
-        query_datetime = timestamp_datetime + timedelta(1)
-
-        node_query = {'is_deleted': False, 'date_created__lte': query_datetime}
-        project_query = dict(chain(node_query.iteritems(), {'parent_nodes__isnull': True}.iteritems()))
-
-        public_query = {'is_public': True}
-        private_query = {'is_public': False}
-        retracted_query = {'retraction__isnull': False}
-
-        node_public_query = dict(chain(node_query.iteritems(), public_query.iteritems()))
-        node_private_query = dict(chain(node_query.iteritems(), private_query.iteritems()))
-        node_retracted_query = dict(chain(node_query.iteritems(), retracted_query.iteritems()))
-        project_public_query = dict(chain(project_query.iteritems(), public_query.iteritems()))
-        project_private_query = dict(chain(project_query.iteritems(), private_query.iteritems()))
-        project_retracted_query = dict(chain(project_query.iteritems(), retracted_query.iteritems()))
+        counts = self.snapshots.totals(date)
 
         totals = {
             'keen': {
                 'timestamp': timestamp_datetime.isoformat()
             },
-            'nodes': {
-                'total': AbstractNode.objects.filter(**node_query).count(),
-                'public': AbstractNode.objects.filter(**node_public_query).count(),
-                'private': AbstractNode.objects.filter(**node_private_query).count()
-            },
-            'projects': {
-                'total': Node.objects.filter(**project_query).count(),
-                'public': Node.objects.filter(**project_public_query).count(),
-                'private': Node.objects.filter(**project_private_query).count(),
-            },
-            'registered_nodes': {
-                'total': Registration.objects.filter(**node_query).count(),
-                'public': Registration.objects.filter(**node_public_query).count(),
-                'embargoed': Registration.objects.filter(**node_private_query).count(),
-                'withdrawn': Registration.objects.filter(**node_retracted_query).count(),
-            },
-            'registered_projects': {
-                'total': Registration.objects.filter(**project_query).count(),
-                'public': Registration.objects.filter(**project_public_query).count(),
-                'embargoed': Registration.objects.filter(**project_private_query).count(),
-                'withdrawn': Registration.objects.filter(**project_retracted_query).count(),
-            }
         }
+        for group, key, _, _, _ in BUCKETS:
+            totals.setdefault(group, {})[key] = counts['{}_{}'.format(group, key)]
 
         logger.info(
             'Nodes counted. Nodes: {}, Projects: {}, Registered Nodes: {}, Registered Projects: {}'.format(
@@ -81,6 +108,10 @@ class NodeSummary(SummaryAnalytics):
 
         return [totals]
 
+    def get_events_for_dates(self, dates, workers=1):
+        # Every date is summed from the same snapshots, refreshed once
+        return [event for date in dates for event in self.get_events(date)]
+
 
 def get_class():
     return NodeSummary
@@ -3,12 +3,11 @@ import logging
 from dateutil.parser import parse
 from datetime import datetime, timedelta
 
-from modularodm import Q
+from django.db.models import Count, Q
 
 from osf.models import OSFUser as User, NodeLog
 from website.app import init_app
-from framework.mongo.utils import paginated
-from scripts.analytics.base import SummaryAnalytics
+from scripts.analytics.base import SummaryAnalytics, count_buckets
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -17,14 +16,24 @@ LOG_THRESHOLD = 11
 
 
 # Modified from scripts/analytics/depth_users.py
-def count_user_logs(user):
-    logs = NodeLog.find(Q('user', 'eq', user._id))
-    length = logs.count()
-    if length == LOG_THRESHOLD:
-        item = logs[0]
-        if item.action == 'project_created' and item.node.is_bookmark_collection:
-            length -= 1
-    return length
+def count_depth_users(users):
+    """Return how many of ``users`` have at least LOG_THRESHOLD logs, not counting the creation of their
+    bookmark collection when it is their latest log, with one grouped count of their logs.
+    """
+    log_counts = (
+        NodeLog.objects.filter(user__in=users).order_by()
+        .values('user').annotate(log_count=Count('id'))
+        .filter(log_count__gte=LOG_THRESHOLD)
+        .values_list('user', 'log_count')
+    )
+    depth_users = 0
+    for user_id, log_count in log_counts:
+        if log_count == LOG_THRESHOLD:
+            item = NodeLog.objects.filter(user_id=user_id).select_related('node').first()
+            if item.action == 'project_created' and item.node.is_bookmark_collection:
+                continue
+        depth_users += 1
+    return depth_users
 
 
 class UserSummary(SummaryAnalytics):
@@ -40,48 +49,29 @@ class UserSummary(SummaryAnalytics):
         timestamp_datetime = datetime(date.year, date.month, date.day).replace(tzinfo=pytz.UTC)
         query_datetime = timestamp_datetime + timedelta(1)
 
-        active_user_query = (
-            Q('is_registered', 'eq', True) &
-            Q('password', 'ne', None) &
-            Q('merged_by', 'eq', None) &
-            Q('date_disabled', 'eq', None) &
-            Q('date_confirmed', 'ne', None) &
-            Q('date_confirmed', 'lt', query_datetime)
+        active_user_query = Q(
+            is_registered=True,
+            password__isnull=False,
+            merged_by__isnull=True,
+            date_disabled__isnull=True,
+            date_confirmed__isnull=False,
+            date_confirmed__lt=query_datetime,
         )
 
-        active_users = 0
-        depth_users = 0
-        profile_edited = 0
-        user_pages = paginated(User, query=active_user_query)
-        for user in user_pages:
-            active_users += 1
-            log_count = count_user_logs(user)
-            if log_count >= LOG_THRESHOLD:
-                depth_users += 1
-            if user.social or user.schools or user.jobs:
-                profile_edited += 1
+        status = count_buckets(User.objects.all(), {
+            'active': active_user_query,
+            'unconfirmed': Q(date_registered__lt=query_datetime, date_confirmed__isnull=True),
+            'deactivated': Q(date_disabled__isnull=False, date_disabled__lt=query_datetime),
+            'merged': Q(date_registered__lt=query_datetime, merged_by__isnull=False),
+            'profile_edited': active_user_query & (~Q(social={}) | ~Q(schools=[]) | ~Q(jobs=[])),
+        })
+        status['depth'] = count_depth_users(User.objects.filter(active_user_query))
 
         counts = {
             'keen': {
                 'timestamp': timestamp_datetime.isoformat()
             },
-            'status': {
-                'active': active_users,
-                'depth': depth_users,
-                'unconfirmed': User.find(
-                    Q('date_registered', 'lt', query_datetime) &
-                    Q('date_confirmed', 'eq', None)
-                ).count(),
-                'deactivated': User.find(
-                    Q('date_disabled', 'ne', None) &
-                    Q('date_disabled', 'lt', query_datetime)
-                ).count(),
-                'merged': User.find(
-                    Q('date_registered', 'lt', query_datetime) &
-                    Q('merged_by', 'ne', None)
-                ).count(),
-                'profile_edited': profile_edited
-            }
+            'status': status
         }
         logger.info(
             'Users counted. Active: {}, Depth: {}, Unconfirmed: {}, Deactivated: {}, Merged: {}, Profile Edited: {}'.format(
@@ -5,7 +5,7 @@ from framework.mongo import database
 from scripts import utils as script_utils
 from website.app import setup_django
 from django.apps import apps
-from website.preprints.tasks import on_preprint_updated
+from website.preprints.tasks import send_preprints_to_share
 from website import settings
 
 logger = logging.getLogger(__name__)
@@ -13,34 +13,21 @@ logger = logging.getLogger(__name__)
 
 def get_targets():
     PreprintService = apps.get_model('osf.PreprintService')
-    return PreprintService.objects.filter().values_list('guids___id', flat=True)
+    return PreprintService.objects.all()
 
 def migrate(dry=True):
     assert settings.SHARE_URL, 'SHARE_URL must be set to migrate.'
     assert settings.SHARE_API_TOKEN, 'SHARE_API_TOKEN must be set to migrate.'
     targets = get_targets()
-    target_count = len(targets)
-    successes = []
-    failures = []
-    count = 0
-
-    logger.info('Preparing to migrate {} preprints.'.format(target_count))
-    for preprint_id in targets:
-        count += 1
-        logger.info('{}/{} - {}'.format(count, target_count, preprint_id))
-        try:
-            if not dry:
-                on_preprint_updated(preprint_id)
-        except Exception as e:
-            # TODO: This reliably fails for certain nodes with
-            # IncompleteRead(0 bytes read)
-            failures.append(preprint_id)
-            logger.warn('Encountered exception {} while posting to SHARE for preprint {}'.format(e, preprint_id))
-        else:
-            successes.append(preprint_id)
-
-    logger.info('Successes: {}'.format(successes))
-    logger.info('Failures: {}'.format(failures))
+
+    logger.info('Preparing to migrate {} preprints.'.format(targets.count()))
+    if dry:
+        return
+    # Sent in batches per provider, failures are recorded as FailedShareSubmissions
+    batcher = send_preprints_to_share(targets)
+
+    logger.info('Successes: {}'.format(batcher.sent))
+    logger.info('Failures: {}'.format([preprint_id for preprint_id, error in batcher.failed]))
 
 
 def main():
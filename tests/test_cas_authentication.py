@@ -5,7 +5,7 @@ import mock
 from nose.tools import *  # flake8: noqa (PEP8 asserts)
 import unittest
 
-from framework.auth import cas
+from framework.auth import cas, token_cache
 
 from tests.base import OsfTestCase, fake
 from osf_tests.factories import UserFactory
@@ -205,6 +205,83 @@ class TestCASClient(OsfTestCase):
         assert 0
 
 
+@mock.patch('framework.auth.token_cache.settings.CAS_TOKEN_CACHE_TTL', 300)
+@mock.patch('framework.auth.token_cache.settings.CAS_TOKEN_NEGATIVE_CACHE_TTL', 60)
+class TestTokenCache(OsfTestCase):
+
+    def setUp(self):
+        super(TestTokenCache, self).setUp()
+        token_cache.local_cache.clear()
+        self.user = UserFactory()
+
+    def tearDown(self):
+        token_cache.local_cache.clear()
+        super(TestTokenCache, self).tearDown()
+
+    def profile(self, access_token):
+        response = make_successful_response(self.user)
+        response.attributes['accessToken'] = access_token
+        response.attributes['accessTokenScope'] = {'osf.full_read'}
+        return response
+
+    def test_profiles_are_cached(self):
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=self.profile) as profile:
+            first = token_cache.get_profile('token')
+            second = token_cache.get_profile('token')
+        assert_equal(profile.call_count, 1)
+        assert_equal(second.user, self.user._id)
+        assert_equal(second.attributes, first.attributes)
+        assert_equal(second.attributes['accessToken'], 'token')
+
+    def test_rejected_tokens_are_cached(self):
+        error = cas.CasHTTPError(401, 'Unauthorized', {}, '')
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=error) as profile:
+            for _ in range(2):
+                with assert_raises(cas.CasHTTPError):
+                    token_cache.get_profile('invalid')
+        assert_equal(profile.call_count, 1)
+
+    def test_cas_errors_are_not_cached(self):
+        error = cas.CasHTTPError(503, 'Unavailable', {}, '')
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=error) as profile:
+            for _ in range(2):
+                with assert_raises(cas.CasHTTPError):
+                    token_cache.get_profile('token')
+        assert_equal(profile.call_count, 2)
+
+    @httpretty.activate
+    def test_revoking_token_evicts_it(self):
+        httpretty.register_uri(httpretty.POST, cas.get_client().get_auth_token_revocation_url(), status=204)
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=self.profile) as profile:
+            token_cache.get_profile('token')
+            token_cache.get_profile('other')
+            cas.get_client().revoke_tokens({'token': 'token'})
+            token_cache.get_profile('token')
+            token_cache.get_profile('other')
+        assert_equal(profile.call_count, 3)
+
+    @httpretty.activate
+    def test_revoking_token_evicts_it_again_on_commit(self):
+        httpretty.register_uri(httpretty.POST, cas.get_client().get_auth_token_revocation_url(), status=204)
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=self.profile) as profile, \
+                mock.patch('framework.auth.token_cache.transaction.on_commit') as on_commit:
+            cas.get_client().revoke_tokens({'token': 'token'})
+            # Another request caches the profile before the revocation is committed
+            token_cache.get_profile('token')
+            on_commit.call_args[0][0]()
+            token_cache.get_profile('token')
+        assert_equal(profile.call_count, 2)
+
+    @httpretty.activate
+    def test_revoking_application_tokens_clears_cache(self):
+        httpretty.register_uri(httpretty.POST, cas.get_client().get_auth_token_revocation_url(), status=204)
+        with mock.patch.object(cas.CasClient, 'profile', side_effect=self.profile) as profile:
+            token_cache.get_profile('token')
+            cas.get_client().revoke_application_tokens('client_id', 'client_secret')
+            token_cache.get_profile('token')
+        assert_equal(profile.call_count, 2)
+
+
 class TestCASTicketAuthentication(OsfTestCase):
 
     def setUp(self):
@@ -1,8 +1,11 @@
 import os
 import json
+import datetime
+import mock
 from nose.tools import *
 
-from api.citations.utils import render_citation
+from api.citations import utils
+from api.citations.utils import render_citation, render_citations, get_citation
 
 
 class Node:
@@ -10,6 +13,11 @@ class Node:
     csl = {'publisher': 'Open Science Framework', 'author': [{'given': u'Henrique', 'family': u'Harman'}], 'URL': 'localhost:5000/2nthu', 'issued': {'date-parts': [[2016, 12, 6]]}, 'title': u'The study of chocolate in its many forms', 'type': 'webpage', 'id': u'2nthu'}
 
 
+class OtherNode(Node):
+    _id = 'abcde'
+    csl = dict(Node.csl, id='abcde', title=u'A second study of chocolate')
+
+
 class TestCiteprocpy:
     def test_failing_citations(self):
         node = Node()
@@ -43,3 +51,38 @@ class TestCiteprocpy:
                 print k
         assert(len(not_matches) == 0)
 
+
+class TestCitationCaches:
+    def setup(self):
+        utils.style_cache.clear()
+        utils.citation_cache.clear()
+
+    def test_styles_are_parsed_once(self):
+        with mock.patch.object(utils, 'CitationStylesStyle', wraps=utils.CitationStylesStyle) as parse:
+            render_citation(Node(), 'apa')
+            render_citation(OtherNode(), 'apa')
+        assert_equal(parse.call_count, 1)
+
+    def test_unknown_style(self):
+        with assert_raises(ValueError) as e:
+            render_citation(Node(), 'not-a-style')
+        assert_in('not-a-style.csl', e.exception.message)
+
+    def test_batch_render_matches_single_renders(self):
+        nodes = [Node(), OtherNode(), Node()]
+        for style in ('apa', 'modern-language-association', 'chicago-author-date'):
+            expected = [render_citation(node, style) for node in nodes]
+            assert_equal(render_citations(nodes, style), expected)
+
+    @mock.patch('api.citations.utils.settings.CITATION_CACHE_TTL', 60)
+    def test_citations_are_cached_until_node_is_modified(self):
+        node = Node()
+        node.date_modified = datetime.datetime(2017, 1, 1)
+        with mock.patch.object(utils, 'render_citation', return_value=u'citation') as render:
+            get_citation(node, 'apa')
+            get_citation(node, 'apa')
+            assert_equal(render.call_count, 1)
+            get_citation(node, 'modern-language-association')
+            node.date_modified = datetime.datetime(2017, 1, 2)
+            get_citation(node, 'apa')
+            assert_equal(render.call_count, 3)
@@ -1639,6 +1639,30 @@ class TestSendEmails(NotificationTestCase):
         formatted_datetime = u'{time} on {date}'.format(time=formatted_time, date=formatted_date)
         assert_equal(emails.localize_timestamp(timestamp, self.user), formatted_datetime)
 
+    @mock.patch('website.mails.render_message')
+    def test_store_emails_renders_once_per_timezone_and_locale(self, mock_render):
+        mock_render.return_value = 'Hello'
+        timestamp = timezone.now()
+        recipients = [factories.UserFactory(timezone='Etc/UTC', locale='en_US') for _ in range(3)]
+        recipients.append(factories.UserFactory(timezone='Europe/Moscow', locale='ru_RU'))
+        recipient_ids = [recipient._id for recipient in recipients] + [self.user._id]
+
+        emails.store_emails(recipient_ids, 'email_transactional', 'comments', self.user, self.node, timestamp)
+
+        assert_equal(mock_render.call_count, 2)
+        digests = NotificationDigest.objects.filter(event='comments', send_type='email_transactional')
+        assert_equal(
+            sorted(digests.values_list('user_id', flat=True)),
+            sorted(recipient.id for recipient in recipients)
+        )
+        assert_true(all(digest.node_lineage == [self.project._id, self.node._id] for digest in digests))
+
+    def test_remove_notifications_deletes_all_given_digests(self):
+        digests = [factories.NotificationDigestFactory(node_lineage=[self.project._id]) for _ in range(3)]
+        kept = factories.NotificationDigestFactory(node_lineage=[self.project._id])
+        remove_notifications(email_notification_ids=[digest._id for digest in digests])
+        assert_equal(list(NotificationDigest.objects.values_list('_id', flat=True)), [kept._id])
+
 
 class TestSendDigest(OsfTestCase):
     def setUp(self):
@@ -5,7 +5,10 @@ import urlparse
 
 from framework.celery_tasks import handlers
 from addons.osfstorage.models import OsfStorageFile
-from website.preprints.tasks import format_preprint
+from website.preprints.tasks import (
+    enqueue_share_update, format_preprint, prefetch_share_data, send_preprints_to_share, update_share_preprints
+)
+from website.util import share
 from website.util import permissions
 
 from framework.auth import Auth
@@ -13,7 +16,7 @@ from framework.exceptions import PermissionsError
 
 from website import settings
 from website.identifiers.utils import get_doi_and_metadata_for_object
-from osf.models import NodeLog, Subject
+from osf.models import NodeLog, Subject, PreprintService, FailedShareSubmission
 
 from tests.base import OsfTestCase
 from osf_tests.factories import (
@@ -601,3 +604,102 @@ class TestPreprintSaveShareHook(OsfTestCase):
     def test_save_unpublished_subject_change_not_called(self, mock_on_preprint_updated):
         self.preprint.set_subjects([[self.subject_two._id]], auth=self.auth, save=True)
         assert not mock_on_preprint_updated.called
+
+
+def share_response(status_code):
+    return mock.Mock(ok=status_code < 400, status_code=status_code, content='')
+
+
+@mock.patch('website.util.share.settings.SHARE_URL', 'https://share.osf.io/')
+@mock.patch('website.util.share.settings.SHARE_RETRY_BACKOFF', 0)
+class TestSendPreprintsToShare(OsfTestCase):
+    def setUp(self):
+        super(TestSendPreprintsToShare, self).setUp()
+        self.provider = PreprintProviderFactory(access_token='token')
+        self.other_provider = PreprintProviderFactory(access_token='other_token')
+        self.preprints = [PreprintFactory(provider=self.provider) for _ in range(3)]
+        self.other_preprint = PreprintFactory(provider=self.other_provider)
+
+    def preprints_in(self, call):
+        graph = call[1]['json']['data']['attributes']['data']['@graph']
+        return sorted(node['date_updated'] for node in graph if node['@type'] == 'preprint')
+
+    def test_batches_preprints_per_provider_token(self):
+        with mock.patch.object(share.session, 'post', return_value=share_response(200)) as post:
+            batcher = send_preprints_to_share(PreprintService.objects.all())
+
+        assert_equal(post.call_count, 2)
+        tokens = sorted(call[1]['headers']['Authorization'] for call in post.call_args_list)
+        assert_equal(tokens, ['Bearer other_token', 'Bearer token'])
+        batch = next(call for call in post.call_args_list if call[1]['headers']['Authorization'] == 'Bearer token')
+        assert_equal(self.preprints_in(batch), sorted(p.date_modified.isoformat() for p in self.preprints))
+        assert_equal(sorted(batcher.sent), sorted(p.id for p in self.preprints + [self.other_preprint]))
+
+    @mock.patch('website.util.share.settings.SHARE_BATCH_SIZE', 2)
+    def test_batch_size(self):
+        with mock.patch.object(share.session, 'post', return_value=share_response(200)) as post:
+            send_preprints_to_share(PreprintService.objects.filter(provider=self.provider))
+        assert_equal([len(self.preprints_in(call)) for call in post.call_args_list], [2, 1])
+
+    def test_retries_server_errors(self):
+        responses = [share_response(503), share_response(200)]
+        with mock.patch.object(share.session, 'post', side_effect=responses) as post:
+            batcher = send_preprints_to_share(PreprintService.objects.filter(id=self.other_preprint.id))
+        assert_equal(post.call_count, 2)
+        assert_equal(batcher.sent, [self.other_preprint.id])
+
+    def test_rejected_batches_are_sent_one_by_one(self):
+        bad = self.preprints[0]
+
+        def post(url, json, headers):
+            preprints = self.preprints_in(((), {'json': json}))
+            return share_response(400 if bad.date_modified.isoformat() in preprints else 200)
+
+        with mock.patch.object(share.session, 'post', side_effect=post) as mock_post:
+            batcher = send_preprints_to_share(PreprintService.objects.filter(provider=self.provider))
+        assert_equal(mock_post.call_count, 4)
+        assert_equal([preprint_id for preprint_id, _ in batcher.failed], [bad.id])
+
+        failure = FailedShareSubmission.objects.get()
+        assert_equal(failure.preprint, bad)
+        assert_equal(failure.status_code, 400)
+
+        with mock.patch.object(share.session, 'post', return_value=share_response(200)):
+            send_preprints_to_share(PreprintService.objects.filter(id=bad.id))
+        assert_false(FailedShareSubmission.objects.exists())
+
+    def test_failed_submissions_count_attempts(self):
+        with mock.patch.object(share.session, 'post', return_value=share_response(503)) as post:
+            send_preprints_to_share(PreprintService.objects.filter(id=self.other_preprint.id))
+            send_preprints_to_share(PreprintService.objects.filter(id=self.other_preprint.id))
+        assert_equal(post.call_count, 2 * (settings.SHARE_MAX_RETRIES + 1))
+        assert_equal(FailedShareSubmission.objects.get().attempts, 2)
+
+    @mock.patch('website.preprints.tasks.settings.SHARE_URL', 'https://share.osf.io')
+    def test_updates_of_one_request_are_sent_by_one_task(self):
+        ids = [preprint._id for preprint in self.preprints]
+        with self.app.app.test_request_context():
+            handlers.celery_before_request()
+            enqueue_share_update(ids[:2])
+            enqueue_share_update(ids[1:])
+            signatures = [sig for sig in handlers.queue() if sig.task == update_share_preprints.name]
+        handlers.celery_before_request()
+        assert_equal(len(signatures), 1)
+        assert_equal(signatures[0].args[0], ids)
+
+    @mock.patch('website.preprints.tasks.settings.SHARE_URL', 'https://share.osf.io')
+    def test_node_update_sends_preprints_in_one_task(self):
+        node = self.preprints[0].node
+        with self.app.app.test_request_context():
+            handlers.celery_before_request()
+            node.title = 'New title'
+            node.save()
+            signatures = [sig for sig in handlers.queue() if sig.task == update_share_preprints.name]
+        handlers.celery_before_request()
+        assert_equal([sig.args[0] for sig in signatures], [[self.preprints[0]._id]])
+
+    def test_prefetched_graph_matches(self):
+        preprint = self.preprints[0]
+        prefetched = prefetch_share_data(PreprintService.objects.filter(id=preprint.id)).get()
+        types = lambda graph: sorted(node['@type'] for node in graph)
+        assert_equal(types(format_preprint(prefetched)), types(format_preprint(preprint)))
@@ -6,6 +6,8 @@ from types import NoneType
 from xmlrpclib import DateTime
 
 import mock
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from nose.tools import *  # flake8: noqa
 
 from tests.base import OsfTestCase
@@ -294,7 +296,7 @@ class TestRubeus(OsfTestCase):
         collector = rubeus.NodeFileCollector(
             self.project, Auth(user=UserFactory())
         )
-        nodes = collector._collect_components(self.project, visited=[])
+        nodes = collector._collect_components(self.project, visited=set())
         assert_equal(len(nodes), 0)
 
     def test_serialized_pointer_has_flag_indicating_its_a_pointer(self):
@@ -306,6 +308,56 @@ class TestRubeus(OsfTestCase):
         child = ret['children'][1]  # first child is OSFStorage, second child is pointer
         assert_true(child['isPointer'])
 
+    def test_serialize_node_with_depth_leaves_deeper_components_unexpanded(self):
+        project = ProjectFactory(creator=self.consolidated_auth.user)
+        child = NodeFactory(parent=project, creator=project.creator)
+        grandchild = NodeFactory(parent=child, creator=project.creator)
+        serializer = rubeus.NodeFileCollector(node=project, auth=self.consolidated_auth, depth=1)
+        ret = serializer._serialize_node(project)
+        serialized_child = ret['children'][-1]
+        assert_equal(serialized_child['nodeID'], child._id)
+        assert_equal(serialized_child['children'], [])
+        assert_equal(serialized_child['urls']['fetch'], child.api_url_for('grid_data', depth=1))
+
+        serializer = rubeus.NodeFileCollector(node=child, auth=self.consolidated_auth, depth=1)
+        ret = serializer._serialize_node(child)
+        assert_equal(ret['nodeType'], 'component')
+        assert_equal(ret['urls']['fetch'], None)
+        assert_equal(ret['children'][-1]['nodeID'], grandchild._id)
+
+    @mock.patch('osf.models.AbstractNode.get_addons', mock.Mock(return_value=[]))
+    def test_serialize_node_queries_do_not_grow_with_components(self):
+        def count_queries(project):
+            with CaptureQueriesContext(connection) as queries:
+                rubeus.NodeFileCollector(node=project, auth=self.consolidated_auth).to_hgrid()
+            return len(queries)
+
+        small = ProjectFactory(creator=self.consolidated_auth.user)
+        NodeFactory(parent=small, creator=small.creator)
+
+        large = ProjectFactory(creator=self.consolidated_auth.user)
+        for _ in range(3):
+            child = NodeFactory(parent=large, creator=large.creator)
+            NodeFactory(parent=child, creator=large.creator)
+            NodeFactory(parent=child, creator=UserFactory())
+
+        assert_equal(count_queries(small), count_queries(large))
+
+    def test_unreadable_components_are_skipped_for_readable_descendants(self):
+        user = UserFactory()
+        project = ProjectFactory()
+        # Not an admin, so the private component isn't readable through the project
+        project.add_contributor(user, permissions=['read', 'write'])
+        project.save()
+        private = NodeFactory(parent=project, creator=UserFactory())
+        readable = NodeFactory(parent=private, creator=private.creator)
+        readable.add_contributor(user, auth=Auth(private.creator))
+        readable.save()
+        serializer = rubeus.NodeFileCollector(node=project, auth=Auth(user))
+        ret = serializer._serialize_node(project)
+        node_ids = [child['nodeID'] for child in ret['children'] if child.get('nodeID') and not child.get('isAddonRoot')]
+        assert_equal(node_ids, [readable._id])
+
 
 # TODO: Make this more reusable across test modules
 mock_addon = mock.Mock()
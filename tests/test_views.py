@@ -16,6 +16,8 @@ import pytest
 from nose.tools import *  # noqa PEP8 asserts
 from django.utils import timezone
 from django.apps import apps
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 
 from modularodm import Q
@@ -50,7 +52,7 @@ from website.project.views.contributor import (
     send_claim_email,
     send_claim_registered_email,
 )
-from website.project.views.node import _should_show_wiki_widget, _view_project, abbrev_authors
+from website.project.views.node import _should_show_wiki_widget, _view_project, abbrev_authors, node_child_tree
 from website.util import api_url_for, web_url_for
 from website.util import permissions, rubeus
 from website.views import index
@@ -1041,6 +1043,63 @@ class TestGetNodeTree(OsfTestCase):
         assert_equal(parent_node_id, project._primary_key)
         assert_equal(children, [])
 
+    def test_get_node_tree_serializes_contributors_and_institutions(self):
+        institution = InstitutionFactory()
+        project = ProjectFactory(creator=self.user)
+        project.add_contributor(self.user2, permissions=[permissions.READ], visible=False, auth=Auth(self.user))
+        project.affiliated_institutions.add(institution)
+        project.save()
+        child = NodeFactory(parent=project, creator=self.user)
+        url = project.api_url_for('get_node_tree')
+        res = self.app.get(url, auth=self.user.auth)
+        tree = res.json[0]
+        assert_equal(tree['node']['contributors'], [
+            {'id': self.user._id, 'is_admin': True, 'is_confirmed': True},
+            {'id': self.user2._id, 'is_admin': False, 'is_confirmed': True},
+        ])
+        assert_equal(tree['node']['visible_contributors'], [self.user._id])
+        assert_equal(tree['node']['affiliated_institutions'], [{'id': institution.pk, 'name': institution.name}])
+        assert_equal(tree['kind'], 'folder')
+        assert_equal(tree['nodeType'], 'project')
+        assert_equal(tree['children'][0]['node']['id'], child._id)
+        assert_equal(tree['children'][0]['kind'], 'node')
+        assert_equal(tree['children'][0]['nodeType'], 'component')
+
+    def test_get_node_tree_private_parent_with_readable_child(self):
+        project = ProjectFactory(creator=self.user2)
+        child = NodeFactory(parent=project, creator=self.user2)
+        grandchild = NodeFactory(parent=child, creator=self.user2)
+        grandchild.add_contributor(self.user, auth=Auth(self.user2))
+        grandchild.save()
+        tree = node_child_tree(self.user, [project])[0]
+        assert_equal(tree['node']['title'], 'Private Project')
+        assert_false(tree['permissions']['view'])
+        grandchild_tree = tree['children'][0]['children'][0]
+        assert_equal(grandchild_tree['node']['id'], grandchild._id)
+        assert_true(grandchild_tree['permissions']['view'])
+        assert_equal(grandchild_tree['kind'], 'folder')
+
+    def test_node_child_tree_queries_do_not_grow_with_tree_size(self):
+        def count_queries(project):
+            with CaptureQueriesContext(connection) as queries:
+                node_child_tree(self.user, [project])
+            return len(queries)
+
+        small = ProjectFactory(creator=self.user)
+        NodeFactory(parent=small, creator=self.user)
+
+        large = ProjectFactory(creator=self.user)
+        large.add_contributor(self.user2, auth=Auth(self.user))
+        large.save()
+        for _ in range(3):
+            child = NodeFactory(parent=large, creator=self.user2)
+            child.add_contributor(self.user, auth=Auth(self.user2))
+            child.save()
+            NodeFactory(parent=child, creator=self.user)
+            NodeFactory(parent=child, creator=self.user2)
+
+        assert_equal(count_queries(small), count_queries(large))
+
 
 class TestUserProfile(OsfTestCase):
 
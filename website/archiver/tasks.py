@@ -131,8 +131,10 @@ def stat_addon(addon_short_name, job_pk):
     if hasattr(src_addon, 'configured') and not src_addon.configured:
         # Addon enabled but not configured - no file trees, nothing to archive.
         return AggregateStatResult(src_addon._id, addon_short_name)
+    # Stop listing files once the registration is too large to archive anyway
+    max_size = None if NO_ARCHIVE_LIMIT in job.initiator.system_tags else settings.MAX_ARCHIVE_SIZE
     try:
-        file_tree = src_addon._get_file_tree(user=user, version=version)
+        file_tree = src_addon._get_file_tree(user=user, version=version, max_size=max_size)
     except HTTPError as e:
         dst.archive_job.update_target(
             addon_short_name,
@@ -292,13 +294,9 @@ def archive_success(dst_pk, job_pk):
 
     :param str dst_pk: primary key of registration Node
 
-    note:: At first glance this task makes redundant calls to utils.get_file_map (which
-    returns a generator yielding  (<sha256>, <file_metadata>) pairs) on the dst Node. Two
-    notes about utils.get_file_map: 1) this function memoizes previous results to reduce
-    overhead and 2) this function returns a generator that lazily fetches the file metadata
-    of child Nodes (it is possible for a selected file to belong to a child Node) using a
-    non-recursive DFS. Combined this allows for a relatively effient implementation with
-    seemingly redundant calls.
+    note:: Each selected file is looked up in the database by its sha256 and name among the
+    OSF Storage files of the registered copy of the Node it was selected from (it is possible
+    for a selected file to belong to a child Node); see utils.find_registration_file.
     """
     create_app_context()
     dst = Node.load(dst_pk)
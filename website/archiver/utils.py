@@ -1,4 +1,4 @@
-import functools
+from django.db import connection
 
 from framework.auth import Auth
 
@@ -170,45 +170,84 @@ def before_archive(node, user):
     )
     job.set_targets()
 
-def _do_get_file_map(file_tree):
-    """Reduces a tree of folders and files into a list of (<sha256>, <file_metadata>) pairs
-    """
-    file_map = []
-    stack = [file_tree]
-    while len(stack):
-        tree_node = stack.pop(0)
-        if tree_node['kind'] == 'file':
-            file_map.append((tree_node['extra']['hashes']['sha256'], tree_node))
-        else:
-            stack = stack + tree_node['children']
-    return file_map
-
-def _memoize_get_file_map(func):
-    cache = {}
-    @functools.wraps(func)
-    def wrapper(node):
-        if node._id not in cache:
-            osf_storage = node.get_addon('osfstorage')
-            file_tree = osf_storage._get_file_tree(user=node.creator)
-            cache[node._id] = _do_get_file_map(file_tree)
-        return func(node, cache[node._id])
-    return wrapper
-
-@_memoize_get_file_map
-def get_file_map(node, file_map):
+# The latest version of each OSF Storage file on the nodes in %(node_ids)s, optionally only
+# those with a given sha256 and name. Versions are looked up through the sha256 index when one
+# is given.
+FILE_MAP_SQL = """
+    SELECT V.metadata ->> 'sha256', F._path, F.name, F.node_id
+    FROM osf_fileversion AS V
+      JOIN osf_basefilenode_versions AS FV ON FV.fileversion_id = V.id
+      JOIN osf_basefilenode AS F ON F.id = FV.basefilenode_id
+    WHERE F.type = 'osf.osfstoragefile'
+      AND F.node_id = ANY(%(node_ids)s)
+      {filters}
+      AND NOT EXISTS (
+        SELECT 1
+        FROM osf_basefilenode_versions AS NFV
+        WHERE NFV.basefilenode_id = F.id
+          AND NFV.fileversion_id > V.id
+      )
+    ORDER BY F.node_id, F.id
+"""
+
+def _get_file_map_rows(node_ids, sha256=None, name=None, chunk_size=1000):
+    filters = ''
+    if sha256 is not None:
+        filters += "AND V.metadata ->> 'sha256' = %(sha256)s "
+    if name is not None:
+        filters += 'AND F.name = %(name)s '
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(FILE_MAP_SQL.format(filters=filters), {
+            'node_ids': list(node_ids),
+            'sha256': sha256,
+            'name': name,
+        })
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+
+def _file_metadata(sha256, path, name):
+    return {
+        'path': path,
+        'name': name,
+        'kind': 'file',
+        'extra': {
+            'hashes': {
+                'sha256': sha256,
+            },
+        },
+    }
+
+def _get_node_and_primary_descendant_ids(node):
+    from osf.models import NodeClosure
+    return [node.id] + list(NodeClosure.objects.filter(ancestor=node).values_list('descendant_id', flat=True))
+
+def get_file_map(node):
+    """Yield (<sha256>, <file_metadata>, <node _id>) for the latest version of every OSF Storage
+    file on ``node`` and its components, read from the database in chunks.
     """
-    note:: file_map is injected implictly by the decorator; this method is called like:
+    from osf.models import AbstractNode
+    node_ids = _get_node_and_primary_descendant_ids(node)
+    guids = dict(AbstractNode.objects.filter(id__in=node_ids).values_list('id', 'guids___id'))
+    for sha256, path, name, node_id in _get_file_map_rows(node_ids):
+        yield (sha256, _file_metadata(sha256, path, name), guids[node_id])
 
-    get_file_map(node)
+def _get_registered_nodes(node):
+    """Map the _id of each node registered as part of registration ``node`` to the (id, _id)
+    of its registration.
     """
-    for (key, value) in file_map:
-        yield (key, value, node._id)
-    for child in node.nodes_primary:
-        for key, value, node_id in get_file_map(child):
-            yield (key, value, node_id)
-
-def find_registration_file(value, node):
-    from osf.models import AbstractNode as Node
+    from osf.models import AbstractNode
+    return {
+        registered_from_guid: (node_id, guid)
+        for registered_from_guid, node_id, guid in AbstractNode.objects.filter(
+            id__in=_get_node_and_primary_descendant_ids(node),
+        ).values_list('registered_from__guids___id', 'id', 'guids___id')
+    }
+
+def find_registration_file(value, node, registered_nodes=None):
     orig_sha256 = value['sha256']
     orig_name = sanitize.unescape_entities(
         value['selectedFileName'],
@@ -217,18 +256,20 @@ def find_registration_file(value, node):
             '&gt;': '>'
         }
     )
-    orig_node = value['nodeId']
-    file_map = get_file_map(node)
-    for sha256, value, node_id in file_map:
-        registered_from_id = Node.load(node_id).registered_from._id
-        if sha256 == orig_sha256 and registered_from_id == orig_node and orig_name == value['name']:
-            return value, node_id
+    if registered_nodes is None:
+        registered_nodes = _get_registered_nodes(node)
+    if value['nodeId'] not in registered_nodes:
+        return None, None
+    node_id, guid = registered_nodes[value['nodeId']]
+    for sha256, path, name, _ in _get_file_map_rows([node_id], sha256=orig_sha256, name=orig_name):
+        return _file_metadata(sha256, path, name), guid
     return None, None
 
 def find_registration_files(values, node):
     ret = []
+    registered_nodes = _get_registered_nodes(node)
     for i in range(len(values.get('extra', []))):
-        ret.append(find_registration_file(values['extra'][i], node) + (i,))
+        ret.append(find_registration_file(values['extra'][i], node, registered_nodes=registered_nodes) + (i,))
     return ret
 
 def get_title_for_question(schema, path):
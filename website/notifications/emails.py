@@ -92,22 +92,28 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
-    for recipient_id in recipient_ids:
-        if recipient_id == user._id:
-            continue
-        recipient = OSFUser.load(recipient_id)
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
-        message = mails.render_message(template, **context)
-
-        digest = NotificationDigest(
+    recipients = OSFUser.objects.filter(
+        guids___id__in=set(recipient_ids)
+    ).exclude(id=user.id).only('id', 'timezone', 'locale').distinct()
+
+    # Messages differ between recipients only by the localized timestamp, so render
+    # once per distinct (timezone, locale) pair.
+    messages = {}
+    digests = []
+    for recipient in recipients:
+        key = (recipient.timezone, recipient.locale)
+        if key not in messages:
+            context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
+            messages[key] = mails.render_message(template, **context)
+        digests.append(NotificationDigest(
             timestamp=timestamp,
             send_type=notification_type,
             event=event,
             user=recipient,
-            message=message,
+            message=messages[key],
             node_lineage=node_lineage_ids
-        )
-        digest.save()
+        ))
+    NotificationDigest.objects.bulk_create(digests)
 
 
 def compile_subscriptions(node, event_type, event=None, level=0):
@@ -8,10 +8,30 @@ from osf.models import (
 )
 from framework.celery_tasks import app as celery_app
 from framework.sentry import log_exception
-from modularodm import Q
 from website import mails
 from website.notifications.utils import NotificationsDict
 
+USERS_EMAILS_CHUNK_SIZE = 500
+
+USERS_EMAILS_SQL = """
+    SELECT json_build_object(
+            'user_id', osf_guid._id,
+            'info', json_agg(
+                json_build_object(
+                    'message', nd.message,
+                    'node_lineage', nd.node_lineage,
+                    '_id', nd._id
+                )
+            )
+        )
+    FROM osf_notificationdigest AS nd
+      LEFT JOIN osf_guid ON nd.user_id = osf_guid.object_id
+    WHERE send_type = %s
+    AND osf_guid.content_type_id = (SELECT id FROM django_content_type WHERE model = 'osfuser')
+    GROUP BY osf_guid.id
+    ORDER BY osf_guid.id ASC
+    """
+
 
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
@@ -20,26 +40,28 @@ def send_users_email(send_type):
     :param send_type
     :return:
     """
-    grouped_emails = get_users_emails(send_type)
-    if not grouped_emails:
-        return
-    for group in grouped_emails:
-        user = User.load(group['user_id'])
-        if not user:
-            log_exception()
-            continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
-        sorted_messages = group_by_node(info)
-        if sorted_messages:
-            mails.send_mail(
-                to_addr=user.username,
-                mimetype='html',
-                mail=mails.DIGEST,
-                name=user.fullname,
-                message=sorted_messages,
-                callback=remove_notifications(email_notification_ids=notification_ids)
-            )
+    for groups in iter_users_emails(send_type):
+        users = {
+            user._id: user
+            for user in User.objects.filter(guids___id__in=[group['user_id'] for group in groups]).prefetch_related('guids')
+        }
+        for group in groups:
+            user = users.get(group['user_id'])
+            if not user:
+                log_exception()
+                continue
+            info = group['info']
+            notification_ids = [message['_id'] for message in info]
+            sorted_messages = group_by_node(info)
+            if sorted_messages:
+                mails.send_mail(
+                    to_addr=user.username,
+                    mimetype='html',
+                    mail=mails.DIGEST,
+                    name=user.fullname,
+                    message=sorted_messages,
+                    callback=remove_notifications(email_notification_ids=notification_ids)
+                )
 
 
 def get_users_emails(send_type):
@@ -62,33 +84,20 @@ def get_users_emails(send_type):
                 'user_id': ...
               }]
     """
+    return [group for groups in iter_users_emails(send_type) for group in groups]
 
-    sql = """
-    SELECT json_build_object(
-            'user_id', osf_guid._id,
-            'info', json_agg(
-                json_build_object(
-                    'message', nd.message,
-                    'node_lineage', nd.node_lineage,
-                    '_id', nd._id
-                )
-            )
-        )
-    FROM osf_notificationdigest AS nd
-      LEFT JOIN osf_guid ON nd.user_id = osf_guid.object_id
-    WHERE send_type = %s
-    AND osf_guid.content_type_id = (SELECT id FROM django_content_type WHERE model = 'osfuser')
-    GROUP BY osf_guid.id
-    ORDER BY osf_guid.id ASC
-    """
 
-    with connection.cursor() as cursor:
-        cursor.execute(sql, [send_type, ])
-        rows = list(sum(cursor.fetchall(), ()))
-        if len(rows) > 0:
-            return rows
-        else:
-            return []
+def iter_users_emails(send_type, chunk_size=USERS_EMAILS_CHUNK_SIZE):
+    """Like ``get_users_emails``, but yields lists of at most ``chunk_size`` users' emails read
+    from a server-side cursor, so the whole result never has to be held in memory.
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(USERS_EMAILS_SQL, [send_type, ])
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [row[0] for row in rows]
 
 
 def group_by_node(notifications):
@@ -109,5 +118,4 @@ def remove_notifications(email_notification_ids=None):
     :param email_notification_ids:
     :return:
     """
-    for email_id in email_notification_ids:
-        NotificationDigest.remove(Q('_id', 'eq', email_id))
+    NotificationDigest.objects.filter(_id__in=email_notification_ids).delete()
@@ -1,12 +1,15 @@
 import logging
 import urlparse
+from collections import deque
 
-import requests
+from django.core.paginator import Paginator
+from django.db.models import F, Prefetch
 
 from framework.celery_tasks import app as celery_app
+from framework.celery_tasks.handlers import enqueue_task, in_request_context, queue as celery_queue
 
 from website import settings
-from website.util.share import GraphNode, format_contributor
+from website.util.share import GraphNode, ShareBatcher, format_contributor
 
 from website.identifiers.utils import request_identifiers_from_ezid, get_ezid_client, build_ezid_metadata, parse_identifiers
 
@@ -14,7 +17,7 @@ logger = logging.getLogger(__name__)
 
 
 @celery_app.task(ignore_results=True)
-def on_preprint_updated(preprint_id, update_share=False):
+def on_preprint_updated(preprint_id):
     # WARNING: Only perform Read-Only operations in an asynchronous task, until Repeatable Read/Serializable
     # transactions are implemented in View and Task application layers.
     from osf.models import PreprintService
@@ -24,32 +27,97 @@ def on_preprint_updated(preprint_id, update_share=False):
         status = 'public' if preprint.node.is_public else 'unavailable'
         update_ezid_metadata_on_change(preprint, status=status)
 
-    if settings.SHARE_URL and update_share:
-        if not preprint.provider.access_token:
-            raise ValueError('No access_token for {}. Unable to send {} to SHARE.'.format(preprint.provider, preprint))
-        resp = requests.post('{}api/v2/normalizeddata/'.format(settings.SHARE_URL), json={
-            'data': {
-                'type': 'NormalizedData',
-                'attributes': {
-                    'tasks': [],
-                    'raw': None,
-                    'data': {'@graph': format_preprint(preprint)}
-                }
-            }
-        }, headers={'Authorization': 'Bearer {}'.format(preprint.provider.access_token), 'Content-Type': 'application/vnd.api+json'})
-        logger.debug(resp.content)
-        resp.raise_for_status()
+
+@celery_app.task(ignore_results=True)
+def update_share_preprints(preprint_ids):
+    """Send the preprints with ``_id``s ``preprint_ids`` to SHARE in batches.
+
+    Unlike on_preprint_updated, this task writes: it records the preprints SHARE didn't accept as
+    FailedShareSubmissions. Nothing but this pipeline writes those rows, so the task can't race with
+    the request that queued it.
+    """
+    from osf.models import PreprintService
+    send_preprints_to_share(PreprintService.objects.filter(guids___id__in=preprint_ids))
+
+
+def enqueue_share_update(preprint_ids):
+    """Send the preprints with ``_id``s ``preprint_ids`` to SHARE once the request is over. Every
+    preprint updated by a request is added to the same update_share_preprints task, so a bulk edit
+    is sent in batches instead of one task per preprint. Outside of a request, they are sent at once.
+    """
+    if not settings.SHARE_URL or not preprint_ids:
+        return
+    if in_request_context():
+        for signature in celery_queue():
+            if signature.task == update_share_preprints.name:
+                queued = signature.args[0]
+                queued.extend(preprint_id for preprint_id in preprint_ids if preprint_id not in queued)
+                return
+    enqueue_task(update_share_preprints.s(list(preprint_ids)))
+
+
+def prefetch_share_data(preprints):
+    """Return the PreprintService queryset ``preprints`` with everything ``format_preprint`` reads prefetched."""
+    from osf.models import Contributor
+    contributors = Contributor.objects.select_related('user').prefetch_related(
+        'user__guids', 'user__emails', 'user__affiliated_institutions'
+    ).order_by('_order')
+    return preprints.select_related('node', 'node__preprint_file', 'provider').prefetch_related(
+        'guids',
+        'identifiers',
+        'subjects__bepress_subject',
+        'node__tags',
+        'node__affiliated_institutions',
+        Prefetch('node__contributor_set', queryset=contributors),
+    )
+
+
+def send_preprints_to_share(preprints):
+    """Send the PreprintService queryset ``preprints`` to SHARE, batched per provider token. Preprints
+    SHARE doesn't accept are recorded as FailedShareSubmissions, which are dropped once they're sent.
+
+    :return: the ShareBatcher used, with the ids of the preprints sent and failed
+    """
+    from osf.models import FailedShareSubmission
+    batcher = ShareBatcher()
+    paginator = Paginator(prefetch_share_data(preprints.filter(node__isnull=False)).order_by('id'), settings.SHARE_BATCH_SIZE)
+    for page_num in paginator.page_range:
+        for preprint in paginator.page(page_num).object_list:
+            if not preprint.provider or not preprint.provider.access_token:
+                logger.error('No access_token for {}. Unable to send {} to SHARE.'.format(preprint.provider, preprint))
+                continue
+            batcher.add(preprint.provider.access_token, preprint.id, format_preprint(preprint))
+    batcher.flush()
+
+    FailedShareSubmission.objects.filter(preprint_id__in=batcher.sent).delete()
+    for preprint_id, error in batcher.failed:
+        failure, created = FailedShareSubmission.objects.get_or_create(
+            preprint_id=preprint_id,
+            defaults={'status_code': error.status_code, 'error': unicode(error)}
+        )
+        if not created:
+            failure.status_code = error.status_code
+            failure.error = unicode(error)
+            failure.attempts = F('attempts') + 1
+            failure.save()
+    logger.info('Sent {} preprints to SHARE, {} failed'.format(len(batcher.sent), len(batcher.failed)))
+    return batcher
+
 
 def format_preprint(preprint):
+    node = preprint.node
+    tags = [tag.name for tag in node.tags.all()]
+    identifiers = {identifier.category: identifier.value for identifier in preprint.identifiers.all()}
+
     preprint_graph = GraphNode('preprint', **{
-        'title': preprint.node.title,
-        'description': preprint.node.description or '',
+        'title': node.title,
+        'description': node.description or '',
         'is_deleted': (
             not preprint.is_published or
-            not preprint.node.is_public or
-            preprint.node.is_preprint_orphan or
-            preprint.node.tags.filter(name='qatest').exists() or
-            preprint.node.is_deleted
+            not node.is_public or
+            node.is_preprint_orphan or
+            'qatest' in tags or
+            node.is_deleted
         ),
         'date_updated': preprint.date_modified.isoformat(),
         'date_published': preprint.date_published.isoformat() if preprint.date_published else None
@@ -60,8 +128,8 @@ def format_preprint(preprint):
         GraphNode('workidentifier', creative_work=preprint_graph, uri=urlparse.urljoin(settings.DOMAIN, preprint._id + '/'))
     ]
 
-    if preprint.get_identifier('doi'):
-        to_visit.append(GraphNode('workidentifier', creative_work=preprint_graph, uri='http://dx.doi.org/{}'.format(preprint.get_identifier('doi').value)))
+    if identifiers.get('doi'):
+        to_visit.append(GraphNode('workidentifier', creative_work=preprint_graph, uri='http://dx.doi.org/{}'.format(identifiers['doi'])))
 
     if preprint.provider.domain_redirect_enabled:
         to_visit.append(GraphNode('workidentifier', creative_work=preprint_graph, uri=preprint.absolute_url))
@@ -74,7 +142,7 @@ def format_preprint(preprint):
 
     preprint_graph.attrs['tags'] = [
         GraphNode('throughtags', creative_work=preprint_graph, tag=GraphNode('tag', name=tag))
-        for tag in preprint.node.tags.values_list('name', flat=True) if tag
+        for tag in tags if tag
     ]
 
     preprint_graph.attrs['subjects'] = [
@@ -82,23 +150,22 @@ def format_preprint(preprint):
         for subject in set(s.bepress_text for s in preprint.subjects.all())
     ]
 
-    to_visit.extend(format_contributor(preprint_graph, user, preprint.node.get_visible(user), i) for i, user in enumerate(preprint.node.contributors))
-    to_visit.extend(GraphNode('AgentWorkRelation', creative_work=preprint_graph, agent=GraphNode('institution', name=institution))
-                    for institution in preprint.node.affiliated_institutions.values_list('name', flat=True))
+    to_visit.extend(format_contributor(preprint_graph, contributor.user, contributor.visible, i) for i, contributor in enumerate(node.contributor_set.all()))
+    to_visit.extend(GraphNode('AgentWorkRelation', creative_work=preprint_graph, agent=GraphNode('institution', name=institution.name))
+                    for institution in node.affiliated_institutions.all())
 
     visited = set()
+    to_visit = deque(to_visit)
     to_visit.extend(preprint_graph.get_related())
 
-    while True:
-        if not to_visit:
-            break
-        n = to_visit.pop(0)
+    while to_visit:
+        n = to_visit.popleft()
         if n in visited:
             continue
         visited.add(n)
-        to_visit.extend(list(n.get_related()))
+        to_visit.extend(n.get_related())
 
-    return [node.serialize() for node in visited]
+    return [graph_node.serialize() for graph_node in visited]
 
 
 @celery_app.task(ignore_results=True)
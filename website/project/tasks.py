@@ -30,7 +30,7 @@ def on_node_updated(node_id, user_id, first_save, saved_fields, request_headers=
         need_update = False
 
     if need_update:
-        node.update_search()
+        node.update_search(saved_fields=saved_fields)
 
         if settings.SHARE_URL:
             if not settings.SHARE_API_TOKEN:
@@ -61,6 +61,17 @@ def on_node_updated(node_id, user_id, first_save, saved_fields, request_headers=
                 resp.raise_for_status()
 
 
+@celery_app.task(ignore_result=False)
+def fork_node(node_id, user_id, title=None):
+    """Fork a node in the background. Returns the ``_id`` of the fork."""
+    from osf.utils.auth import Auth
+    AbstractNode = apps.get_model('osf.AbstractNode')
+    OSFUser = apps.get_model('osf.OSFUser')
+    node = AbstractNode.load(node_id)
+    user = OSFUser.load(user_id)
+    return node.fork_node(Auth(user=user), title=title)._id
+
+
 def on_registration_updated(node):
     resp = requests.post('{}api/v2/normalizeddata/'.format(settings.SHARE_URL), json={
         'data': {
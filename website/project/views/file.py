@@ -20,7 +20,10 @@ def collect_file_trees(auth, node, **kwargs):
 
 @must_be_contributor_or_public
 def grid_data(auth, node, **kwargs):
-    """View that returns the formatted data for rubeus.js/hgrid
+    """View that returns the formatted data for rubeus.js/hgrid. Pass ``depth`` to only
+    include that many levels of components, e.g. ``depth=1`` to expand one component at a time.
     """
     data = request.args.to_dict()
-    return {'data': rubeus.to_hgrid(node, auth, **data)}
+    data.pop('depth', None)
+    depth = request.args.get('depth', type=int)
+    return {'data': rubeus.to_hgrid(node, auth, depth=depth, **data)}
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
 import httplib as http
 import math
@@ -8,6 +9,7 @@ from flask import request
 from modularodm import Q
 from modularodm.exceptions import ModularOdmException, ValidationError
 from django.apps import apps
+from django.db import models
 from django.db.models import Count
 
 from framework import status
@@ -16,6 +18,7 @@ from framework.flask import redirect
 from framework.auth.decorators import must_be_logged_in, collect_auth
 from framework.exceptions import HTTPError
 from osf.models.nodelog import NodeLog
+from osf.utils.permission_cache import PermissionCache, get_permission_cache
 
 from website import language
 
@@ -838,64 +841,113 @@ def _get_readable_descendants(auth, node, permission=None):
 
 def node_child_tree(user, nodes):
     """ Format data to test for node privacy settings for use in treebeard.
+
+    The component trees below ``nodes`` are fetched with their contributors, affiliated
+    institutions and ``user``'s permissions in a fixed number of queries and assembled in memory.
+
     :param user: modular odm User object
     :param nodes: list of parent project node objects
     :return: treebeard-formatted data
     """
-    items = []
+    Contributor = apps.get_model('osf.Contributor')
+    NodeClosure = apps.get_model('osf.NodeClosure')
+    NodeRelation = apps.get_model('osf.NodeRelation')
 
     for node in nodes:
         assert node, '{} is not a valid Node.'.format(node._id)
+    root_ids = [node.pk for node in nodes]
+    node_ids = set(root_ids).union(
+        NodeClosure.objects.filter(ancestor_id__in=root_ids).values_list('descendant_id', flat=True)
+    )
+    nodes_by_id = {node.pk: node for node in Node.objects.filter(pk__in=node_ids, is_deleted=False).include('guids')}
+    nodes_by_id.update({node.pk: node for node in nodes})
+
+    children = collections.defaultdict(list)
+    parents = {}
+    relations = (NodeRelation.objects.filter(is_node_link=False)
+                 .filter(models.Q(parent_id__in=node_ids) | models.Q(child_id__in=node_ids))
+                 .order_by('parent_id', '_order')
+                 .values_list('parent_id', 'child_id'))
+    for parent_id, child_id in relations:
+        if parent_id in node_ids and child_id in nodes_by_id:
+            children[parent_id].append(child_id)
+        parents[child_id] = parent_id
+
+    contributors = collections.defaultdict(list)
+    visible_contributors = collections.defaultdict(list)
+    contributor_rows = (Contributor.objects.filter(node_id__in=nodes_by_id)
+                        .order_by('node_id', '_order')
+                        .values_list('node_id', 'user__guids___id', 'admin', 'visible', 'user__date_confirmed'))
+    for node_id, user_id, admin, visible, date_confirmed in contributor_rows:
+        contributors[node_id].append({
+            'id': user_id,
+            'is_admin': admin,
+            'is_confirmed': bool(date_confirmed)
+        })
+        if visible:
+            visible_contributors[node_id].append(user_id)
+
+    institutions = collections.defaultdict(list)
+    institution_rows = (Node.affiliated_institutions.through.objects.filter(abstractnode_id__in=nodes_by_id)
+                        .order_by('id')
+                        .values_list('abstractnode_id', 'institution_id', 'institution__name'))
+    for node_id, institution_id, name in institution_rows:
+        institutions[node_id].append({
+            'id': institution_id,
+            'name': name
+        })
 
-        can_read = node.has_permission(user, READ)
-        can_read_children = node.has_permission_on_children(user, 'read')
-        if not can_read and not can_read_children:
-            continue
-
-        contributors = []
-        for contributor in node.contributors:
-            contributors.append({
-                'id': contributor._id,
-                'is_admin': node.has_permission(contributor, ADMIN),
-                'is_confirmed': contributor.is_confirmed
-            })
+    permissions = get_permission_cache() or PermissionCache()
+    permissions.prime(user.pk, set(nodes_by_id) | set(parents.values()))
 
-        affiliated_institutions = [{
-            'id': affiliated_institution.pk,
-            'name': affiliated_institution.name
-        } for affiliated_institution in node.affiliated_institutions.all()]
-
-        children = node.get_nodes(**{'is_deleted': False, 'is_node_link': False})
-        children_tree = []
-        # List project/node if user has at least 'read' permissions (contributor or admin viewer) or if
-        # user is contributor on a component of the project/node
-        children_tree.extend(node_child_tree(user, children))
-
-        item = {
-            'node': {
-                'id': node._id,
-                'url': node.url if can_read else '',
-                'title': node.title if can_read else 'Private Project',
-                'is_public': node.is_public,
-                'contributors': contributors,
-                'visible_contributors': list(node.visible_contributor_ids),
-                'is_admin': node.has_permission(user, ADMIN),
-                'affiliated_institutions': affiliated_institutions
-            },
-            'user_id': user._id,
-            'children': children_tree,
-            'kind': 'folder' if not node.parent_node or not node.parent_node.has_permission(user, 'read') else 'node',
-            'nodeType': node.project_or_component,
-            'category': node.category,
-            'permissions': {
-                'view': can_read,
-                'is_admin': node.has_permission(user, 'read')
-            }
-        }
+    def has_permission(node_id, permission):
+        if permissions.has_permission(user.pk, node_id, permission):
+            return True
+        return permission == READ and permissions.is_admin_parent(user.pk, node_id)
+
+    readable_below = {}
 
-        items.append(item)
+    def has_read_permission_on_children(node_id):
+        if node_id not in readable_below:
+            readable_below[node_id] = has_permission(node_id, READ) or any(
+                has_read_permission_on_children(child_id) for child_id in children[node_id]
+            )
+        return readable_below[node_id]
+
+    def serialize(node_ids):
+        items = []
+        for node_id in node_ids:
+            node = nodes_by_id[node_id]
+            can_read = has_permission(node_id, READ)
+            # List project/node if user has at least 'read' permissions (contributor or admin viewer) or if
+            # user is contributor on a component of the project/node
+            if not has_read_permission_on_children(node_id):
+                continue
+            parent_id = parents.get(node_id)
+            items.append({
+                'node': {
+                    'id': node._id,
+                    'url': node.url if can_read else '',
+                    'title': node.title if can_read else 'Private Project',
+                    'is_public': node.is_public,
+                    'contributors': contributors[node_id],
+                    'visible_contributors': visible_contributors[node_id],
+                    'is_admin': has_permission(node_id, ADMIN),
+                    'affiliated_institutions': institutions[node_id]
+                },
+                'user_id': user._id,
+                'children': serialize(children[node_id]),
+                'kind': 'folder' if not parent_id or not has_permission(parent_id, READ) else 'node',
+                'nodeType': 'project' if not parent_id else 'component',
+                'category': node.category,
+                'permissions': {
+                    'view': can_read,
+                    'is_admin': can_read
+                }
+            })
+        return items
 
-    return items
+    return serialize(root_ids)
 
 
 @must_be_logged_in
@@ -3,11 +3,14 @@
 
 from __future__ import division
 
+import contextlib
 import copy
 import functools
 import logging
 import math
 import re
+import threading
+import time
 import unicodedata
 from framework import sentry
 
@@ -18,8 +21,6 @@ from django.core.paginator import Paginator
 from elasticsearch import (ConnectionError, Elasticsearch, NotFoundError,
                            RequestError, TransportError, helpers)
 from framework.celery_tasks import app as celery_app
-from framework.mongo.utils import paginated
-from modularodm import Q
 from osf.models import AbstractNode as Node
 from osf.models import OSFUser as User
 from osf.models import BaseFileNode
@@ -127,6 +128,92 @@ def requires_search(func):
     return wrapped
 
 
+class BulkIndexer(object):
+    """Buffers index, update and delete actions and sends them to elasticsearch in
+    ``helpers.bulk`` batches of ``ELASTIC_BULK_CHUNK_SIZE``. Documents become searchable
+    on the index's refresh interval, unless ``ELASTIC_REFRESH_ON_WRITE`` is set.
+
+    Keeps running totals of the documents it has written, which are logged on every flush.
+    """
+
+    def __init__(self, chunk_size=None, refresh=None):
+        self.chunk_size = chunk_size or settings.ELASTIC_BULK_CHUNK_SIZE
+        self.refresh = settings.ELASTIC_REFRESH_ON_WRITE if refresh is None else refresh
+        self.actions = []
+        self.indexed = 0
+        self.deleted = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    def add(self, action):
+        self.actions.append(action)
+        if len(self.actions) >= self.chunk_size:
+            self.flush()
+
+    def index(self, index, doc_type, id_, body):
+        self.add({'_op_type': 'index', '_index': index, '_type': doc_type, '_id': id_, '_source': body})
+
+    def delete(self, index, doc_type, id_):
+        self.add({'_op_type': 'delete', '_index': index, '_type': doc_type, '_id': id_})
+
+    @property
+    def rate(self):
+        """Documents written per second."""
+        return (self.indexed + self.deleted) / self.elapsed if self.elapsed else 0.0
+
+    @requires_search
+    def flush(self):
+        if not self.actions:
+            return
+        actions, self.actions = self.actions, []
+
+        start = time.time()
+        _, failed = helpers.bulk(
+            client(), actions, chunk_size=self.chunk_size, raise_on_error=False, refresh=self.refresh
+        )
+        self.elapsed += time.time() - start
+
+        errors = []
+        failed_deletes = 0
+        for item in failed:
+            op_type, result = item.items()[0]
+            if op_type == 'delete':
+                failed_deletes += 1
+                if result.get('status') == 404:
+                    continue  # Was not in the index
+            errors.append(item)
+            logger.error('Failed to {} search document: {}'.format(op_type, result))
+
+        deletes = sum(1 for action in actions if action['_op_type'] == 'delete')
+        self.deleted += deletes - failed_deletes
+        self.indexed += len(actions) - deletes - (len(failed) - failed_deletes)
+        self.errors += len(errors)
+        logger.info('Indexed {} and deleted {} search documents ({} errors) in {:.2f}s, {:.1f} documents/s'.format(
+            self.indexed, self.deleted, self.errors, self.elapsed, self.rate
+        ))
+
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def bulk_indexer(**kwargs):
+    """Collect every search update made within the block into one ``BulkIndexer``, which is
+    flushed on exit. Nested blocks share the outermost indexer.
+    """
+    indexer = getattr(_local, 'bulk_indexer', None)
+    if indexer is not None:
+        yield indexer
+        return
+
+    indexer = _local.bulk_indexer = BulkIndexer(**kwargs)
+    try:
+        yield indexer
+    finally:
+        _local.bulk_indexer = None
+    indexer.flush()
+
+
 @requires_search
 def get_aggregations(query, doc_type):
     query['aggregations'] = {
@@ -295,6 +382,15 @@ def load_parent(parent_id):
 
 COMPONENT_CATEGORIES = set(settings.NODE_CATEGORY_MAP.keys())
 
+# Node fields that are copied into, or decide the visibility of, the node's file documents
+FILE_SEARCH_UPDATE_FIELDS = {
+    'title',
+    'is_public',
+    'is_deleted',
+    'archiving',
+    'retraction',
+}
+
 def get_doctype_from_node(node):
     if node.is_registration:
         return 'registration'
@@ -307,11 +403,11 @@ def get_doctype_from_node(node):
         return node.category
 
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
-def update_node_async(self, node_id, index=None, bulk=False):
+def update_node_async(self, node_id, index=None, bulk=False, saved_fields=None):
     AbstractNode = apps.get_model('osf.AbstractNode')
     node = AbstractNode.load(node_id)
     try:
-        update_node(node=node, index=index, bulk=bulk, async=True)
+        update_node(node=node, index=index, bulk=bulk, async=True, saved_fields=saved_fields)
     except Exception as exc:
         self.retry(exc=exc)
 
@@ -375,21 +471,49 @@ def serialize_node(node, category):
     return elastic_document
 
 @requires_search
-def update_node(node, index=None, bulk=False, async=False):
-    from addons.osfstorage.models import OsfStorageFile
+def update_node(node, index=None, bulk=False, async=False, saved_fields=None):
+    """Index ``node`` and its OsfStorage files. If ``saved_fields`` is given, files are only
+    re-indexed when one of ``FILE_SEARCH_UPDATE_FIELDS`` changed.
+    """
     index = index or INDEX
-    for file_ in paginated(OsfStorageFile, Q('node', 'eq', node)):
-        update_file(file_, index=index)
+    with bulk_indexer() as indexer:
+        if saved_fields is None or FILE_SEARCH_UPDATE_FIELDS.intersection(saved_fields):
+            update_node_files(node, index=index)
 
-    if node.is_deleted or not node.is_public or node.archiving or (node.is_spammy and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH):
-        delete_doc(node._id, node, index=index)
-    else:
-        category = get_doctype_from_node(node)
-        elastic_document = serialize_node(node, category)
-        if bulk:
-            return elastic_document
+        if node.is_deleted or not node.is_public or node.archiving or (node.is_spammy and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH):
+            delete_doc(node._id, node, index=index)
         else:
-            client().index(index=index, doc_type=category, id=node._id, body=elastic_document, refresh=True)
+            category = get_doctype_from_node(node)
+            elastic_document = serialize_node(node, category)
+            if bulk:
+                return elastic_document
+            else:
+                indexer.index(index, category, node._id, elastic_document)
+
+@requires_search
+def update_node_files(node, index=None):
+    """Queue an index or delete action for every OsfStorage file of ``node``. Files are
+    loaded a page at a time along with their tags and guids.
+    """
+    from addons.osfstorage.models import OsfStorageFile
+    index = index or INDEX
+    files = OsfStorageFile.objects.filter(node=node).order_by('id')
+
+    with bulk_indexer() as indexer:
+        if not is_node_file_searchable(node):
+            for file_id in files.values_list('_id', flat=True).iterator():
+                indexer.delete(index, 'file', file_id)
+            return
+
+        node_fields = serialize_file_node(node)
+        paginator = Paginator(files.prefetch_related('tags', 'guids'), settings.ELASTIC_BULK_CHUNK_SIZE)
+        for page_num in paginator.page_range:
+            for file_ in paginator.page(page_num).object_list:
+                # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
+                if not file_.name:
+                    indexer.delete(index, 'file', file_._id)
+                else:
+                    indexer.index(index, 'file', file_._id, serialize_file(file_, node_fields))
 
 def bulk_update_nodes(serialize, nodes, index=None):
     """Updates the list of input projects
@@ -400,20 +524,18 @@ def bulk_update_nodes(serialize, nodes, index=None):
     :return:
     """
     index = index or INDEX
-    actions = []
-    for node in nodes:
-        serialized = serialize(node)
-        if serialized:
-            actions.append({
-                '_op_type': 'update',
-                '_index': index,
-                '_id': node._id,
-                '_type': get_doctype_from_node(node),
-                'doc': serialized,
-                'doc_as_upsert': True,
-            })
-    if actions:
-        return helpers.bulk(client(), actions)
+    with bulk_indexer() as indexer:
+        for node in nodes:
+            serialized = serialize(node)
+            if serialized:
+                indexer.add({
+                    '_op_type': 'update',
+                    '_index': index,
+                    '_id': node._id,
+                    '_type': get_doctype_from_node(node),
+                    'doc': serialized,
+                    'doc_as_upsert': True,
+                })
 
 def serialize_contributors(node):
     return {
@@ -442,10 +564,8 @@ def update_user(user, index=None):
 
     index = index or INDEX
     if not user.is_active:
-        try:
-            client().delete(index=index, doc_type='user', id=user._id, refresh=True, ignore=[404])
-        except NotFoundError:
-            pass
+        with bulk_indexer() as indexer:
+            indexer.delete(index, 'user', user._id)
         return
 
     names = dict(
@@ -482,75 +602,87 @@ def update_user(user, index=None):
         'boost': 2,  # TODO(fabianvf): Probably should make this a constant or something
     }
 
-    client().index(index=index, doc_type='user', body=user_doc, id=user._id, refresh=True)
+    with bulk_indexer() as indexer:
+        indexer.index(index, 'user', user._id, user_doc)
 
-@requires_search
-def update_file(file_, index=None, delete=False):
-    index = index or INDEX
+def is_node_file_searchable(node):
+    return node.is_public and not node.is_deleted and not node.archiving
 
-    # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
-    if not file_.name or not file_.node.is_public or delete or file_.node.is_deleted or file_.node.archiving:
-        client().delete(
-            index=index,
-            doc_type='file',
-            id=file_._id,
-            refresh=True,
-            ignore=[404]
-        )
-        return
+def serialize_file_node(node):
+    """The fields of a file document that come from the file's node, so they can be
+    serialized once for all of a node's files.
+    """
+    return {
+        # We build URLs manually here so that this function can be
+        # run outside of a Flask request context (e.g. in a celery task)
+        'node_url': '/{node_id}/'.format(node_id=node._id),
+        'node_title': node.title,
+        'parent_id': node.parent_node._id if node.parent_node else None,
+        'is_registration': node.is_registration,
+        'is_retracted': node.is_retracted,
+    }
 
-    # We build URLs manually here so that this function can be
-    # run outside of a Flask request context (e.g. in a celery task)
-    file_deep_url = '/{node_id}/files/{provider}{path}/'.format(
-        node_id=file_.node._id,
+def serialize_file(file_, node_fields=None):
+    node_fields = node_fields or serialize_file_node(file_.node)
+    file_deep_url = '{node_url}files/{provider}{path}/'.format(
+        node_url=node_fields['node_url'],
         provider=file_.provider,
         path=file_.path,
     )
-    node_url = '/{node_id}/'.format(node_id=file_.node._id)
 
     guid_url = None
-    file_guid = file_.get_guid(create=False)
+    # Guids are ordered newest first, as in ``get_guid``. Uses prefetched guids when present.
+    file_guid = next(iter(file_.guids.all()), None)
     if file_guid:
         guid_url = '/{file_guid}/'.format(file_guid=file_guid._id)
     file_doc = {
         'id': file_._id,
         'deep_url': file_deep_url,
         'guid_url': guid_url,
-        'tags': list(file_.tags.filter(system=False).values_list('name', flat=True)),
+        'tags': [tag.name for tag in file_.tags.all() if not tag.system],
         'name': file_.name,
         'category': 'file',
-        'node_url': node_url,
-        'node_title': file_.node.title,
-        'parent_id': file_.node.parent_node._id if file_.node.parent_node else None,
-        'is_registration': file_.node.is_registration,
-        'is_retracted': file_.node.is_retracted,
         'extra_search_terms': clean_splitters(file_.name),
     }
+    file_doc.update(node_fields)
+    return file_doc
 
-    client().index(
-        index=index,
-        doc_type='file',
-        body=file_doc,
-        id=file_._id,
-        refresh=True
-    )
+@requires_search
+def update_file(file_, index=None, delete=False):
+    index = index or INDEX
+
+    with bulk_indexer() as indexer:
+        # TODO: Can remove 'not file_.name' if we remove all base file nodes with name=None
+        if not file_.name or delete or not is_node_file_searchable(file_.node):
+            indexer.delete(index, 'file', file_._id)
+        else:
+            indexer.index(index, 'file', file_._id, serialize_file(file_))
+
+@requires_search
+def update_files(files, index=None):
+    """Update the documents of many files with bulk requests."""
+    index = index or INDEX
+    with bulk_indexer():
+        for file_ in files:
+            update_file(file_, index=index)
 
 @requires_search
 def update_institution(institution, index=None):
     index = index or INDEX
     id_ = institution._id
-    if institution.is_deleted:
-        client().delete(index=index, doc_type='institution', id=id_, refresh=True, ignore=[404])
-    else:
-        institution_doc = {
-            'id': id_,
-            'url': '/institutions/{}/'.format(institution._id),
-            'logo_path': institution.logo_path,
-            'category': 'institution',
-            'name': institution.name,
-        }
+    with bulk_indexer() as indexer:
+        if institution.is_deleted:
+            indexer.delete(index, 'institution', id_)
+        else:
+            institution_doc = {
+                'id': id_,
+                'url': '/institutions/{}/'.format(institution._id),
+                'logo_path': institution.logo_path,
+                'category': 'institution',
+                'name': institution.name,
+            }
 
-        client().index(index=index, doc_type='institution', body=institution_doc, id=id_, refresh=True)
+            indexer.index(index, 'institution', id_, institution_doc)
 
 @requires_search
 def delete_all():
@@ -619,7 +751,8 @@ def create_index(index=None):
 def delete_doc(elastic_document_id, node, index=None, category=None):
     index = index or INDEX
     category = category or 'registration' if node.is_registration else node.project_or_component
-    client().delete(index=index, doc_type=category, id=elastic_document_id, refresh=True, ignore=[404])
+    with bulk_indexer() as indexer:
+        indexer.delete(index, category, elastic_document_id)
 
 
 @requires_search
@@ -28,7 +28,8 @@ def search(query, index=None, doc_type=None, raw=None):
 def update_node(node, index=None, bulk=False, async=True, saved_fields=None):
     kwargs = {
         'index': index,
-        'bulk': bulk
+        'bulk': bulk,
+        'saved_fields': list(saved_fields) if saved_fields is not None else None,
     }
     if async:
         node_id = node._id
@@ -82,6 +83,11 @@ def update_file(file_, index=None, delete=False):
     index = index or settings.ELASTIC_INDEX
     search_engine.update_file(file_, index=index, delete=delete)
 
+@requires_search
+def update_files(files, index=None):
+    index = index or settings.ELASTIC_INDEX
+    search_engine.update_files(files, index=index)
+
 @requires_search
 def update_institution(institution, index=None):
     index = index or settings.ELASTIC_INDEX
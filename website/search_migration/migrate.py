@@ -3,23 +3,39 @@
 '''Migration script for Search-enabled Models.'''
 from __future__ import absolute_import
 
+import functools
+import json
 import logging
+import multiprocessing
+import os
+import tempfile
 
+from dateutil.parser import parse as parse_date
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, Q as DQ
 from django.utils import timezone
 from elasticsearch import helpers
 from modularodm.query.querydialect import DefaultQueryDialect as Q
 
 import website.search.search as search
+from addons.osfstorage.models import OsfStorageFile
 from framework.mongo.utils import paginated
 from scripts import utils as script_utils
-from osf.models import OSFUser as User, Institution, AbstractNode as Node
+from osf.models import OSFUser as User, Institution, AbstractNode as Node, TrashedFile
 from website import settings
 from website.app import init_app
-from website.search.elastic_search import client as es_client
+from website.search import elastic_search
+from website.search.elastic_search import bulk_indexer, client as es_client
 from website.search.search import update_institution
 
 logger = logging.getLogger(__name__)
 
+# Rows per id-range partition of a parallel reindex
+PARTITION_SIZE = 10000
+# Rows loaded from the database at a time within a partition
+PAGE_SIZE = 200
+
 def migrate_nodes(index, query=None):
     logger.info('Migrating nodes to index: {}'.format(index))
     node_query = Q('is_public', 'eq', True) & Q('is_deleted', 'eq', False)
@@ -42,17 +58,19 @@ def migrate_users(index):
     n_migr = 0
     n_iter = 0
     users = paginated(User, query=None, each=True)
-    for user in users:
-        if user.is_active:
-            search.update_user(user, index=index)
-            n_migr += 1
-        n_iter += 1
+    with bulk_indexer():
+        for user in users:
+            if user.is_active:
+                search.update_user(user, index=index, async=False)
+                n_migr += 1
+            n_iter += 1
 
     logger.info('Users iterated: {0}\nUsers migrated: {1}'.format(n_iter, n_migr))
 
 def migrate_institutions(index):
-    for inst in Institution.find(Q('is_deleted', 'ne', True)):
-        update_institution(inst, index)
+    with bulk_indexer():
+        for inst in Institution.find(Q('is_deleted', 'ne', True)):
+            update_institution(inst, index)
 
 def migrate(delete, index=None, app=None):
     index = index or settings.ELASTIC_INDEX
@@ -106,12 +124,19 @@ def set_up_index(idx):
 
 
 def set_up_alias(old_index, index):
-    alias = es_client().indices.get_aliases(index=old_index)
-    if alias:
+    """Point the ``old_index`` alias at ``index``, removing it from any other index in the
+    same request so searches never see a missing alias.
+    """
+    aliased = [
+        name for name, value in es_client().indices.get_aliases(index=old_index).items()
+        if old_index in value.get('aliases', {})
+    ]
+    actions = [{'remove': {'index': name, 'alias': old_index}} for name in aliased]
+    if aliased:
         logger.info('Removing old aliases to {}'.format(old_index))
-        es_client().indices.delete_alias(index=old_index, name='_all', ignore=404)
     logger.info('Creating new alias from {0} to {1}'.format(old_index, index))
-    es_client().indices.put_alias(old_index, index)
+    actions.append({'add': {'index': index, 'alias': old_index}})
+    es_client().indices.update_aliases(body={'actions': actions})
 
 
 def delete_old(index):
@@ -125,5 +150,299 @@ def delete_old(index):
         es_client().indices.delete(index=old_index, ignore=404)
 
 
+
+# Parallel, resumable reindex.
+#
+# A new versioned index is built while the alias keeps serving the current one. Every
+# document type is split into id-range partitions that are indexed by a pool of worker
+# processes. Progress is saved to a state file after every partition, so a failed build
+# can be resumed. Once all partitions are done, rows modified during the build are
+# caught up and the alias is swapped to the new index in a single request.
+
+def get_reindex_querysets():
+    """Querysets of the rows that belong in a freshly built index, by kind."""
+    querysets = {
+        'node': Node.objects.filter(is_public=True, is_deleted=False),
+        'user': User.objects.filter(is_active=True),
+        'file': OsfStorageFile.objects.filter(node__is_public=True, node__is_deleted=False),
+    }
+    if settings.ENABLE_INSTITUTIONS:
+        querysets['institution'] = Institution.objects.filter(is_deleted=False)
+    return querysets
+
+
+def iter_pages(queryset, size=PAGE_SIZE):
+    paginator = Paginator(queryset.order_by('id'), size)
+    for page_num in paginator.page_range:
+        yield paginator.page(page_num).object_list
+
+
+def index_nodes(index, queryset):
+    # A node's files are indexed by the 'file' partitions
+    serialize = functools.partial(elastic_search.update_node, index=index, bulk=True, saved_fields=[])
+    for page in iter_pages(queryset.include('contributor__user__guids')):
+        elastic_search.bulk_update_nodes(serialize, page, index=index)
+
+
+def index_users(index, queryset):
+    for page in iter_pages(queryset):
+        for user in page:
+            elastic_search.update_user(user, index=index)
+
+
+def index_files(index, queryset):
+    node_fields = {}
+    with bulk_indexer() as indexer:
+        for page in iter_pages(queryset.select_related('node').prefetch_related('tags', 'guids')):
+            for file_ in page:
+                if not file_.name or file_.node.archiving:
+                    continue
+                if file_.node_id not in node_fields:
+                    node_fields[file_.node_id] = elastic_search.serialize_file_node(file_.node)
+                indexer.index(index, 'file', file_._id, elastic_search.serialize_file(file_, node_fields[file_.node_id]))
+
+
+def index_institutions(index, queryset):
+    for institution in queryset:
+        elastic_search.update_institution(institution, index=index)
+
+
+INDEXERS = {
+    'node': index_nodes,
+    'user': index_users,
+    'file': index_files,
+    'institution': index_institutions,
+}
+
+
+def plan_partitions(querysets, size=PARTITION_SIZE):
+    """Split each kind into partitions of at most ``size`` ids. Returns a dict of partition
+    key to pending state, and the highest id of each kind when the build started.
+    """
+    partitions, high_water = {}, {}
+    for kind, queryset in querysets.items():
+        high_water[kind] = queryset.model.objects.aggregate(high=Max('id'))['high'] or 0
+        bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            continue
+        for start in xrange(bounds['low'], bounds['high'] + 1, size):
+            partitions['{}:{}:{}'.format(kind, start, start + size)] = 'pending'
+    return partitions, high_water
+
+
+def reindex_partition(args):
+    """Index one partition. Runs in a worker process, so failures are returned rather than
+    raised, and the parent records them in the state file.
+    """
+    index, key = args
+    kind, start, end = key.split(':')
+    queryset = get_reindex_querysets()[kind].filter(id__gte=int(start), id__lt=int(end))
+    try:
+        with bulk_indexer(refresh=False) as indexer:
+            INDEXERS[kind](index, queryset)
+    except Exception as e:
+        logger.exception('Failed to reindex partition {}'.format(key))
+        return key, 0, repr(e)
+    return key, indexer.indexed + indexer.deleted, None
+
+
+def init_reindex_worker():
+    # Each worker opens its own database and elasticsearch connections
+    elastic_search.CLIENT = None
+
+
+def run_partitions(state, state_path, workers):
+    pending = [(state['index'], key) for key, status in sorted(state['partitions'].items()) if status != 'done']
+    logger.info('Reindexing {} of {} partitions into {} with {} workers'.format(
+        len(pending), len(state['partitions']), state['index'], workers or 1
+    ))
+    if workers > 1:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        pool = multiprocessing.Pool(processes=workers, initializer=init_reindex_worker)
+        results = pool.imap_unordered(reindex_partition, pending)
+    else:
+        pool = None
+        results = (reindex_partition(args) for args in pending)
+
+    try:
+        for key, count, error in results:
+            state['partitions'][key] = 'failed' if error else 'done'
+            save_reindex_state(state, state_path)
+            if error:
+                logger.error('Partition {} failed: {}'.format(key, error))
+            else:
+                logger.info('Partition {} done, {} documents'.format(key, count))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return sorted(key for key, status in state['partitions'].items() if status != 'done')
+
+
+def catch_up(index, since, high_water):
+    """Re-index rows modified during the build. Nodes (and their files) are found by
+    ``date_modified``; users, files and institutions have no modification date, so rows
+    created after the build started are indexed, along with users who logged in since.
+    Files trashed since are removed. Returns the time the pass started and the new high water ids, for the next pass.
+    """
+    started = timezone.now()
+    new_high_water = {
+        kind: model.objects.aggregate(high=Max('id'))['high'] or 0
+        for kind, model in (('node', Node), ('user', User), ('file', OsfStorageFile))
+    }
+    with bulk_indexer(refresh=False):
+        nodes = Node.objects.filter(date_modified__gte=since)
+        for page in iter_pages(nodes):
+            for node in page:
+                elastic_search.update_node(node, index=index)
+
+        users = User.objects.filter(DQ(id__gt=high_water.get('user', 0)) | DQ(date_last_login__gte=since))
+        for page in iter_pages(users):
+            for user in page:
+                elastic_search.update_user(user, index=index)
+
+        files = OsfStorageFile.objects.filter(id__gt=high_water.get('file', 0))
+        for page in iter_pages(files):
+            for file_ in page:
+                elastic_search.update_file(file_, index=index)
+
+        # Trashed files keep their id, so their documents may have been built before they were trashed
+        trashed = TrashedFile.objects.filter(deleted_on__gte=since)
+        for page in iter_pages(trashed):
+            for file_ in page:
+                elastic_search.update_file(file_, index=index, delete=True)
+
+        if settings.ENABLE_INSTITUTIONS:
+            for institution in Institution.objects.all():
+                elastic_search.update_institution(institution, index=index)
+
+    logger.info('Caught up {} with rows modified since {}'.format(index, since))
+    return started, new_high_water
+
+
+def next_index(alias):
+    """Name of the next version of the index behind ``alias``, e.g. website_v3."""
+    current = es_client().indices.get_aliases(index=alias, ignore=404)
+    prefix = '{}_v'.format(alias)
+    versions = [int(name[len(prefix):]) for name in (current or {}).keys() if name.startswith(prefix)]
+    version = max(versions or [0]) + 1
+    while es_client().indices.exists(index='{}_v{}'.format(alias, version)):
+        version += 1  # Left behind by an abandoned build
+    return '{}_v{}'.format(alias, version)
+
+
+def is_concrete_index(alias):
+    return es_client().indices.exists(index=alias) and not es_client().indices.exists_alias(name=alias)
+
+
+def check_alias(alias, convert):
+    if is_concrete_index(alias) and not convert:
+        raise RuntimeError(
+            '{0} is an index rather than an alias. Run the reindex with convert once to replace it '
+            'with an alias; searches fail between the deletion of {0} and the creation of the alias.'.format(alias)
+        )
+
+
+def swap_alias(alias, index, convert=False):
+    check_alias(alias, convert)
+    if is_concrete_index(alias):
+        # An index cannot share a name with an alias, and Elasticsearch can't replace one with the
+        # other in a single request, so this one-time conversion leaves a short gap in search
+        logger.warn('Deleting index {} to replace it with an alias'.format(alias))
+        es_client().indices.delete(index=alias)
+    set_up_alias(alias, index)
+
+
+def default_state_path(alias):
+    return os.path.join(tempfile.gettempdir(), 'reindex_{}.json'.format(alias))
+
+
+def load_reindex_state(state_path):
+    with open(state_path) as fp:
+        return json.load(fp)
+
+
+def save_reindex_state(state, state_path):
+    tmp_path = '{}.tmp'.format(state_path)
+    with open(tmp_path, 'w') as fp:
+        json.dump(state, fp, indent=2)
+    os.rename(tmp_path, state_path)
+
+
+def reindex(alias=None, workers=None, partition_size=PARTITION_SIZE, state_path=None, resume=False, delete=False, convert=False, app=None):
+    """Build a new version of the index behind ``alias`` in parallel and swap the alias to it.
+
+    :param str alias: Alias that searches go through, defaults to ``ELASTIC_INDEX``
+    :param int workers: Number of worker processes, defaults to the number of CPUs
+    :param int partition_size: Number of ids per partition
+    :param str state_path: File that build progress is saved to
+    :param bool resume: Continue the build saved in ``state_path``, retrying partitions that
+        did not finish
+    :param bool delete: Delete the previous index once the alias is swapped
+    :param bool convert: Allow replacing ``alias`` if it is still a concrete index, which leaves
+        search unavailable from its deletion until the alias is created. Only needed once.
+    """
+    alias = alias or settings.ELASTIC_INDEX
+    workers = multiprocessing.cpu_count() if workers is None else workers
+    state_path = state_path or default_state_path(alias)
+    app = app or init_app('website.settings', set_backends=True, routes=True)
+    # See ``migrate`` for why this context is pushed rather than used as a context manager
+    ctx = app.test_request_context()
+    ctx.push()
+    try:
+        return _reindex(alias, workers, partition_size, state_path, resume, delete, convert)
+    finally:
+        ctx.pop()
+
+
+def _reindex(alias, workers, partition_size, state_path, resume, delete, convert):
+    # Refuse before building anything rather than at the swap
+    check_alias(alias, convert)
+    if resume:
+        state = load_reindex_state(state_path)
+        logger.info('Resuming reindex of {} into {}'.format(alias, state['index']))
+    else:
+        index = next_index(alias)
+        started = timezone.now()
+        partitions, high_water = plan_partitions(get_reindex_querysets(), size=partition_size)
+        search.create_index(index=index)
+        # Refreshing is wasted work while nothing searches the new index
+        es_client().indices.put_settings(body={'index': {'refresh_interval': '-1'}}, index=index)
+        state = {
+            'alias': alias,
+            'index': index,
+            'started': started.isoformat(),
+            'high_water': high_water,
+            'partitions': partitions,
+        }
+        save_reindex_state(state, state_path)
+        logger.info('Building {} for {}, progress is saved to {}'.format(index, alias, state_path))
+
+    index = state['index']
+    failed = run_partitions(state, state_path, workers)
+    if failed:
+        raise RuntimeError('{} partitions failed, run again with resume to retry them: {}'.format(len(failed), ', '.join(failed)))
+
+    since, high_water = catch_up(index, parse_date(state['started']), state['high_water'])
+    es_client().indices.put_settings(body={'index': {'refresh_interval': '1s'}}, index=index)
+    es_client().indices.refresh(index=index)
+
+    previous = es_client().indices.get_aliases(index=alias, ignore=404) or {}
+    swap_alias(alias, index, convert=convert)
+    # Writes made between the first catch up and the swap went to the previous index
+    catch_up(index, since, high_water)
+
+    if delete:
+        for name in previous.keys():
+            if name not in (alias, index):
+                logger.info('Deleting {}'.format(name))
+                es_client().indices.delete(index=name, ignore=404)
+
+    os.remove(state_path)
+    logger.info('{} now points to {}'.format(alias, index))
+    return index
+
+
 if __name__ == '__main__':
     migrate(False)
@@ -97,6 +97,11 @@ SEARCH_ENGINE = 'elastic'  # Can be 'elastic', or None
 ELASTIC_URI = 'localhost:9200'
 ELASTIC_TIMEOUT = 10
 ELASTIC_INDEX = 'website'
+# Number of documents sent to elasticsearch per bulk request
+ELASTIC_BULK_CHUNK_SIZE = 500
+# Refresh the index after every write so documents are searchable immediately. Otherwise they
+# become searchable on the index's refresh interval (1s by default).
+ELASTIC_REFRESH_ON_WRITE = False
 
 # Sessions
 COOKIE_NAME = 'osf'
@@ -108,6 +113,56 @@ OSF_SESSION_TIMEOUT = 30 * 24 * 60 * 60  # 30 days in seconds
 SECRET_KEY = 'CHANGEME'
 SESSION_COOKIE_SECURE = SECURE_MODE
 SESSION_COOKIE_HTTPONLY = True
+# Django cache alias shared by all processes to read sessions through, e.g. a memcached or
+# redis cache configured in CACHES. None to only cache sessions in-process.
+SESSION_CACHE_ALIAS = None
+SESSION_SHARED_CACHE_TTL = 60 * 60  # 1 hour in seconds
+# Sessions cached in each process, and for how long (seconds). Another process's changes to a
+# session may not be seen for up to SESSION_LOCAL_CACHE_TTL.
+SESSION_LOCAL_CACHE_SIZE = 1000
+SESSION_LOCAL_CACHE_TTL = 5
+# Unchanged sessions are saved at most this often (seconds) to keep date_modified current
+SESSION_REFRESH_THRESHOLD = 60 * 60
+
+# GUID lookups and the URLs GUIDs resolve to are cached in the same way as sessions: in the
+# Django cache GUID_CACHE_ALIAS (None to only cache in-process), and in each process for
+# GUID_LOCAL_CACHE_TTL seconds
+GUID_CACHE_ALIAS = None
+GUID_SHARED_CACHE_TTL = 24 * 60 * 60  # 1 day in seconds
+GUID_LOCAL_CACHE_SIZE = 10000
+GUID_LOCAL_CACHE_TTL = 60
+
+# CAS profiles of OAuth2 bearer tokens are cached for CAS_TOKEN_CACHE_TTL seconds (0 to always ask
+# CAS), tokens CAS rejected for CAS_TOKEN_NEGATIVE_CACHE_TTL seconds. As with sessions, entries
+# are kept in the Django cache CAS_TOKEN_CACHE_ALIAS (if not None) and in each process for at
+# most CAS_TOKEN_LOCAL_CACHE_TTL seconds, which bounds how long a revoked token can be used.
+CAS_TOKEN_CACHE_ALIAS = None
+CAS_TOKEN_CACHE_TTL = 5 * 60
+CAS_TOKEN_NEGATIVE_CACHE_TTL = 60
+CAS_TOKEN_LOCAL_CACHE_SIZE = 1000
+CAS_TOKEN_LOCAL_CACHE_TTL = 30
+
+# Parsed CSL styles are kept in each process, up to CITATION_STYLE_CACHE_SIZE of them, and parsed
+# again when their file changes. Rendered citations are cached in each process until their node or
+# preprint is modified, for at most CITATION_CACHE_TTL seconds (0 to disable) since contributors
+# changing their names doesn't modify the node.
+CITATION_STYLE_CACHE_SIZE = 50
+CITATION_CACHE_SIZE = 5000
+CITATION_CACHE_TTL = 60 * 60
+
+# Each process keeps an index of every subject taxonomy, rebuilt when a Subject is saved or deleted
+# in that process or, through a version kept in the Django cache TAXONOMY_CACHE_ALIAS (if not None),
+# in any other. It is also rebuilt every TAXONOMY_INDEX_TTL seconds (0 to rebuild it on every use).
+TAXONOMY_CACHE_ALIAS = None
+TAXONOMY_INDEX_TTL = 5 * 60
+
+# Page view and download counts are buffered in each process and written at most this often
+# (seconds), or once this many (page, day) entries are buffered
+PAGE_COUNTER_FLUSH_INTERVAL = 60
+PAGE_COUNTER_BUFFER_SIZE = 1000
+# User action counts are buffered in the same way, per (user, action, day)
+USER_ACTIVITY_FLUSH_INTERVAL = 60
+USER_ACTIVITY_BUFFER_SIZE = 1000
 
 # local path to private key and cert for local development using https, overwrite in local.py
 OSF_SERVER_KEY = None
@@ -153,6 +208,14 @@ MAILGUN_API_KEY = None
 # Use Celery for file rendering
 USE_CELERY = True
 
+# Postcommit tasks run on POSTCOMMIT_WORKERS threads per process once the request's transaction
+# has been committed. When POSTCOMMIT_QUEUE_SIZE tasks are already waiting, further tasks that are
+# celery tasks are sent to celery and the others run in the request's thread.
+POSTCOMMIT_WORKERS = 8
+POSTCOMMIT_QUEUE_SIZE = 1000
+# Log postcommit tasks that take longer than this many seconds
+POSTCOMMIT_SLOW_TASK_THRESHOLD = 5
+
 # File rendering timeout (in ms)
 MFR_TIMEOUT = 30000
 
@@ -269,6 +332,14 @@ KEEN = {
     },
 }
 
+# Summary analytics keep per-day counts in ANALYTICS_SNAPSHOT_DIR (the temporary directory if None),
+# so that each run only recounts the days of the rows modified since the last one. The counts are
+# rebuilt in full once they are older than ANALYTICS_SNAPSHOT_MAX_AGE days, and on every run when
+# ANALYTICS_INCREMENTAL_SNAPSHOTS is False.
+ANALYTICS_SNAPSHOT_DIR = os.path.join(ANALYTICS_PATH, 'snapshots')
+ANALYTICS_SNAPSHOT_MAX_AGE = 7
+ANALYTICS_INCREMENTAL_SNAPSHOTS = True
+
 SENTRY_DSN = None
 SENTRY_DSN_JS = None
 
@@ -319,6 +390,11 @@ EZID_FORMAT = '{namespace}osf.io/{guid}'
 SHARE_REGISTRATION_URL = ''
 SHARE_URL = None
 SHARE_API_TOKEN = None  # Required to send project updates to SHARE
+# Preprints are sent to SHARE SHARE_BATCH_SIZE at a time per provider token. Failed submissions are
+# retried SHARE_MAX_RETRIES times, waiting SHARE_RETRY_BACKOFF seconds, doubled after each attempt.
+SHARE_BATCH_SIZE = 50
+SHARE_MAX_RETRIES = 3
+SHARE_RETRY_BACKOFF = 2
 
 CAS_SERVER_URL = 'http://localhost:8080'
 MFR_SERVER_URL = 'http://localhost:7778'
@@ -331,6 +407,17 @@ MAX_FILE_SIZE = MAX_ARCHIVE_SIZE  # TODO limit file size?
 
 ARCHIVE_TIMEOUT_TIMEDELTA = timedelta(1)  # 24 hours
 
+# Addon file trees are listed with this many concurrent metadata requests, at most
+# ARCHIVE_CRAWL_RATE_LIMITS[provider] (or ['default']) requests per second per process.
+# Failed requests are retried ARCHIVE_CRAWL_MAX_RETRIES times, waiting
+# ARCHIVE_CRAWL_RETRY_BACKOFF seconds before the first retry and twice as long before each next one
+ARCHIVE_CRAWL_CONCURRENCY = 8
+ARCHIVE_CRAWL_RATE_LIMITS = {
+    'default': 10,
+}
+ARCHIVE_CRAWL_MAX_RETRIES = 3
+ARCHIVE_CRAWL_RETRY_BACKOFF = 1
+
 ENABLE_ARCHIVER = True
 
 JWT_SECRET = 'changeme'
@@ -590,6 +677,10 @@ ENABLE_INSTITUTIONS = True
 ENABLE_VARNISH = False
 ENABLE_ESI = False
 VARNISH_SERVERS = []  # This should be set in local.py or cache invalidation won't work
+# Maximum number of URL paths merged into a single BAN regex
+VARNISH_BAN_BATCH_SIZE = 50
+# Times a BAN is retried after a connection error or varnish server error
+VARNISH_BAN_RETRIES = 2
 ESI_MEDIA_TYPES = {'application/vnd.api+json', 'application/json'}
 
 # Used for gathering meta information about the current build
@@ -35,6 +35,15 @@ EXTERNAL_EMBER_APPS = {
 }
 
 SEARCH_ENGINE = 'elastic'
+ELASTIC_REFRESH_ON_WRITE = True  # Tests search right after writing
+PAGE_COUNTER_FLUSH_INTERVAL = 0  # Tests read counters right after counting
+USER_ACTIVITY_FLUSH_INTERVAL = 0
+CAS_TOKEN_CACHE_TTL = 0  # Tests mock different CAS profiles for the same tokens
+CAS_TOKEN_NEGATIVE_CACHE_TTL = 0
+CITATION_CACHE_TTL = 0  # Tests change contributors without modifying nodes
+TAXONOMY_INDEX_TTL = 0  # Subjects created by a test are rolled back without invalidating
+ANALYTICS_INCREMENTAL_SNAPSHOTS = False  # Snapshots would outlive the test database
+ANALYTICS_SNAPSHOT_DIR = None
 
 USE_EMAIL = False
 USE_CELERY = False
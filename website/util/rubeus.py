@@ -12,6 +12,7 @@ from framework.auth.decorators import Auth
 
 from django.apps import apps
 
+from osf.utils.permission_cache import PermissionCache, get_permission_cache
 from website import settings
 from website.util import paths
 from website.util import sanitize
@@ -42,15 +43,16 @@ def default_urls(node_api, short_name):
     }
 
 
-def to_hgrid(node, auth, **data):
+def to_hgrid(node, auth, depth=None, **data):
     """Converts a node into a rubeus grid format
 
     :param Node node: the node to be parsed
     :param Auth auth: the user authorization object
+    :param int depth: number of component levels to include, or None for all of them
     :returns: rubeus-formatted dict
 
     """
-    return NodeFileCollector(node, auth, **data).to_hgrid()
+    return NodeFileCollector(node, auth, depth=depth, **data).to_hgrid()
 
 
 def build_addon_root(node_settings, name, permissions=None,
@@ -150,14 +152,34 @@ def sort_by_name(hgrid_data):
 
 class NodeFileCollector(object):
 
-    """A utility class for creating rubeus formatted node data"""
-    def __init__(self, node, auth, **kwargs):
+    """A utility class for creating rubeus formatted node data.
+
+    The component tree below a node is loaded a subtree at a time: one query each for the
+    descendant ids, their node relations (components and node links), the nodes themselves and
+    which of them have a parent, followed by the user's permissions on all of them. Subtrees of
+    linked nodes are loaded when they are first serialized.
+
+    :param int depth: Number of component levels to serialize. Deeper components are returned
+        without children and with a ``fetch`` url to expand them from. If None, the whole tree
+        is serialized.
+    """
+    def __init__(self, node, auth, depth=None, **kwargs):
         NodeRelation = apps.get_model('osf.NodeRelation')
         self.node = node.child if isinstance(node, NodeRelation) else node
         self.auth = auth
+        self.depth = depth
         self.extra = kwargs
-        self.can_view = self.node.can_view(auth)
-        self.can_edit = self.node.can_edit(auth) and not self.node.is_registration
+        # Use the request's permission cache if there is one, so addons' permission checks hit it too
+        self._permissions = get_permission_cache() or PermissionCache()
+        self._private_link = auth.private_link if auth else None
+        self._private_link_node_ids = None
+        self._nodes = {self.node.pk: self.node}
+        # parent id -> [(child id, is_node_link)], in display order
+        self._relations = {}
+        self._has_parent = set()
+        self._load([self.node.pk])
+        self.can_view = self._can_view(self.node)
+        self.can_edit = self._can_edit(self.node)
 
     def to_hgrid(self):
         """Return the Rubeus.JS representation of the node's file data, including
@@ -166,19 +188,116 @@ class NodeFileCollector(object):
         root = self._serialize_node(self.node)
         return [root]
 
-    def _collect_components(self, node, visited):
+    def _load(self, node_ids):
+        """Load the component trees below ``node_ids`` unless they have been loaded already."""
+        AbstractNode = apps.get_model('osf.AbstractNode')
+        NodeClosure = apps.get_model('osf.NodeClosure')
+        NodeRelation = apps.get_model('osf.NodeRelation')
+
+        node_ids = set(node_ids) - set(self._relations)
+        if not node_ids:
+            return
+        tree_ids = node_ids.union(
+            NodeClosure.objects.filter(ancestor_id__in=node_ids).values_list('descendant_id', flat=True)
+        ) - set(self._relations)
+        for node_id in tree_ids:
+            self._relations[node_id] = []
+        relations = (NodeRelation.objects.filter(parent_id__in=tree_ids)
+                     .order_by('parent_id', '_order')
+                     .values_list('parent_id', 'child_id', 'is_node_link'))
+        for parent_id, child_id, is_node_link in relations:
+            self._relations[parent_id].append((child_id, is_node_link))
+
+        new_ids = tree_ids.union(*[
+            [child_id for child_id, _ in self._relations[node_id]] for node_id in tree_ids
+        ])
+        for node in AbstractNode.objects.filter(pk__in=new_ids - set(self._nodes)).include('guids'):
+            self._nodes[node.pk] = node
+        self._has_parent.update(
+            NodeRelation.objects.filter(child_id__in=new_ids, is_node_link=False).values_list('child_id', flat=True)
+        )
+        user = self.auth.user if self.auth else None
+        if user and user.pk:
+            self._permissions.prime(user.pk, new_ids)
+
+    def _get_children(self, node, primary=False):
+        """Non-deleted children of ``node``, excluding node links if ``primary``."""
+        self._load([node.pk])
+        return [
+            self._nodes[child_id] for child_id, is_node_link in self._relations[node.pk]
+            if not self._nodes[child_id].is_deleted and not (primary and is_node_link)
+        ]
+
+    def _is_node_link(self, parent, node):
+        self._load([parent.pk])
+        return (node.pk, True) in self._relations[parent.pk]
+
+    def _get_private_link_node_ids(self):
+        if self._private_link_node_ids is None:
+            if getattr(self._private_link, 'anonymous', False):
+                node_ids = self._private_link.nodes.values_list('pk', flat=True)
+            elif self.auth and self.auth.private_key:
+                PrivateLink = apps.get_model('osf.PrivateLink')
+                node_ids = PrivateLink.objects.filter(
+                    key=self.auth.private_key, is_deleted=False
+                ).values_list('nodes', flat=True)
+            else:
+                node_ids = []
+            self._private_link_node_ids = set(node_ids)
+        return self._private_link_node_ids
+
+    def _can_view(self, node):
+        """Same as ``node.can_view(self.auth)``"""
+        if getattr(self._private_link, 'anonymous', False):
+            return node.pk in self._get_private_link_node_ids()
+        if not self.auth and not node.is_public:
+            return False
+        user = self.auth.user if self.auth else None
+        return bool(
+            node.is_public or
+            (user and user.pk and (
+                self._permissions.has_permission(user.pk, node.pk, 'read') or
+                self._permissions.is_admin_parent(user.pk, node.pk)
+            )) or
+            node.pk in self._get_private_link_node_ids()
+        )
+
+    def _can_edit(self, node):
+        """Same as ``node.can_edit(self.auth) and not node.is_registration``"""
+        if not self.auth:
+            return False
+        user = self.auth.user
+        can_edit = (
+            (user and user.pk and self._permissions.has_permission(user.pk, node.pk, 'write')) or
+            self.auth.api_node == node
+        )
+        return bool(can_edit) and not node.is_registration
+
+    def _find_readable_descendants(self, node):
+        """Same as ``node.find_readable_descendants(self.auth)``"""
+        new_branches = []
+        for child in self._get_children(node, primary=True):
+            if self._can_view(child):
+                yield child
+            else:
+                new_branches.append(child)
+
+        for branch in new_branches:
+            for desc in self._find_readable_descendants(branch):
+                yield desc
+
+    def _collect_components(self, node, visited, depth=0):
         rv = []
-        if not node.can_view(self.auth):
+        if not self._can_view(node):
             return rv
-        for child in node.get_nodes(is_deleted=False):
-            if not child.can_view(self.auth):
-                if child.primary:
-                    for desc in child.find_readable_descendants(self.auth):
-                        visited.append(desc.resolve()._id)
-                        rv.append(self._serialize_node(desc, visited=visited, parent=node))
-            elif child.resolve()._id not in visited:
-                visited.append(child.resolve()._id)
-                rv.append(self._serialize_node(child, visited=visited, parent=node))
+        for child in self._get_children(node):
+            if not self._can_view(child):
+                for desc in self._find_readable_descendants(child):
+                    visited.add(desc._id)
+                    rv.append(self._serialize_node(desc, visited=visited, parent=node, depth=depth + 1))
+            elif child._id not in visited:
+                visited.add(child._id)
+                rv.append(self._serialize_node(child, visited=visited, parent=node, depth=depth + 1))
         return rv
 
     def _get_node_name(self, node):
@@ -187,7 +306,7 @@ class NodeFileCollector(object):
         NodeRelation = apps.get_model('osf.NodeRelation')
         is_node_relation = isinstance(node, NodeRelation)
         node = node.child if is_node_relation else node
-        can_view = node.can_view(auth=self.auth)
+        can_view = self._can_view(node)
 
         if can_view:
             node_name = sanitize.unescape_entities(node.title)
@@ -202,18 +321,21 @@ class NodeFileCollector(object):
 
         return node_name
 
-    def _serialize_node(self, node, visited=None, parent=None):
-        """Returns the rubeus representation of a node folder.
+    def _serialize_node(self, node, visited=None, parent=None, depth=0):
+        """Returns the rubeus representation of a node folder. Components more than
+        ``self.depth`` levels below the root are left unexpanded.
         """
-        visited = visited or []
-        visited.append(node.resolve()._id)
-        can_view = node.can_view(auth=self.auth)
-        if can_view:
-            children = self._collect_addons(node) + self._collect_components(node, visited)
+        self._load([node.pk])
+        visited = set() if visited is None else visited
+        visited.add(node._id)
+        can_view = self._can_view(node)
+        expand = self.depth is None or depth < self.depth
+        if can_view and expand:
+            children = self._collect_addons(node) + self._collect_components(node, visited, depth=depth)
         else:
             children = []
 
-        is_pointer = parent and parent.has_node_link_to(node)
+        is_pointer = parent and self._is_node_link(parent, node)
 
         return {
             # TODO: Remove safe_unescape_html when mako html safe comes in
@@ -221,18 +343,18 @@ class NodeFileCollector(object):
             'category': node.category,
             'kind': FOLDER,
             'permissions': {
-                'edit': node.can_edit(self.auth) and not node.is_registration,
+                'edit': self._can_edit(node),
                 'view': can_view,
             },
             'urls': {
                 'upload': None,
-                'fetch': None,
+                'fetch': None if expand or not can_view else node.api_url_for('grid_data', depth=1),
             },
             'children': children,
             'isPointer': is_pointer,
             'isSmartFolder': False,
-            'nodeType': node.project_or_component,
-            'nodeID': node.resolve()._id,
+            'nodeType': 'component' if node.pk in self._has_parent else 'project',
+            'nodeID': node._id,
         }
 
     def _collect_addons(self, node):
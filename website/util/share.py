@@ -1,12 +1,19 @@
 import logging
+import time
 import uuid
 import urlparse
 
+import requests
+
 from website import settings
 
 
 logger = logging.getLogger(__name__)
 
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+session = requests.Session()
+
 
 class GraphNode(object):
 
@@ -48,7 +55,7 @@ def format_user(user):
         'additional_name': user.middle_names,
     })
 
-    person.attrs['identifiers'] = [GraphNode('agentidentifier', agent=person, uri='mailto:{}'.format(uri)) for uri in user.emails.values_list('address', flat=True)]
+    person.attrs['identifiers'] = [GraphNode('agentidentifier', agent=person, uri='mailto:{}'.format(email.address)) for email in user.emails.all()]
 
     if user.is_registered:
         person.attrs['identifiers'].append(GraphNode('agentidentifier', agent=person, uri=user.profile_image_url()))
@@ -67,3 +74,88 @@ def format_contributor(preprint, user, bibliographic, index):
         creative_work=preprint,
         cited_as=user.fullname,
     )
+
+
+class ShareSubmissionError(Exception):
+
+    def __init__(self, message, status_code=None):
+        super(ShareSubmissionError, self).__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self):
+        return self.status_code is None or self.status_code in RETRY_STATUS_CODES
+
+
+def submit_graph(token, graph):
+    """POST ``graph`` (a list of serialized GraphNodes) to SHARE as the source owning ``token``.
+    Connection errors, 429s and 5xxs are retried ``SHARE_MAX_RETRIES`` times, waiting
+    ``SHARE_RETRY_BACKOFF`` seconds and twice as long after each attempt.
+
+    :raises: ShareSubmissionError if SHARE doesn't accept the graph
+    """
+    data = {
+        'data': {
+            'type': 'NormalizedData',
+            'attributes': {
+                'tasks': [],
+                'raw': None,
+                'data': {'@graph': graph}
+            }
+        }
+    }
+    headers = {'Authorization': 'Bearer {}'.format(token), 'Content-Type': 'application/vnd.api+json'}
+    for attempt in range(settings.SHARE_MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(settings.SHARE_RETRY_BACKOFF * 2 ** (attempt - 1))
+        try:
+            resp = session.post('{}api/v2/normalizeddata/'.format(settings.SHARE_URL), json=data, headers=headers)
+        except requests.RequestException as e:
+            error = ShareSubmissionError(repr(e))
+        else:
+            logger.debug(resp.content)
+            if resp.ok:
+                return resp
+            error = ShareSubmissionError(resp.content, status_code=resp.status_code)
+        if not error.retryable:
+            break
+        logger.warning('Retrying SHARE submission after {}'.format(error.status_code or error))
+    raise error
+
+
+class ShareBatcher(object):
+    """Buffers graphs per SHARE token and submits each token's graphs ``SHARE_BATCH_SIZE`` at a
+    time, merged into a single graph. If SHARE rejects a merged graph, its items are submitted one
+    by one so that one bad item doesn't fail the rest.
+
+    Keys of the items submitted are kept in ``sent``, ``(key, error)`` of those that failed in ``failed``.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.SHARE_BATCH_SIZE
+        self.pending = {}
+        self.sent = []
+        self.failed = []
+
+    def add(self, token, key, graph):
+        batch = self.pending.setdefault(token, [])
+        batch.append((key, graph))
+        if len(batch) >= self.batch_size:
+            self._submit(token, self.pending.pop(token))
+
+    def flush(self):
+        for token in list(self.pending):
+            self._submit(token, self.pending.pop(token))
+
+    def _submit(self, token, batch):
+        try:
+            submit_graph(token, [node for _, graph in batch for node in graph])
+        except ShareSubmissionError as error:
+            if len(batch) > 1 and not error.retryable:
+                for item in batch:
+                    self._submit(token, [item])
+                return
+            logger.error('SHARE rejected {} items: {}'.format(len(batch), error))
+            self.failed.extend((key, error) for key, _ in batch)
+        else:
+            self.sent.extend(key for key, _ in batch)
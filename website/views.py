@@ -7,6 +7,8 @@ import os
 import urllib
 
 from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
 from django.db.models import Count
 from flask import request, send_from_directory
 
@@ -22,6 +24,7 @@ from framework.auth.core import get_current_user_id
 from website.institutions.views import serialize_institution
 
 from osf.models import BaseFileNode, Guid, Institution, PreprintService
+from osf.utils import guid_cache
 from website.settings import EXTERNAL_EMBER_APPS, INSTITUTION_DISPLAY_NODE_THRESHOLD
 from website.project.model import has_anonymous_link
 from website.util import permissions
@@ -239,6 +242,14 @@ def resolve_guid(guid, suffix=None):
         else:
             raise e
     if guid_object:
+        is_download = suffix and suffix.rstrip('/').lower() == 'download'
+        # Most GUIDs are resolved from the cached deep_url of their referent alone. Downloads and
+        # preprints need the referent itself.
+        if not is_download and guid_object.content_type_id != ContentType.objects.get_for_model(PreprintService).id:
+            entry = guid_cache.get_entry(guid)
+            if entry and entry.deep_url:
+                return proxy_url(_build_guid_url(urllib.unquote(entry.deep_url), suffix))
+
         # verify that the object implements a GuidStoredObject-like interface. If a model
         #   was once GuidStoredObject-like but that relationship has changed, it's
         #   possible to have referents that are instances of classes that don't
@@ -255,9 +266,11 @@ def resolve_guid(guid, suffix=None):
             raise HTTPError(http.NOT_FOUND)
         if not referent.deep_url:
             raise HTTPError(http.NOT_FOUND)
+        deep_url = referent.deep_url
+        transaction.on_commit(lambda: guid_cache.set_deep_url(guid_object, deep_url))
 
         # Handle file `/download` shortcut with supported types.
-        if suffix and suffix.rstrip('/').lower() == 'download':
+        if is_download:
             file_referent = None
             if isinstance(referent, PreprintService) and referent.primary_file:
                 if not referent.is_published: